@@ -1,7 +1,20 @@
-import sqlite3
+import json
 
+from connectionmanager import ConnectionManager
 from artistsdatabase import ArtistsDatabase
 
+# Orders that albums can be listed in, mapped to the tables read and
+# the ORDER BY clause. Each is read straight from an index.
+ALBUM_SORT_ORDERS = {
+    "album_name": ("albums",
+                   "albums.album_name COLLATE NOCASE, albums.album_id"),
+    "artist": ("artists CROSS JOIN albums"
+               " ON albums.artist_id = artists.artist_id",
+               "artists.artist_name COLLATE NOCASE, artists.artist_id,"
+               " albums.album_id"),
+    "release_date": ("albums", "albums.release_date, albums.album_id"),
+}
+
 
 class AlbumsDatabase:
     """
@@ -11,49 +24,49 @@ class AlbumsDatabase:
     `MusicDatabase` class provides the interface for database operations.
     """
 
-    def __init__(self, db_path, artist_database: ArtistsDatabase):
+    def __init__(self, connection_manager: ConnectionManager,
+                 artist_database: ArtistsDatabase):
         """
         Initialise an `AlbumsDatabase` instance.
 
         Parameters
         ----------
-        db_path : str
-            The path to the database.
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
         artist_database : ArtistsDatabase
             The instance of the `ArtistsDatabase` class.
         """
-        self._db_path = db_path
+        self._connection_manager = connection_manager
         self._artist_database = artist_database
 
     def create_database(self):
         """Creates the `albums` table if it doesn't already exist"""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS albums (
-                album_id INTEGER PRIMARY KEY,
-                album_name TEXT NOT NULL,
-                release_date TEXT NOT NULL,
-                artist_id INTEGER NOT NULL,
-                FOREIGN KEY(artist_id) REFERENCES artists(artist_id)
-            )
-        ''')
-        con.commit()
-        con.close()
-
-    def album_exists(self, album_name, artist):
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                CREATE TABLE IF NOT EXISTS albums (
+                    album_id INTEGER PRIMARY KEY,
+                    album_name TEXT NOT NULL,
+                    release_date TEXT NOT NULL,
+                    artist_id INTEGER NOT NULL,
+                    FOREIGN KEY(artist_id) REFERENCES artists(artist_id)
+                )
+            ''')
+
+    def album_exists(self, album_name, artist, release_date):
         """
         Check if an album exists in the database
 
-        The album's title, artist and release date are considered to
-        ensure that only exact matches give a positive result.
+        The album's title, album artist and release date are considered
+        to ensure that only exact matches give a positive result.
 
         Parameters
         ----------
         album_name : str
             The title of the album.
         artist : str
-            The name of the artist
+            The name of the album artist.
+        release_date : str
+            The release date of the album.
 
         Returns
         -------
@@ -62,15 +75,13 @@ class AlbumsDatabase:
         """
         artist_id = self._artist_database.get_artist_id(artist)
 
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-        SELECT 1 FROM albums 
+        cur = self._connection_manager.execute('''
+        SELECT 1 FROM albums
         WHERE album_name = ?
         AND artist_id = ?
-        ''', (album_name, artist_id))
+        AND release_date = ?
+        ''', (album_name, artist_id, release_date))
         exists = cur.fetchone() is not None
-        con.close()
         return exists
 
     def insert_album(self, album_name, artist, release_date):
@@ -85,26 +96,35 @@ class AlbumsDatabase:
             The name of the artist
         release_date : str
             The release date of the album.
+
+        Returns
+        -------
+        int
+            The `album_id` of the new album.
         """
         artist_id = self._artist_database.get_artist_id(artist)
 
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-        INSERT INTO albums (album_name, release_date, artist_id)
-        VALUES (?, ?, ?)
-        ''', (album_name, release_date, artist_id))
-        con.commit()
-        con.close()
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+            INSERT INTO albums (album_name, release_date, artist_id)
+            VALUES (?, ?, ?)
+            RETURNING album_id
+            ''', (album_name, release_date, artist_id))
+            return cur.fetchone()[0]
 
-    def get_album_id(self, album_name, release_date):
+    def upsert_album(self, album_name, artist_id, release_date):
         """
-        Return an album's unique identifier
+        Add an album if it is new and return its id.
+
+        The album is looked up or added by one statement, which reads
+        the id back from the row inserted or found on conflict.
 
         Parameters
         ----------
         album_name : str
             The title of the album.
+        artist_id : int
+            The album artist.
         release_date : str
             The release date of the album.
 
@@ -113,18 +133,89 @@ class AlbumsDatabase:
         int
             The unique identifier for the album.
         """
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        # Write query
-        cur.execute(
-            '''SELECT album_id 
+        with self._connection_manager.transaction():
+            # A conflicting row is returned by a no-op update, as
+            # `DO NOTHING` returns no row.
+            cur = self._connection_manager.execute(
+                '''INSERT INTO albums (album_name, artist_id, release_date)
+                VALUES (?, ?, ?)
+                ON CONFLICT (album_name, artist_id, release_date)
+                DO UPDATE SET album_name = excluded.album_name
+                RETURNING album_id''',
+                (album_name, artist_id, release_date)
+            )
+            return cur.fetchone()[0]
+
+    def upsert_albums(self, albums):
+        """
+        Add any new albums and return the ids of all the given albums.
+
+        An album is identified by its title, album artist and release
+        date. Must be called inside a transaction, as the albums are
+        written with `executemany` and no commit of their own.
+
+        Parameters
+        ----------
+        albums : iterable of tuple
+            `(album_name, artist_id, release_date)` for each album.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each `(album_name, artist_id,
+            release_date)` triple to its `album_id`.
+        """
+        albums = list(dict.fromkeys(albums))
+        self._connection_manager.executemany(
+            '''INSERT INTO albums (album_name, artist_id, release_date)
+            VALUES (?, ?, ?)
+            ON CONFLICT (album_name, artist_id, release_date) DO NOTHING''',
+            albums
+        )
+
+        cur = self._connection_manager.execute(
+            '''SELECT albums.album_name, albums.artist_id,
+                albums.release_date, albums.album_id
+            FROM json_each(?) AS album_keys
+            CROSS JOIN albums
+            ON albums.album_name = json_extract(album_keys.value, '$[0]')
+            AND albums.artist_id = json_extract(album_keys.value, '$[1]')
+            AND albums.release_date = json_extract(album_keys.value, '$[2]')''',
+            (json.dumps(albums),)
+        )
+        return {(row[0], row[1], row[2]): row[3] for row in cur}
+
+    def get_album_id(self, album_name, artist, release_date):
+        """
+        Return an album's unique identifier
+
+        Parameters
+        ----------
+        album_name : str
+            The title of the album.
+        artist : str
+            The name of the album artist.
+        release_date : str
+            The release date of the album.
+
+        Returns
+        -------
+        int
+            The unique identifier for the album, or `None` if there is
+            no such album.
+        """
+        artist_id = self._artist_database.get_artist_id(artist)
+
+        cur = self._connection_manager.execute(
+            '''SELECT album_id
             FROM albums
             WHERE album_name = ?
+            AND artist_id = ?
+            AND release_date = ?
             ''',
-            (album_name,)
+            (album_name, artist_id, release_date)
         )
         album = cur.fetchone()
-        con.close()
 
         if album:
             album_id = album[0]
@@ -134,16 +225,13 @@ class AlbumsDatabase:
 
     def get_album_title(self, album_id):
         """Return the album's title from its identifier."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(
+        cur = self._connection_manager.execute(
             '''SELECT album_name
             FROM albums
             WHERE album_id = ?''',
             (album_id,)
         )
         album = cur.fetchone()
-        con.close()
         album_name = album[0]
         return album_name
 
@@ -162,49 +250,56 @@ class AlbumsDatabase:
         dict
             A dictionary where each key is an `album_id` and its value
             is a dictionary containing the information about that
-            album.
+            album. The keys are in the order of `album_ids`.
         """
-        id_tuple = tuple(album_ids)
-        expression = '(' + ','.join('?' for _ in id_tuple) + ')'
-
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(f'''
-        SELECT album_id, album_name, release_date, artist_id
-        FROM albums
-        WHERE album_id IN {expression}
-        ''', id_tuple)
-
-        albums_rows = cur.fetchall()
+        ids_json = json.dumps([int(album_id) for album_id in album_ids])
+
+        # The ids are joined through `json_each` so the statement does
+        # not grow with the number of ids.
+        cur = self._connection_manager.execute('''
+        SELECT albums.album_id,
+            albums.album_name,
+            albums.release_date,
+            albums.artist_id,
+            artists.artist_name
+        FROM json_each(?) AS ids
+        CROSS JOIN albums ON albums.album_id = ids.value
+        JOIN artists ON artists.artist_id = albums.artist_id
+        ''', (ids_json,))
 
         albums_info = {}
-        for row in albums_rows:
+        for row in cur:
             album_id = row[0]
-            artist_id = row[3]
-            artist_name = self._artist_database.get_artist_name(artist_id)
             album = {
                 "album_id": album_id,
                 "album_name": row[1],
                 "release_date": row[2],
-                "artist_id": artist_id,
-                "artist_name": artist_name
+                "artist_id": row[3],
+                "artist_name": row[4]
             }
             albums_info[album_id] = album
 
         return albums_info
 
-    def get_all_albums(self):
-        """Return a list of every `album_id` in the albums database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(
-            '''SELECT album_id, album_name
-            FROM albums
-            ORDER BY album_name
-            COLLATE NOCASE'''
+    def get_all_albums(self, sort_by="album_name"):
+        """
+        Return a list of every `album_id` in the albums database.
+
+        Parameters
+        ----------
+        sort_by : str, optional
+            One of the keys of `ALBUM_SORT_ORDERS`.
+        """
+        if sort_by not in ALBUM_SORT_ORDERS:
+            raise ValueError(f"Unrecognised sort key: {sort_by}")
+        source, order_by = ALBUM_SORT_ORDERS[sort_by]
+
+        cur = self._connection_manager.execute(
+            f'''SELECT albums.album_id, albums.album_name
+            FROM {source}
+            ORDER BY {order_by}'''
         )
         album_rows = cur.fetchall()
-        con.close()
 
         albums = []
         for album in album_rows:
@@ -213,17 +308,14 @@ class AlbumsDatabase:
 
     def get_album_tracklist(self, album_id):
         """Return a list of `track_id`s in the given album."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(
+        cur = self._connection_manager.execute(
             '''SELECT track_id
             FROM tracks
-            WHERE album_id = ? 
+            WHERE album_id = ?
             ORDER BY track_number''',
             (album_id,)
         )
         tracks_rows = cur.fetchall()
-        con.close()
 
         tracks = []
         for track_data in tracks_rows:
@@ -231,12 +323,46 @@ class AlbumsDatabase:
 
         return tracks
 
+    def delete_trackless_albums(self):
+        """
+        Delete every album that has no tracks.
+
+        Returns
+        -------
+        list of int
+            The `album_id`s of the deleted albums.
+        """
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+                DELETE FROM albums
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM tracks
+                    WHERE tracks.album_id = albums.album_id
+                ) /* full scan */
+                RETURNING album_id
+            ''')
+            return [row[0] for row in cur]
+
     def delete_album(self, album_id):
-        """Delete an album from the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            DELETE FROM albums WHERE album_id = ?
-        ''', (album_id,))
-        con.commit()
-        con.close()
+        """
+        Delete an album from the database.
+
+        The delete cascades to the album's tracks.
+
+        Returns
+        -------
+        dict
+            Dictionary with the lists of `"albums"` and `"tracks"`
+            removed.
+        """
+        with self._connection_manager.transaction():
+            # The tracks removed by the cascade can't be returned by the
+            # delete, so they are read first.
+            cur = self._connection_manager.execute('''
+                SELECT track_id FROM tracks WHERE album_id = ?
+            ''', (album_id,))
+            track_ids = [row[0] for row in cur.fetchall()]
+            self._connection_manager.execute('''
+                DELETE FROM albums WHERE album_id = ?
+            ''', (album_id,))
+        return {"albums": [album_id], "tracks": track_ids}
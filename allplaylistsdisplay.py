@@ -2,7 +2,7 @@ from functools import partial
 import tkinter as tk
 from tkinter import messagebox
 
-from musicdatabase import MusicDatabase
+from musicdatabase import MusicDatabase, log_write_errors
 from playlistitem import PlaylistItem
 
 from root import colour_scheme
@@ -100,7 +100,7 @@ class AllPlaylistsDisplay:
             "This will permanently delete the playlist.\nContinue?"
         )
         if response:
-            self.delete_playlist(playlist_id)
+            log_write_errors(self.delete_playlist(playlist_id))
             self.display_playlist_list()
 
     def clear_display(self):
@@ -1,4 +1,6 @@
-import sqlite3
+import json
+
+from connectionmanager import ConnectionManager
 
 
 class ArtistsDatabase:
@@ -10,26 +12,25 @@ class ArtistsDatabase:
      operations.
     """
 
-    def __init__(self, db_path):
+    def __init__(self, connection_manager: ConnectionManager):
         """
         Initialise an `ArtistDatabase` instance.
 
         Parameters
         ----------
-        db_path : str
-            The path to the database.
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
         """
-        self._db_path = db_path
+        self._connection_manager = connection_manager
 
     def create_database(self):
         """Create the artists table if it doesn't already exist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''CREATE TABLE IF NOT EXISTS artists(
-                    artist_id INTEGER PRIMARY KEY,
-                    artist_name TEXT NOT NULL)''')
-        con.commit()
-        con.close()
+        with self._connection_manager.transaction():
+            self._connection_manager.execute(
+                '''CREATE TABLE IF NOT EXISTS artists(
+                artist_id INTEGER PRIMARY KEY,
+                artist_name TEXT NOT NULL)'''
+            )
 
     def artist_exists(self, artist_name):
         """Check if the provided artist is in the database."""
@@ -38,25 +39,58 @@ class ArtistsDatabase:
         return False
 
     def insert_artist(self, artist_name):
-        """Add the artist to the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''INSERT INTO artists (artist_name)
-                    VALUES (?)''',
-                    (artist_name,))
-        con.commit()
-        con.close()
+        """Add the artist to the database and return its `artist_id`."""
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute(
+                '''INSERT INTO artists (artist_name)
+                VALUES (?)
+                RETURNING artist_id''',
+                (artist_name,)
+            )
+            return cur.fetchone()[0]
+
+    def upsert_artists(self, artist_names):
+        """
+        Add any new artists and return the ids of all the given artists.
+
+        Must be called inside a transaction, as the artists are written
+        with `executemany` and no commit of their own.
+
+        Parameters
+        ----------
+        artist_names : iterable of str
+            The names of the artists.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each artist name to its `artist_id`.
+        """
+        artist_names = list(dict.fromkeys(artist_names))
+        self._connection_manager.executemany(
+            '''INSERT INTO artists (artist_name)
+            VALUES (?)
+            ON CONFLICT (artist_name) DO NOTHING''',
+            ((artist_name,) for artist_name in artist_names)
+        )
+
+        cur = self._connection_manager.execute(
+            '''SELECT artists.artist_name, artists.artist_id
+            FROM json_each(?) AS names
+            CROSS JOIN artists ON artists.artist_name = names.value''',
+            (json.dumps(artist_names),)
+        )
+        return dict(cur.fetchall())
 
     def get_artist_id(self, artist_name):
         """Return the artist's `artist_id`."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT artist_id
-                    FROM artists
-                    WHERE artist_name = ?''',
-                    (artist_name,))
+        cur = self._connection_manager.execute(
+            '''SELECT artist_id
+            FROM artists
+            WHERE artist_name = ?''',
+            (artist_name,)
+        )
         artist = cur.fetchone()
-        con.close()
 
         if artist:
             artist_id = artist[0]
@@ -67,27 +101,25 @@ class ArtistsDatabase:
 
     def get_artist_name(self, artist_id):
         """Return the artist's name from the identifier."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT artist_name
-                    FROM artists
-                    WHERE artist_id = ?''',
-                    (artist_id,))
+        cur = self._connection_manager.execute(
+            '''SELECT artist_name
+            FROM artists
+            WHERE artist_id = ?''',
+            (artist_id,)
+        )
         artist = cur.fetchone()
-        con.close()
         artist_name = artist[0]
         return artist_name
 
     def get_all_artists(self):
         """Return a list of all the artist_ids in the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT artist_id, artist_name
-                    FROM artists
-                    ORDER BY artist_name 
-                    COLLATE NOCASE''')
+        cur = self._connection_manager.execute(
+            '''SELECT artist_id, artist_name
+            FROM artists
+            ORDER BY artist_name
+            COLLATE NOCASE'''
+        )
         artist_rows = cur.fetchall()
-        con.close()
 
         artists = []
         for artist in artist_rows:
@@ -96,19 +128,19 @@ class ArtistsDatabase:
 
     def get_artist_metadata(self, artist_ids):
         """Return data about the artists from a list of `artist_id`s."""
-        id_tuple = tuple(artist_ids)
-        expression = '(' + ','.join('?' for _ in id_tuple) + ')'
-
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(f'''SELECT artist_id, artist_name
-                    FROM artists
-                    WHERE artist_id IN {expression}
-                    ''', id_tuple)
-        artist_rows = cur.fetchall()
+        ids_json = json.dumps([int(artist_id) for artist_id in artist_ids])
+
+        # The ids are joined through `json_each` so the statement does
+        # not grow with the number of ids.
+        cur = self._connection_manager.execute(
+            '''SELECT artists.artist_id, artists.artist_name
+            FROM json_each(?) AS ids
+            CROSS JOIN artists ON artists.artist_id = ids.value''',
+            (ids_json,)
+        )
 
         artists_info = {}
-        for row in artist_rows:
+        for row in cur:
             artist_id = row[0]
             artist_name = row[1]
             artist = {
@@ -121,14 +153,13 @@ class ArtistsDatabase:
 
     def get_artist_tracklist(self, artist_id):
         """Return the list of tracks by an artist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT track_id 
-                    FROM tracks 
-                    WHERE artist_id = ?''',
-                    (artist_id,))
+        cur = self._connection_manager.execute(
+            '''SELECT track_id
+            FROM tracks
+            WHERE artist_id = ?''',
+            (artist_id,)
+        )
         tracks_rows = cur.fetchall()
-        con.close()
 
         tracks = []
         for track_data in tracks_rows:
@@ -137,27 +168,75 @@ class ArtistsDatabase:
 
     def get_artist_albumlist(self, artist_id):
         """Return a list of albums by the artist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT album_id, album_name 
-                    FROM albums 
-                    WHERE artist_id = ?''',
-                    (artist_id,))
+        cur = self._connection_manager.execute(
+            '''SELECT album_id, album_name
+            FROM albums
+            WHERE artist_id = ?''',
+            (artist_id,)
+        )
         tracks_rows = cur.fetchall()
-        con.close()
 
         albums = {}
         for album_data in tracks_rows:
             albums[album_data[0]] = album_data[1]
-        print(albums)
         return albums
 
+    def delete_trackless_artists(self):
+        """
+        Delete every artist that has no tracks or albums.
+
+        An album artist may have no tracks of their own, such as the
+        artist of a compilation, and deleting them would cascade to
+        their albums.
+
+        Returns
+        -------
+        list of int
+            The `artist_id`s of the deleted artists.
+        """
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+                DELETE FROM artists
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM tracks
+                    WHERE tracks.artist_id = artists.artist_id
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM albums
+                    WHERE albums.artist_id = artists.artist_id
+                ) /* full scan */
+                RETURNING artist_id
+            ''')
+            return [row[0] for row in cur]
+
     def delete_artist(self, artist_id):
-        """Delete an artist from the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            DELETE FROM artists WHERE artist_id = ?
-        ''', (artist_id,))
-        con.commit()
-        con.close()
+        """
+        Delete an artist from the database.
+
+        The delete cascades to the artist's albums and tracks, and to
+        the tracks on those albums.
+
+        Returns
+        -------
+        dict
+            Dictionary with the lists of `"artists"`, `"albums"` and
+            `"tracks"` removed.
+        """
+        with self._connection_manager.transaction():
+            # The rows removed by the cascade can't be returned by the
+            # delete, so they are read first.
+            cur = self._connection_manager.execute('''
+                SELECT 'albums', album_id FROM albums WHERE artist_id = ?
+                UNION ALL
+                SELECT 'tracks', track_id FROM tracks
+                WHERE artist_id = ?
+                OR album_id IN (SELECT album_id FROM albums
+                                WHERE artist_id = ?)
+            ''', (artist_id, artist_id, artist_id))
+            removed = {"artists": [artist_id], "albums": [], "tracks": []}
+            for table, row_id in cur.fetchall():
+                removed[table].append(row_id)
+            self._connection_manager.execute('''
+                DELETE FROM artists WHERE artist_id = ?
+            ''', (artist_id,))
+        return removed
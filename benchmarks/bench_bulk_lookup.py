@@ -0,0 +1,77 @@
+"""
+Time looking up the metadata of large lists of ids.
+
+`get_track_metadata()` passes the ids as one JSON parameter, so a
+lookup of any size runs the same statement, and returns the tracks in
+the order asked for. `iter_track_metadata()` runs the same statement
+and is timed up to its first track, which it yields without reading
+the rest. Usage:
+
+    python benchmarks/bench_bulk_lookup.py [--sizes 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from syntheticlibrary import build_library, MusicDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="bench_bulk_lookup.db")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    track_count = max(args.sizes)
+    build_library(args.db, track_count)
+    database = MusicDatabase(args.db)
+    rng = random.Random(0)
+
+    for size in args.sizes:
+        track_ids = rng.sample(range(1, track_count + 1), size)
+        before = database.get_connection_stats()
+        start = time.perf_counter()
+        tracks = database.get_track_metadata(track_ids)
+        elapsed = time.perf_counter() - start
+        after = database.get_connection_stats()
+
+        assert list(tracks) == track_ids, "tracks not in the order asked for"
+        executed = (after["statements_executed"]
+                    - before["statements_executed"])
+        prepared = (after["statements_prepared"]
+                    - before["statements_prepared"])
+        print(f"{size:>9} track ids  {elapsed:6.2f} s  "
+              f"statements {executed}  prepared {prepared}")
+
+        start = time.perf_counter()
+        rows = database.iter_track_metadata(track_ids)
+        first_id, _ = next(rows)
+        first_elapsed = time.perf_counter() - start
+        streamed = 1 + sum(1 for _ in rows)
+        elapsed = time.perf_counter() - start
+        assert first_id == track_ids[0], "tracks not in the order asked for"
+        assert streamed == size, "tracks missing from the stream"
+        print(f"{size:>9} streamed   {elapsed:6.2f} s  "
+              f"first track {first_elapsed * 1000:.2f} ms")
+
+    album_ids = list(range(1, track_count // 10 + 1))
+    rng.shuffle(album_ids)
+    start = time.perf_counter()
+    albums = database.get_album_metadata(album_ids)
+    print(f"{len(album_ids):>9} album ids  "
+          f"{time.perf_counter() - start:6.2f} s")
+    assert list(albums) == album_ids, "albums not in the order asked for"
+
+    artist_ids = list(range(1, track_count // 50 + 1))
+    rng.shuffle(artist_ids)
+    start = time.perf_counter()
+    artists = database.get_artist_metadata(artist_ids)
+    print(f"{len(artist_ids):>9} artist ids "
+          f"{time.perf_counter() - start:6.2f} s")
+    assert list(artists) == artist_ids, "artists not in the order asked for"
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Time the UI's reads while a scan ingests tracks.
+
+The writer thread ingests the tracks in batches, as a scan does, while
+the main thread reads a page of "all songs", its metadata, the stats
+and the playlists every 5 ms, as the displays do. The run is repeated
+with the old rollback journal settings and with the default WAL
+profile, where the reads use a read-only connection and never wait for
+the writer. Each run ends by timing single-row writes which the caller
+waits on one at a time, where the cost of every commit shows. Usage:
+
+    python benchmarks/bench_reads_during_ingest.py [--tracks 50000]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from syntheticlibrary import MusicDatabase, track_record
+
+BATCH_SIZE = 500
+SINGLE_WRITES = 300
+ROLLBACK_JOURNAL = {"journal_mode": "DELETE", "synchronous": "FULL",
+                    "cache_size": -2000, "mmap_size": 0,
+                    "temp_store": "DEFAULT"}
+
+
+def run(label, db_path, track_count, pragmas):
+    """Ingest the tracks while timing reads, and print the latencies."""
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    database = MusicDatabase(db_path, pragmas=pragmas)
+    database.ingest_tracks(
+        [track_record(number, "seed", 500, 5000) for number in range(5000)]
+    ).result()
+
+    records = [track_record(number, "new", 500, 5000)
+               for number in range(track_count)]
+    done = threading.Event()
+
+    def scan():
+        writes = [database.ingest_tracks(records[start:start + BATCH_SIZE])
+                  for start in range(0, track_count, BATCH_SIZE)]
+        for write in writes:
+            write.result()
+        done.set()
+
+    latencies = []
+    errors = []
+    database.get_tracks_page()
+    start = time.perf_counter()
+    scanner = threading.Thread(target=scan)
+    scanner.start()
+    while not done.is_set():
+        read_start = time.perf_counter()
+        try:
+            with database.snapshot():
+                page, _ = database.get_tracks_page(limit=200)
+                database.get_track_metadata(page)
+                database.get_collection_stats("all songs")
+                database.get_playlists()
+        except sqlite3.OperationalError as error:
+            errors.append(str(error))
+        latencies.append((time.perf_counter() - read_start) * 1000)
+        time.sleep(0.005)
+    ingest_time = time.perf_counter() - start
+    scanner.join()
+
+    playlist_id = database.create_playlist("Benchmark").result()
+    start = time.perf_counter()
+    for track_id in range(1, SINGLE_WRITES + 1):
+        database.add_to_playlist(track_id, playlist_id).result()
+    single_write_time = time.perf_counter() - start
+    database.close()
+
+    latencies.sort()
+    print(f"{label:<26} ingest {ingest_time:5.1f} s  reads {len(latencies):5}  "
+          f"median {statistics.median(latencies):7.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:7.1f} ms  "
+          f"max {latencies[-1]:7.1f} ms  errors {len(errors)}")
+    print(f"{'':<26} {SINGLE_WRITES} single-row writes "
+          f"{single_write_time * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="bench_reads_during_ingest.db")
+    parser.add_argument("--tracks", type=int, default=50_000)
+    args = parser.parse_args()
+
+    run("rollback journal", args.db, args.tracks, ROLLBACK_JOURNAL)
+    run("WAL, read-only reader", args.db, args.tracks, None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Time paging "all songs" and the albums in every sort order.
+
+Each order reads an index in order, so the first page, and every page
+after a cursor, costs about the same however large the library is. The
+slowest page of each order is reported too, as a page which scanned
+through the ties on a low-cardinality key would stand out there. The
+query plans are checked for full sorts at the end. Usage:
+
+    python benchmarks/bench_sort_orders.py [--tracks 1000000]
+"""
+import argparse
+import time
+
+from syntheticlibrary import build_library, MusicDatabase
+from musicdatabase import TRACK_SORTS
+from albumsdatabase import ALBUM_SORT_ORDERS
+
+PAGE_SIZE = 200
+# The pages whose times are reported.
+REPORTED_PAGES = (1, 10, 100, 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="bench_sort_orders.db")
+    parser.add_argument("--tracks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    build_library(args.db, args.tracks)
+    database = MusicDatabase(args.db)
+
+    page_count = min(max(REPORTED_PAGES), args.tracks // PAGE_SIZE)
+    for sort_key in TRACK_SORTS:
+        times = []
+        after = None
+        for _ in range(page_count):
+            start = time.perf_counter()
+            _, after = database.get_tracks_page("all songs", None, sort_key,
+                                                after, PAGE_SIZE)
+            times.append((time.perf_counter() - start) * 1000)
+        reported = "  ".join(f"page {page} {times[page - 1]:5.2f} ms"
+                             for page in REPORTED_PAGES if page <= page_count)
+        print(f"{sort_key:<13} {reported}  "
+              f"mean {sum(times) / len(times):5.2f} ms  "
+              f"max {max(times):5.2f} ms")
+
+    for sort_by in ALBUM_SORT_ORDERS:
+        start = time.perf_counter()
+        database.get_all_albums(sort_by)
+        print(f"albums by {sort_by:<13} "
+              f"{(time.perf_counter() - start) * 1000:7.1f} ms")
+
+    database.verify_query_plans()
+    print("query plans use indexes, with no full sorts")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Build made-up libraries for the benchmarks and tests.
+
+The rows are inserted straight into the tables, which is much faster
+than scanning files, while the schema's triggers keep the search index
+and collection stats up to date as the app's own writes would. Single
+track records are made up for the code paths which ingest them.
+"""
+import os
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+# The benchmarks are run from anywhere, so they find the app's modules
+# through the repository root.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from musicdatabase import MusicDatabase  # noqa: E402
+
+GENRES = ["Rock", "Pop", "Jazz", "Hip Hop", "Classical"]
+
+
+def build_library(db_path, track_count, seed=0):
+    """
+    Create a library of made-up tracks, unless it already exists.
+
+    There is one album for every ten tracks and one artist for every
+    five albums. Names are random words, so name orders and searches
+    don't follow the insertion order.
+
+    Parameters
+    ----------
+    db_path : str
+        The path of the database file.
+    track_count : int
+        The number of tracks in the library.
+    seed : int, optional
+        The seed of the random names and counters.
+    """
+    if os.path.exists(db_path):
+        return
+    MusicDatabase(db_path).close()
+
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ra", "ne", "to", "su", "vi", "da",
+                 "pe", "zo", "ri", "ba", "go", "lu", "che", "fa", "ho"]
+    vocabulary = list({
+        "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        for _ in range(30000)
+    })
+
+    def words(count):
+        return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+    album_count = max(1, track_count // 10)
+    artist_count = max(1, album_count // 5)
+
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO artists (artist_id, artist_name) VALUES (?, ?)",
+        ((artist_id, f"{words(2)} {artist_id}")
+         for artist_id in range(1, artist_count + 1))
+    )
+    connection.executemany(
+        '''INSERT INTO albums (album_id, album_name, release_date, artist_id)
+        VALUES (?, ?, ?, ?)''',
+        ((album_id, words(3), str(1960 + album_id % 60),
+          album_id % artist_count + 1)
+         for album_id in range(1, album_count + 1))
+    )
+    connection.executemany(
+        '''INSERT INTO tracks (track_name, release_date, genre, duration,
+        file_path, track_number, album_id, artist_id, date_added,
+        play_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        ((words(3), str(1960 + number % 60), rng.choice(GENRES),
+          float(rng.randint(60, 600)), f"/music/{number}.mp3",
+          number % 12 + 1, number % album_count + 1,
+          (number % album_count) % artist_count + 1,
+          1700000000 + rng.randrange(30000000), rng.randrange(200))
+         for number in range(track_count))
+    )
+    connection.commit()
+    connection.close()
+
+
+def track_record(number, folder="library", artist_count=7, album_count=11,
+                 **tags):
+    """
+    Return the tag record of a made-up track, as a scan would read it.
+
+    The artist, album, release date and genres cycle with `number`, and
+    every fifth track is on a compilation.
+
+    Parameters
+    ----------
+    number : int
+        The number of the track, unique within its folder.
+    folder : str, optional
+        The folder the track's file is in, which is also part of its
+        title so the same numbers in two folders aren't duplicates.
+    artist_count : int, optional
+        The number of artists the tracks are spread over.
+    album_count : int, optional
+        The number of album names the tracks are spread over.
+    **tags
+        Tags replacing the made-up ones.
+
+    Returns
+    -------
+    dict
+        The record to pass to `MusicDatabase.ingest_tracks()`.
+    """
+    record = {
+        "track_name": f"{folder} {number}",
+        "artist": f"Artist {number % artist_count}",
+        "album": f"Album {number % album_count}",
+        "album_artist": "Various Artists" if number % 5 == 0 else None,
+        "track_number": number % 12,
+        "release_date": str(1990 + number % 9),
+        "genre": GENRES[number % 3:number % 3 + 2],
+        "duration": float(number % 300 + 1),
+        "file_path": f"/music/{folder}/{number}.mp3",
+        "file_size": 1000 + number,
+        "file_mtime": number,
+        "content_hash": f"{folder}-{number}",
+    }
+    record.update(tags)
+    return record
@@ -8,7 +8,8 @@ class CollectionsHeader(tk.Frame):
 
     def __init__(self, parent, play_all_command,
                  collection_type, collection_title, collection_id,
-                 track_count, duration, subtitle=None):
+                 track_count, duration, subtitle=None,
+                 sort_options=None, sort_key=None, sort_command=None):
         """
         Initialise a `CollectionsHeader` instance.
 
@@ -18,7 +19,7 @@ class CollectionsHeader(tk.Frame):
             The parent widget containing this frame.
         play_all_command : callable
             The method to play all tracks in the collection.
-        collection_type : {"all songs", "album", "artist", "playlist"}
+        collection_type : {"all songs", "album", "artist", "playlist", "genre", "most played", "recently played", "search"}
             The type of music collection being displayed.
         collection_title : str
             The title of the specific collection.
@@ -32,6 +33,14 @@ class CollectionsHeader(tk.Frame):
             Collection subtitle, e.g., an album would have the artist's
             name as a subtitle. `None` is the default value, and will
             result in no subtitle.
+        sort_options : dict, optional
+            Maps the sort keys the collection can be ordered by to their
+            labels. `None` is the default value, and will result in no
+            sort menu.
+        sort_key : str, optional
+            The sort key the collection is currently ordered by.
+        sort_command : callable, optional
+            Called with the chosen sort key when the order is changed.
         """
         super().__init__(parent)
         self._parent = parent
@@ -42,6 +51,9 @@ class CollectionsHeader(tk.Frame):
         self._track_count = track_count
         self._duration = duration
         self._subtitle = subtitle
+        self._sort_options = sort_options
+        self._sort_key = sort_key
+        self._sort_command = sort_command
 
         self._colour_scheme = colour_scheme
 
@@ -63,6 +75,14 @@ class CollectionsHeader(tk.Frame):
             icon = "💿"
         elif self._collection_type == "artist":
             icon = "👤"
+        elif self._collection_type == "genre":
+            icon = "🏷️"
+        elif self._collection_type == "most played":
+            icon = "🔥"
+        elif self._collection_type == "recently played":
+            icon = "🕘"
+        elif self._collection_type == "search":
+            icon = "🔍"
         else:
             icon = ""
         header_text = tk.Label(self,
@@ -105,4 +125,20 @@ class CollectionsHeader(tk.Frame):
                                  font=("Arial", 12, "bold"))
         duration_text.grid(row=1, column=3, padx=10)
 
+        if self._sort_options:
+            self._create_sort_menu()
+
         return header_text, play_all_button, track_count_text, duration_text
+
+    def _create_sort_menu(self):
+        """Create the menu for choosing the order of the collection."""
+        keys_by_label = {label: key for key, label in self._sort_options.items()}
+        selected = tk.StringVar(self, self._sort_options[self._sort_key])
+        sort_menu = tk.OptionMenu(
+            self, selected, *keys_by_label,
+            command=lambda label: self._sort_command(keys_by_label[label])
+        )
+        sort_menu.config(bg=self._colour_scheme["grey"], fg="white",
+                         font=("Arial", 12), highlightthickness=0,
+                         relief="flat")
+        sort_menu.grid(row=1, column=4, padx=10)
@@ -0,0 +1,546 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+# Pragmas set on every connection. The journal mode is persistent and
+# is only set from a writable connection. Write-ahead logging lets
+# readers keep reading a consistent snapshot while a write commits, and
+# makes `synchronous = NORMAL` safe against corruption; a power loss
+# can only lose the last commits. Foreign keys are enforced so that
+# deletes cascade to the rows referencing the deleted row.
+DEFAULT_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -32768,  # In KiB, so 32 MiB per connection.
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+# The name profiled statements are recorded under outside any
+# `labelled()` block.
+UNLABELLED = "(unlabelled)"
+
+
+class ConnectionManager:
+    """
+    Class which owns the connections to the database.
+
+    Each thread is handed its own long-lived connection, opened the
+    first time that thread touches the database and kept open until
+    `close()` is called or the thread has exited, so a connection is
+    never used by two threads at once. The connections of exited
+    threads are closed when the next connection is opened, so a pool
+    of short-lived threads doesn't leak them. Prepared statements are
+    cached on every connection, so repeated queries are parsed once.
+
+    Once a thread has claimed writes with `claim_writes()`, every other
+    thread is given a read-only connection instead. The writing thread
+    can lend its connection to one other thread at a time, while it
+    leaves the connection alone.
+
+    If a `QueryProfiler` is given, every statement is timed up to its
+    first row and recorded under the label set with `labelled()`. The
+    rows of a query are counted as the caller fetches them, so results
+    are still streamed.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+
+    Methods
+    -------
+    get_connection():
+        Return the connection belonging to the calling thread.
+    claim_writes():
+        Make the calling thread the only one with a writable connection.
+    lend_connection():
+        Return the calling thread's connection for another to borrow.
+    borrow(loan):
+        Context manager using a lent connection on the calling thread.
+    execute(sql, parameters=()):
+        Execute a statement on the calling thread's connection.
+    executemany(sql, seq_of_parameters):
+        Execute a statement once for every set of parameters.
+    labelled(label):
+        Context manager naming the statements executed in the block.
+    transaction():
+        Context manager grouping statements into a single commit.
+    in_transaction():
+        Return True if the calling thread is in a transaction.
+    snapshot():
+        Context manager reading from a single snapshot of the database.
+    get_stats():
+        Return the connection and statement counters.
+    explain_query_plan(sql, parameters=()):
+        Return the query plan of a statement.
+    explain_query_plans():
+        Return the query plan of every statement executed so far.
+    close():
+        Close every connection opened by the manager.
+    """
+
+    def __init__(self, db_path, cached_statements=128,
+                 recorded_statements=1000, pragmas=None, profiler=None):
+        """
+        Initialise a `ConnectionManager` instance.
+
+        Parameters
+        ----------
+        db_path : str
+            The path to the database.
+        cached_statements : int, optional
+            The number of prepared statements cached per connection.
+        recorded_statements : int, optional
+            The number of distinct statements remembered, with their
+            most recent parameters, for `explain_query_plans()`.
+        pragmas : dict, optional
+            Pragmas overriding those in `DEFAULT_PRAGMAS`.
+        profiler : QueryProfiler, optional
+            Records the cost of every statement executed. Statements
+            are not timed if it is not given.
+        """
+        self._db_path = db_path
+        self._cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Each open connection, mapped to the thread it belongs to.
+        self._connections = {}
+        self._closed = False
+        self._recorded_statements = recorded_statements
+        self._statements = OrderedDict()
+        self._pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._writer_thread = None
+        self._borrower_thread = None
+        self._profiler = profiler
+
+        self._connections_opened = 0
+        self._statements_executed = 0
+        self._statements_prepared = 0
+
+    def _open_connection(self, read_only):
+        """Open a new connection for the calling thread."""
+        start = time.perf_counter()
+        if read_only:
+            database = f"{Path(self._db_path).absolute().as_uri()}?mode=ro"
+        else:
+            database = self._db_path
+
+        # Transactions are managed explicitly by `transaction()`, so
+        # the connection is left in autocommit mode.
+        connection = sqlite3.connect(
+            database,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self._cached_statements,
+            uri=read_only
+        )
+        for pragma, value in self._pragmas.items():
+            if pragma == "journal_mode" and read_only:
+                continue
+            connection.execute(f"PRAGMA {pragma} = {value}")
+
+        self._local.connection = connection
+        self._local.read_only = read_only
+        self._local.depth = 0
+        self._local.statement_cache = OrderedDict()
+
+        with self._lock:
+            abandoned = [other for other, thread in self._connections.items()
+                         if not thread.is_alive()]
+            for other in abandoned:
+                del self._connections[other]
+            self._connections[connection] = threading.current_thread()
+            self._connections_opened += 1
+        for other in abandoned:
+            other.close()
+
+        if self._profiler is not None:
+            self._profiler.record_connection(time.perf_counter() - start)
+        return connection
+
+    def _count_statement(self, sql, parameters=()):
+        """Update the statement counters for an executed statement."""
+        # Mirrors the connection's LRU statement cache to count how
+        # often a statement has to be prepared rather than reused.
+        statement_cache = self._local.statement_cache
+        prepared = sql not in statement_cache
+        if prepared:
+            statement_cache[sql] = None
+            if len(statement_cache) > self._cached_statements:
+                statement_cache.popitem(last=False)
+        else:
+            statement_cache.move_to_end(sql)
+
+        with self._lock:
+            self._statements_executed += 1
+            if prepared:
+                self._statements_prepared += 1
+
+            self._statements[sql] = parameters
+            self._statements.move_to_end(sql)
+            if len(self._statements) > self._recorded_statements:
+                self._statements.popitem(last=False)
+
+    def get_connection(self):
+        """Return the connection belonging to the calling thread."""
+        if self._closed:
+            raise sqlite3.ProgrammingError(
+                "Cannot operate on a closed database."
+            )
+
+        current_thread = threading.current_thread()
+        read_only = (self._writer_thread is not None
+                     and current_thread is not self._writer_thread
+                     and current_thread is not self._borrower_thread)
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.read_only != read_only:
+            # Writes were claimed since this thread's connection opened.
+            self._close_connection(connection)
+            connection = None
+        if connection is None:
+            connection = self._open_connection(read_only)
+        return connection
+
+    def _close_connection(self, connection):
+        """Close a connection and forget it."""
+        with self._lock:
+            self._connections.pop(connection, None)
+        self._local.connection = None
+        connection.close()
+
+    def claim_writes(self):
+        """
+        Make the calling thread the only one with a writable connection.
+
+        Connections on other threads are reopened read-only, so reads
+        elsewhere can never take the write lock.
+        """
+        self._writer_thread = threading.current_thread()
+
+    def lend_connection(self):
+        """
+        Return the calling thread's connection for another to borrow.
+
+        The connection must not be used by the calling thread until the
+        borrower's `borrow()` block has ended.
+
+        Returns
+        -------
+        tuple
+            The loan to pass to `borrow()`.
+        """
+        connection = self.get_connection()
+        return connection, self._local.statement_cache
+
+    @contextmanager
+    def borrow(self, loan):
+        """
+        Use a lent connection as the calling thread's own in the block.
+
+        The thread's own connection, and any transaction open on it, is
+        put aside and restored when the block ends.
+
+        Parameters
+        ----------
+        loan : tuple
+            The loan returned by `lend_connection()`.
+        """
+        connection, statement_cache = loan
+        saved = {name: getattr(self._local, name, None)
+                 for name in ("connection", "read_only", "depth",
+                              "statement_cache")}
+        self._local.connection = connection
+        self._local.read_only = False
+        self._local.depth = 0
+        self._local.statement_cache = statement_cache
+        self._borrower_thread = threading.current_thread()
+        try:
+            yield connection
+        finally:
+            self._borrower_thread = None
+            for name, value in saved.items():
+                setattr(self._local, name, value)
+
+    def execute(self, sql, parameters=()):
+        """Execute a statement and return the cursor."""
+        connection = self.get_connection()
+        self._count_statement(sql, parameters)
+        if self._profiler is None:
+            return connection.execute(sql, parameters)
+
+        start = time.perf_counter()
+        cursor = connection.execute(sql, parameters)
+        seconds = time.perf_counter() - start
+        label = getattr(self._local, "label", None) or UNLABELLED
+        if cursor.description is None:
+            self._profile(label, sql, parameters, seconds, cursor.rowcount)
+            return cursor
+        self._profile(label, sql, parameters, seconds, 0)
+        return _ProfiledCursor(cursor, self._profiler, label, sql)
+
+    def executemany(self, sql, seq_of_parameters):
+        """Execute a statement once for every set of parameters."""
+        seq_of_parameters = list(seq_of_parameters)
+        connection = self.get_connection()
+        first_parameters = seq_of_parameters[0] if seq_of_parameters else ()
+        self._count_statement(sql, first_parameters)
+        if self._profiler is None:
+            return connection.executemany(sql, seq_of_parameters)
+
+        start = time.perf_counter()
+        cursor = connection.executemany(sql, seq_of_parameters)
+        seconds = time.perf_counter() - start
+        label = getattr(self._local, "label", None) or UNLABELLED
+        self._profile(label, sql, first_parameters, seconds, cursor.rowcount)
+        return cursor
+
+    @contextmanager
+    def labelled(self, label):
+        """
+        Name the statements executed in the block for the profiler.
+
+        The label is kept until the block ends, including by a nested
+        block, so a method's statements are named after the outermost
+        labelled method that called it.
+
+        Parameters
+        ----------
+        label : str
+            The name to record the statements under, usually the
+            qualified name of the method running them.
+        """
+        if self._profiler is None or getattr(self._local, "label", None):
+            yield
+            return
+        self._local.label = label
+        try:
+            yield
+        finally:
+            self._local.label = None
+
+    def _profile(self, label, sql, parameters, seconds, rows):
+        """Record an executed statement with the profiler."""
+        self._profiler.record_query(label, sql, seconds, rows)
+        if self._profiler.is_slow(seconds):
+            self._profiler.record_slow_query(
+                label, sql, parameters, seconds,
+                self.explain_query_plan(sql, parameters)
+            )
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group the statements executed in the block into one commit.
+
+        Transactions may be nested. An inner block becomes a savepoint
+        so that it can be rolled back without abandoning the outer
+        transaction. The transaction is rolled back if the block
+        raises an exception.
+        """
+        connection = self.get_connection()
+        depth = self._local.depth
+        savepoint = f"savepoint_{depth}"
+
+        if depth == 0:
+            connection.execute("BEGIN IMMEDIATE")
+        else:
+            connection.execute(f"SAVEPOINT {savepoint}")
+        self._local.depth += 1
+
+        try:
+            yield connection
+        except BaseException:
+            self._local.depth -= 1
+            if depth == 0:
+                connection.execute("ROLLBACK")
+            else:
+                connection.execute(f"ROLLBACK TO {savepoint}")
+                connection.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            self._local.depth -= 1
+            if depth == 0:
+                connection.execute("COMMIT")
+            else:
+                connection.execute(f"RELEASE {savepoint}")
+
+    def in_transaction(self):
+        """Return True if the calling thread is in a transaction or snapshot."""
+        return (getattr(self._local, "depth", None) or 0) > 0
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Read every statement executed in the block from one snapshot.
+
+        Writes committed while the block runs are not seen until it
+        ends, so a view built from several queries is consistent.
+        Snapshots may be nested.
+        """
+        connection = self.get_connection()
+        if self._local.depth > 0:
+            yield connection
+            return
+
+        connection.execute("BEGIN")
+        self._local.depth += 1
+        try:
+            yield connection
+        finally:
+            self._local.depth -= 1
+            connection.execute("COMMIT")
+
+    def get_stats(self):
+        """
+        Return the connection and statement counters.
+
+        Returns
+        -------
+        dict
+            Dictionary containing the number of connections opened,
+            the number currently open, the number of statements
+            executed and how many of those had to be prepared.
+        """
+        with self._lock:
+            return {
+                "connections_opened": self._connections_opened,
+                "open_connections": len(self._connections),
+                "statements_executed": self._statements_executed,
+                "statements_prepared": self._statements_prepared
+            }
+
+    def explain_query_plan(self, sql, parameters=()):
+        """
+        Return the query plan of a statement.
+
+        Parameters
+        ----------
+        sql : str
+            The statement to explain.
+        parameters : tuple, optional
+            The parameters to explain it with.
+
+        Returns
+        -------
+        list of str
+            The plan's detail strings. Empty if the statement has no
+            query plan, such as a schema change or pragma, or refers to
+            something that no longer exists, e.g. a temporary table.
+        """
+        keyword = sql.split(None, 1)[0].upper()
+        if keyword not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            return []
+        try:
+            rows = self.get_connection().execute(
+                f"EXPLAIN QUERY PLAN {sql}", parameters
+            ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [row[3] for row in rows]
+
+    def explain_query_plans(self):
+        """
+        Return the query plan of every statement executed so far.
+
+        Each recorded query is explained with the parameters it was
+        most recently executed with. Statements that have no query
+        plan, such as schema changes and pragmas, are skipped.
+
+        Returns
+        -------
+        dict
+            Dictionary where the keys are the SQL statements and the
+            values are lists of the plan's detail strings.
+        """
+        with self._lock:
+            statements = list(self._statements.items())
+
+        plans = {}
+        for sql, parameters in statements:
+            plan = self.explain_query_plan(sql, parameters)
+            if plan:
+                plans[sql] = plan
+
+        return plans
+
+    def close(self):
+        """Close every connection opened by the manager."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = {}
+            self._closed = True
+
+        for connection in connections:
+            connection.close()
+
+
+class _ProfiledCursor:
+    """
+    A cursor which counts the rows fetched through it for the profiler.
+
+    The count is added to the query's total when the rows run out or
+    the cursor is closed or discarded, so rows are still read one at a
+    time rather than fetched up front.
+    """
+
+    def __init__(self, cursor, profiler, label, sql):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._label = label
+        self._sql = sql
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            row = next(self._cursor)
+        except StopIteration:
+            self._record_rows()
+            raise
+        self._rows += 1
+        return row
+
+    def __del__(self):
+        self._record_rows()
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None:
+            self._record_rows()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self._cursor.arraysize
+        rows = self._cursor.fetchmany(size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._record_rows()
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._rows += len(rows)
+        self._record_rows()
+        return rows
+
+    def close(self):
+        self._record_rows()
+        self._cursor.close()
+
+    def _record_rows(self):
+        """Add the rows fetched since the last call to the profile."""
+        if self._rows:
+            self._profiler.record_rows(self._label, self._sql, self._rows)
+            self._rows = 0
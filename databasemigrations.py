@@ -0,0 +1,895 @@
+import json
+import sqlite3
+
+from connectionmanager import ConnectionManager
+from genresdatabase import split_genres
+
+
+def _add_lookup_indexes(connection_manager: ConnectionManager):
+    """Create indexes for the lookups made by the database classes."""
+    index_statements = [
+        '''CREATE INDEX IF NOT EXISTS idx_artists_name
+        ON artists(artist_name)''',
+        '''CREATE INDEX IF NOT EXISTS idx_artists_name_nocase
+        ON artists(artist_name COLLATE NOCASE)''',
+        '''CREATE INDEX IF NOT EXISTS idx_albums_name_artist
+        ON albums(album_name, artist_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_albums_name_nocase
+        ON albums(album_name COLLATE NOCASE)''',
+        '''CREATE INDEX IF NOT EXISTS idx_albums_artist
+        ON albums(artist_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_tracks_album
+        ON tracks(album_id, track_number)''',
+        '''CREATE INDEX IF NOT EXISTS idx_tracks_artist
+        ON tracks(artist_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_tracks_identity
+        ON tracks(track_name, artist_id, album_id, release_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_tracks_name_nocase
+        ON tracks(track_name COLLATE NOCASE)''',
+        '''CREATE INDEX IF NOT EXISTS idx_playlist_tracks_position
+        ON playlist_tracks(playlist_id, position)''',
+        '''CREATE INDEX IF NOT EXISTS idx_playlist_tracks_track
+        ON playlist_tracks(track_id)''',
+    ]
+    for statement in index_statements:
+        connection_manager.execute(statement)
+
+
+def _add_unique_artist_and_album_keys(connection_manager: ConnectionManager):
+    """
+    Make artist names and (album name, artist) pairs unique.
+
+    Duplicate rows are merged into the lowest id before the unique
+    indexes are created, so that the ingest path can upsert on them.
+    Rows pointing at a deleted artist or album keep their dangling id,
+    since the remap finds nothing for them; version 8 drops them.
+    """
+    # Point tracks and albums at the first artist with each name.
+    connection_manager.execute('''
+        UPDATE tracks SET artist_id = COALESCE((
+            SELECT MIN(duplicate.artist_id) FROM artists AS duplicate
+            JOIN artists AS original
+            ON original.artist_name = duplicate.artist_name
+            WHERE original.artist_id = tracks.artist_id
+        ), tracks.artist_id) /* full scan */
+    ''')
+    connection_manager.execute('''
+        UPDATE albums SET artist_id = COALESCE((
+            SELECT MIN(duplicate.artist_id) FROM artists AS duplicate
+            JOIN artists AS original
+            ON original.artist_name = duplicate.artist_name
+            WHERE original.artist_id = albums.artist_id
+        ), albums.artist_id) /* full scan */
+    ''')
+    connection_manager.execute('''
+        DELETE FROM artists WHERE artist_id NOT IN (
+            SELECT MIN(artist_id) FROM artists GROUP BY artist_name
+        ) /* full scan */
+    ''')
+
+    # Point tracks at the first album with each name and artist.
+    connection_manager.execute('''
+        UPDATE tracks SET album_id = COALESCE((
+            SELECT MIN(duplicate.album_id) FROM albums AS duplicate
+            JOIN albums AS original
+            ON original.album_name = duplicate.album_name
+            AND original.artist_id = duplicate.artist_id
+            WHERE original.album_id = tracks.album_id
+        ), tracks.album_id) /* full scan */
+    ''')
+    connection_manager.execute('''
+        DELETE FROM albums WHERE album_id NOT IN (
+            SELECT MIN(album_id) FROM albums GROUP BY album_name, artist_id
+        ) /* full scan */
+    ''')
+
+    connection_manager.execute('DROP INDEX IF EXISTS idx_artists_name')
+    connection_manager.execute('DROP INDEX IF EXISTS idx_albums_name_artist')
+    connection_manager.execute('''CREATE UNIQUE INDEX idx_artists_name
+        ON artists(artist_name)''')
+    connection_manager.execute('''CREATE UNIQUE INDEX idx_albums_identity
+        ON albums(album_name, artist_id)''')
+
+
+def _space_playlist_positions(connection_manager: ConnectionManager):
+    """Renumber playlist positions with gaps of 1024 between tracks."""
+    connection_manager.execute('''
+        UPDATE playlist_tracks
+        SET position = ranked.row_number * 1024
+        FROM (
+            SELECT identifier,
+                ROW_NUMBER() OVER (
+                    PARTITION BY playlist_id ORDER BY position, identifier
+                ) AS row_number
+            FROM playlist_tracks
+        ) AS ranked
+        WHERE playlist_tracks.identifier = ranked.identifier /* full scan */
+    ''')
+
+
+def _create_search_triggers(connection_manager: ConnectionManager):
+    """Create the triggers keeping `track_search` in sync."""
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_search_insert
+        AFTER INSERT ON tracks
+        BEGIN
+            INSERT INTO track_search (
+                rowid, track_name, artist_name, album_name, genre
+            )
+            SELECT new.track_id, new.track_name,
+                (SELECT artist_name FROM artists
+                 WHERE artist_id = new.artist_id),
+                (SELECT album_name FROM albums
+                 WHERE album_id = new.album_id),
+                new.genre;
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_search_delete
+        AFTER DELETE ON tracks
+        BEGIN
+            DELETE FROM track_search WHERE rowid = old.track_id;
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_search_update
+        AFTER UPDATE OF track_name, genre, artist_id, album_id ON tracks
+        BEGIN
+            UPDATE track_search SET
+                track_name = new.track_name,
+                artist_name = (SELECT artist_name FROM artists
+                               WHERE artist_id = new.artist_id),
+                album_name = (SELECT album_name FROM albums
+                              WHERE album_id = new.album_id),
+                genre = new.genre
+            WHERE rowid = new.track_id;
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_search_artist_update
+        AFTER UPDATE OF artist_name ON artists
+        WHEN old.artist_name IS NOT new.artist_name
+        BEGIN
+            UPDATE track_search SET artist_name = new.artist_name
+            WHERE rowid IN (SELECT track_id FROM tracks
+                            WHERE artist_id = new.artist_id);
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_search_album_update
+        AFTER UPDATE OF album_name ON albums
+        WHEN old.album_name IS NOT new.album_name
+        BEGIN
+            UPDATE track_search SET album_name = new.album_name
+            WHERE rowid IN (SELECT track_id FROM tracks
+                            WHERE album_id = new.album_id);
+        END
+    ''')
+
+
+def _add_search_index(connection_manager: ConnectionManager):
+    """Create and populate the full-text search index over tracks."""
+    # The rowid of each entry is the track's `track_id`.
+    connection_manager.execute('''
+        CREATE VIRTUAL TABLE track_search USING fts5(
+            track_name, artist_name, album_name, genre,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        )
+    ''')
+    # Rank with BM25, weighting the title above the other columns.
+    connection_manager.execute('''
+        INSERT INTO track_search (track_search, rank)
+        VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 1.0)')
+    ''')
+    connection_manager.execute('''
+        INSERT INTO track_search (
+            rowid, track_name, artist_name, album_name, genre
+        )
+        SELECT tracks.track_id, tracks.track_name, artists.artist_name,
+            albums.album_name, tracks.genre
+        FROM tracks
+        JOIN artists ON artists.artist_id = tracks.artist_id
+        JOIN albums ON albums.album_id = tracks.album_id
+    ''')
+    _create_search_triggers(connection_manager)
+
+
+def _add_sort_columns_and_indexes(connection_manager: ConnectionManager):
+    """
+    Add the `date_added` and `play_count` columns and the sort indexes.
+
+    Tracks added before this version have a `date_added` of 0. Each
+    index ends with the implicit `track_id`, so it covers the keyset
+    pages of its sort order.
+    """
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN date_added INTEGER NOT NULL DEFAULT 0
+    ''')
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN play_count INTEGER NOT NULL DEFAULT 0
+    ''')
+
+    index_statements = [
+        '''CREATE INDEX idx_tracks_release_date
+        ON tracks(release_date)''',
+        '''CREATE INDEX idx_tracks_duration
+        ON tracks(duration)''',
+        '''CREATE INDEX idx_tracks_date_added
+        ON tracks(date_added)''',
+        '''CREATE INDEX idx_tracks_play_count
+        ON tracks(play_count)''',
+        '''CREATE INDEX idx_albums_release_date
+        ON albums(release_date)''',
+    ]
+    for statement in index_statements:
+        connection_manager.execute(statement)
+
+
+def _track_stats_sql(row, sign):
+    """
+    Return statements adding a track to its album, artist and library
+    stats, or subtracting it when `sign` is "-". `row` is "new" or "old".
+    """
+    collections = (("all songs", "0"),
+                   ("album", f"{row}.album_id"),
+                   ("artist", f"{row}.artist_id"))
+    # A subtraction only updates existing rows, as the collection's row
+    # is already gone if the collection was deleted first.
+    if sign == "-":
+        return "".join(f'''
+            UPDATE collection_stats
+            SET track_count = track_count - 1,
+                total_duration = total_duration - {row}.duration
+            WHERE collection_type = '{collection_type}'
+            AND collection_id = {collection_id};'''
+            for collection_type, collection_id in collections)
+
+    return "".join(f'''
+            INSERT INTO collection_stats (
+                collection_type, collection_id, track_count, total_duration
+            )
+            VALUES ('{collection_type}', {collection_id}, 1, {row}.duration)
+            ON CONFLICT (collection_type, collection_id) DO UPDATE SET
+                track_count = track_count + 1,
+                total_duration = total_duration + excluded.total_duration;'''
+        for collection_type, collection_id in collections)
+
+
+def _playlist_stats_sql(row, sign, collection_type="playlist",
+                        id_column="playlist_id"):
+    """
+    Return a statement adding a playlist entry's track to the playlist's
+    stats, or subtracting it when `sign` is "-". Genre links are counted
+    the same way, with their own `collection_type` and `id_column`.
+    """
+    # Entries whose track has already been deleted are skipped, as the
+    # track's playlists were updated when it was deleted.
+    if sign == "-":
+        return f'''
+            UPDATE collection_stats
+            SET track_count = track_count - 1,
+                total_duration = total_duration - tracks.duration
+            FROM tracks
+            WHERE tracks.track_id = {row}.track_id
+            AND collection_stats.collection_type = '{collection_type}'
+            AND collection_stats.collection_id = {row}.{id_column};'''
+
+    return f'''
+            INSERT INTO collection_stats (
+                collection_type, collection_id, track_count, total_duration
+            )
+            SELECT '{collection_type}', {row}.{id_column}, 1, duration
+            FROM tracks WHERE track_id = {row}.track_id
+            ON CONFLICT (collection_type, collection_id) DO UPDATE SET
+                track_count = track_count + 1,
+                total_duration = total_duration + excluded.total_duration;'''
+
+
+def _create_stats_triggers(connection_manager: ConnectionManager):
+    """Create the triggers keeping `collection_stats` exact."""
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_track_insert
+        AFTER INSERT ON tracks
+        BEGIN{_track_stats_sql("new", "")}
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_track_delete
+        AFTER DELETE ON tracks
+        BEGIN{_track_stats_sql("old", "-")}
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_track_update
+        AFTER UPDATE OF duration, album_id, artist_id ON tracks
+        WHEN old.duration IS NOT new.duration
+            OR old.album_id IS NOT new.album_id
+            OR old.artist_id IS NOT new.artist_id
+        BEGIN{_track_stats_sql("old", "-")}{_track_stats_sql("new", "")}
+            UPDATE collection_stats
+            SET total_duration = total_duration + (
+                SELECT COUNT(*) FROM playlist_tracks
+                WHERE playlist_id = collection_stats.collection_id
+                AND track_id = new.track_id
+            ) * (new.duration - old.duration)
+            WHERE collection_type = 'playlist'
+            AND collection_id IN (SELECT playlist_id FROM playlist_tracks
+                                  WHERE track_id = new.track_id);
+        END
+    ''')
+    # A track's playlists are updated before it is deleted, while its
+    # duration can still be read for each of its playlist entries.
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_track_playlists_delete
+        BEFORE DELETE ON tracks
+        BEGIN
+            UPDATE collection_stats
+            SET track_count = track_count - entries.entry_count,
+                total_duration = total_duration
+                    - entries.entry_count * old.duration
+            FROM (
+                SELECT playlist_id, COUNT(*) AS entry_count
+                FROM playlist_tracks WHERE track_id = old.track_id
+                GROUP BY playlist_id
+            ) AS entries
+            WHERE collection_stats.collection_type = 'playlist'
+            AND collection_stats.collection_id = entries.playlist_id;
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_playlist_insert
+        AFTER INSERT ON playlist_tracks
+        BEGIN{_playlist_stats_sql("new", "")}
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_playlist_delete
+        AFTER DELETE ON playlist_tracks
+        BEGIN{_playlist_stats_sql("old", "-")}
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_playlist_update
+        AFTER UPDATE OF playlist_id, track_id ON playlist_tracks
+        WHEN old.playlist_id IS NOT new.playlist_id
+            OR old.track_id IS NOT new.track_id
+        BEGIN{_playlist_stats_sql("old", "-")}{_playlist_stats_sql("new", "")}
+        END
+    ''')
+    for table, collection_type, id_column in (
+            ("albums", "album", "album_id"),
+            ("artists", "artist", "artist_id"),
+            ("playlists", "playlist", "playlist_id")):
+        connection_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS collection_stats_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM collection_stats
+                WHERE collection_type = '{collection_type}'
+                AND collection_id = old.{id_column};
+            END
+        ''')
+
+
+def _add_collection_stats(connection_manager: ConnectionManager):
+    """
+    Create and populate the `collection_stats` table.
+
+    The table holds the number of tracks and their total duration for
+    every album, artist and playlist, and for the whole library under
+    the collection type "all songs" with id 0.
+    """
+    connection_manager.execute('''
+        CREATE TABLE collection_stats (
+            collection_type TEXT NOT NULL,
+            collection_id INTEGER NOT NULL,
+            track_count INTEGER NOT NULL,
+            total_duration REAL NOT NULL,
+            PRIMARY KEY (collection_type, collection_id)
+        ) WITHOUT ROWID
+    ''')
+    _count_collection_stats(connection_manager)
+    _create_stats_triggers(connection_manager)
+
+
+def _count_collection_stats(connection_manager: ConnectionManager):
+    """Fill `collection_stats` for the library, albums, artists and playlists."""
+    connection_manager.execute('''
+        INSERT INTO collection_stats
+        SELECT 'all songs', 0, COUNT(*), COALESCE(SUM(duration), 0)
+        FROM tracks
+    ''')
+    for collection_type, column in (("album", "album_id"),
+                                    ("artist", "artist_id")):
+        connection_manager.execute(f'''
+            INSERT INTO collection_stats
+            SELECT '{collection_type}', {column}, COUNT(*), SUM(duration)
+            FROM tracks
+            GROUP BY {column}
+        ''')
+    connection_manager.execute('''
+        INSERT INTO collection_stats
+        SELECT 'playlist', playlist_tracks.playlist_id,
+            COUNT(*), SUM(tracks.duration)
+        FROM playlist_tracks
+        JOIN tracks ON tracks.track_id = playlist_tracks.track_id
+        GROUP BY playlist_tracks.playlist_id
+    ''')
+
+
+def _add_genres(connection_manager: ConnectionManager):
+    """
+    Create the `genres` and `track_genres` tables from the genre tags.
+
+    The scanner used to store the repr of the tag's list of values in
+    `tracks.genre`. Each value becomes a genre linked to the track, and
+    the column is rewritten as the names joined with "; " so that it
+    reads, and is searched, as plain text. The genre stats are kept in
+    `collection_stats` under the collection type "genre".
+    """
+    connection_manager.execute('''
+        CREATE TABLE genres (
+            genre_id INTEGER PRIMARY KEY,
+            genre_name TEXT NOT NULL COLLATE NOCASE UNIQUE
+        )
+    ''')
+    connection_manager.execute('''
+        CREATE TABLE track_genres (
+            genre_id INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            PRIMARY KEY (genre_id, track_id),
+            FOREIGN KEY (genre_id) REFERENCES genres(genre_id),
+            FOREIGN KEY (track_id) REFERENCES tracks(track_id)
+        ) WITHOUT ROWID
+    ''')
+    connection_manager.execute('''CREATE INDEX idx_track_genres_track
+        ON track_genres(track_id, genre_id)''')
+
+    # Tracks are grouped by tag in Python, so each distinct tag is
+    # parsed once.
+    cur = connection_manager.execute('SELECT track_id, genre FROM tracks')
+    track_ids_by_tag = {}
+    for track_id, genre in cur:
+        track_ids_by_tag.setdefault(genre, []).append(track_id)
+    tags = list(track_ids_by_tag.items())
+    names_by_tag = {genre: split_genres(genre) for genre, _ in tags}
+
+    connection_manager.executemany('''
+        INSERT INTO genres (genre_name) VALUES (?)
+        ON CONFLICT (genre_name) DO NOTHING
+    ''', ((name,) for names in names_by_tag.values() for name in names))
+    genre_ids = dict(connection_manager.execute(
+        'SELECT genre_name, genre_id FROM genres'
+    ).fetchall())
+    genre_ids = {name.casefold(): genre_id
+                 for name, genre_id in genre_ids.items()}
+
+    connection_manager.executemany('''
+        INSERT INTO track_genres (genre_id, track_id)
+        SELECT ?, value FROM json_each(?)
+    ''', ((genre_ids[name.casefold()], json.dumps(track_ids))
+          for genre, track_ids in tags for name in names_by_tag[genre]))
+    connection_manager.executemany('''
+        UPDATE tracks SET genre = ?
+        WHERE track_id IN (SELECT value FROM json_each(?))
+    ''', (("; ".join(names_by_tag[genre]), json.dumps(track_ids))
+          for genre, track_ids in tags
+          if "; ".join(names_by_tag[genre]) != genre))
+
+    _count_genre_stats(connection_manager)
+    _create_genre_triggers(connection_manager)
+
+
+def _count_genre_stats(connection_manager: ConnectionManager):
+    """Fill `collection_stats` for every genre."""
+    connection_manager.execute('''
+        INSERT INTO collection_stats
+        SELECT 'genre', track_genres.genre_id,
+            COUNT(*), SUM(tracks.duration)
+        FROM track_genres
+        JOIN tracks ON tracks.track_id = track_genres.track_id
+        GROUP BY track_genres.genre_id
+    ''')
+
+
+def _create_genre_triggers(connection_manager: ConnectionManager):
+    """Create the triggers keeping genre links and stats exact."""
+    # A track's links are deleted before it is, while its duration can
+    # still be read to update the stats of each of its genres.
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_genres_track_delete
+        BEFORE DELETE ON tracks
+        BEGIN
+            DELETE FROM track_genres WHERE track_id = old.track_id;
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_genre_insert
+        AFTER INSERT ON track_genres
+        BEGIN{_playlist_stats_sql("new", "", "genre", "genre_id")}
+        END
+    ''')
+    connection_manager.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_genre_delete
+        AFTER DELETE ON track_genres
+        BEGIN{_playlist_stats_sql("old", "-", "genre", "genre_id")}
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_track_genres_update
+        AFTER UPDATE OF duration ON tracks
+        WHEN old.duration IS NOT new.duration
+        BEGIN
+            UPDATE collection_stats
+            SET total_duration = total_duration + new.duration - old.duration
+            WHERE collection_type = 'genre'
+            AND collection_id IN (SELECT genre_id FROM track_genres
+                                  WHERE track_id = new.track_id);
+        END
+    ''')
+    connection_manager.execute('''
+        CREATE TRIGGER IF NOT EXISTS collection_stats_genres_delete
+        AFTER DELETE ON genres
+        BEGIN
+            DELETE FROM collection_stats
+            WHERE collection_type = 'genre'
+            AND collection_id = old.genre_id;
+        END
+    ''')
+
+
+# The tables rebuilt with cascading foreign keys, parents first. Each
+# table is copied without the rows whose parent no longer exists, as
+# the cascade would have deleted them.
+CASCADING_TABLES = {
+    "albums": (
+        '''CREATE TABLE albums (
+            album_id INTEGER PRIMARY KEY,
+            album_name TEXT NOT NULL,
+            release_date TEXT NOT NULL,
+            artist_id INTEGER NOT NULL
+                REFERENCES artists(artist_id) ON DELETE CASCADE
+        )''',
+        "artist_id IN (SELECT artist_id FROM artists)"
+    ),
+    "tracks": (
+        '''CREATE TABLE tracks (
+            track_id INTEGER PRIMARY KEY,
+            track_name TEXT NOT NULL,
+            release_date TEXT NOT NULL,
+            genre TEXT NOT NULL,
+            duration REAL NOT NULL,
+            file_path TEXT NOT NULL UNIQUE,
+            track_number INTEGER NOT NULL,
+            album_id INTEGER NOT NULL
+                REFERENCES albums(album_id) ON DELETE CASCADE,
+            artist_id INTEGER NOT NULL
+                REFERENCES artists(artist_id) ON DELETE CASCADE,
+            date_added INTEGER NOT NULL DEFAULT 0,
+            play_count INTEGER NOT NULL DEFAULT 0
+        )''',
+        "album_id IN (SELECT album_id FROM albums)"
+        " AND artist_id IN (SELECT artist_id FROM artists)"
+    ),
+    "playlist_tracks": (
+        '''CREATE TABLE playlist_tracks (
+            identifier INTEGER PRIMARY KEY,
+            playlist_id INTEGER NOT NULL
+                REFERENCES playlists(playlist_id) ON DELETE CASCADE,
+            track_id INTEGER NOT NULL
+                REFERENCES tracks(track_id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            UNIQUE (playlist_id, track_id, position)
+        )''',
+        "playlist_id IN (SELECT playlist_id FROM playlists)"
+        " AND track_id IN (SELECT track_id FROM tracks)"
+    ),
+    "track_genres": (
+        '''CREATE TABLE track_genres (
+            genre_id INTEGER NOT NULL
+                REFERENCES genres(genre_id) ON DELETE CASCADE,
+            track_id INTEGER NOT NULL
+                REFERENCES tracks(track_id) ON DELETE CASCADE,
+            PRIMARY KEY (genre_id, track_id)
+        ) WITHOUT ROWID''',
+        "genre_id IN (SELECT genre_id FROM genres)"
+        " AND track_id IN (SELECT track_id FROM tracks)"
+    ),
+}
+
+
+def _add_cascading_foreign_keys(connection_manager: ConnectionManager):
+    """
+    Rebuild the tables so that deletes cascade to the rows referencing them.
+
+    SQLite can't alter a foreign key, so each table is copied into a new
+    table declaring `ON DELETE CASCADE`, following SQLite's procedure
+    for schema changes, which `migrate()` runs with foreign keys off.
+    Dropping a table drops its indexes and triggers, so every trigger is
+    dropped first and recreated afterwards, along with the indexes.
+
+    The trigger deleting a track's genre links is replaced by the
+    cascade. The track's genre stats are instead updated before it is
+    deleted, in the same way as its playlists' stats.
+    """
+    cur = connection_manager.execute('''
+        SELECT name, sql FROM sqlite_schema
+        WHERE type = 'trigger' /* full scan */
+    ''')
+    triggers = cur.fetchall()
+    for name, _ in triggers:
+        connection_manager.execute(f'DROP TRIGGER {name}')
+
+    for table, (create_sql, parent_condition) in CASCADING_TABLES.items():
+        cur = connection_manager.execute('''
+            SELECT sql FROM sqlite_schema
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+            /* full scan */
+        ''', (table,))
+        indexes = [row[0] for row in cur.fetchall()]
+        columns = [row[1] for row in connection_manager.execute(
+            f'PRAGMA table_info({table})'
+        ).fetchall()]
+
+        connection_manager.execute(
+            create_sql.replace(f"TABLE {table}", f"TABLE new_{table}", 1)
+        )
+        connection_manager.execute(f'''
+            INSERT INTO new_{table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {table}
+            WHERE {parent_condition} /* full scan */
+        ''')
+        connection_manager.execute(f'DROP TABLE {table}')
+        connection_manager.execute(
+            f'ALTER TABLE new_{table} RENAME TO {table}'
+        )
+        for index_sql in indexes:
+            connection_manager.execute(index_sql)
+
+    # Rows dropped for missing parents leave the search index and stats
+    # to be brought back in line.
+    connection_manager.execute('''
+        DELETE FROM track_search
+        WHERE rowid NOT IN (SELECT track_id FROM tracks) /* full scan */
+    ''')
+    connection_manager.execute('DELETE FROM collection_stats')
+    _count_collection_stats(connection_manager)
+    _count_genre_stats(connection_manager)
+
+    for name, trigger_sql in triggers:
+        if name != "track_genres_track_delete":
+            connection_manager.execute(trigger_sql)
+    connection_manager.execute('''
+        CREATE TRIGGER collection_stats_track_genres_delete
+        BEFORE DELETE ON tracks
+        BEGIN
+            UPDATE collection_stats
+            SET track_count = track_count - 1,
+                total_duration = total_duration - old.duration
+            WHERE collection_type = 'genre'
+            AND collection_id IN (SELECT genre_id FROM track_genres
+                                  WHERE track_id = old.track_id);
+        END
+    ''')
+
+    violations = connection_manager.execute(
+        'PRAGMA foreign_key_check'
+    ).fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(
+            f"Foreign key violations after rebuild: {violations[:10]}"
+        )
+
+
+def _add_play_history(connection_manager: ConnectionManager):
+    """
+    Add the `play_events` table and the play counters it rolls up into.
+
+    Events are only ever appended. A trigger adds each one to its
+    track's `play_count` or `skip_count` and moves its `last_played`,
+    so reading the counters never has to aggregate the history. Skips
+    don't count as plays, so they leave `last_played` alone.
+    """
+    connection_manager.execute('''
+        CREATE TABLE play_events (
+            event_id INTEGER PRIMARY KEY,
+            track_id INTEGER NOT NULL
+                REFERENCES tracks(track_id) ON DELETE CASCADE,
+            played_at INTEGER NOT NULL,
+            skipped INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Deleting a track looks up its events to cascade to them.
+    connection_manager.execute('''
+        CREATE INDEX idx_play_events_track
+        ON play_events(track_id)
+    ''')
+
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN skip_count INTEGER NOT NULL DEFAULT 0
+    ''')
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN last_played INTEGER NOT NULL DEFAULT 0
+    ''')
+    connection_manager.execute('''
+        CREATE INDEX idx_tracks_last_played
+        ON tracks(last_played)
+    ''')
+
+    connection_manager.execute('''
+        CREATE TRIGGER play_events_insert
+        AFTER INSERT ON play_events
+        BEGIN
+            UPDATE tracks
+            SET play_count = play_count + NOT new.skipped,
+                skip_count = skip_count + new.skipped,
+                last_played = CASE WHEN new.skipped THEN last_played
+                                   ELSE MAX(last_played, new.played_at) END
+            WHERE track_id = new.track_id;
+        END
+    ''')
+
+
+def _add_album_release_date_key(connection_manager: ConnectionManager):
+    """
+    Identify albums by their title, album artist and release date.
+
+    Albums were matched on their title and album artist, so releases of
+    the same name by the same artist from different years were merged
+    into one. Each merged album is split by the release date of its
+    tracks: an album with the same title and album artist is added for
+    every date it lacks, the tracks are moved to the album for their
+    date and the albums left without tracks are deleted. The stats
+    triggers move the tracks' counts along with them.
+
+    The album artist isn't stored with each track, so an album's tracks
+    by other artists, as on a compilation, stay on it. Dates are
+    compared with `IS`, so tracks without one keep their album too.
+    """
+    # (title, artist) pairs are unique, so the wider key is too.
+    connection_manager.execute('DROP INDEX idx_albums_identity')
+    connection_manager.execute('''CREATE UNIQUE INDEX idx_albums_identity
+        ON albums(album_name, artist_id, release_date)''')
+
+    connection_manager.execute('''
+        INSERT INTO albums (album_name, artist_id, release_date)
+        SELECT albums.album_name, albums.artist_id, tracks.release_date
+        FROM tracks
+        JOIN albums ON albums.album_id = tracks.album_id
+        WHERE tracks.release_date IS NOT albums.release_date
+        AND NOT EXISTS (
+            SELECT 1 FROM albums AS existing
+            WHERE existing.album_name = albums.album_name
+            AND existing.artist_id = albums.artist_id
+            AND existing.release_date IS tracks.release_date
+        ) /* full scan */
+        ON CONFLICT (album_name, artist_id, release_date) DO NOTHING
+    ''')
+    # Albums added twice without a date are left without tracks by the
+    # update, which moves each track to the first.
+    connection_manager.execute('''
+        UPDATE tracks SET album_id = (
+            SELECT MIN(split.album_id)
+            FROM albums AS merged
+            JOIN albums AS split
+            ON split.album_name = merged.album_name
+            AND split.artist_id = merged.artist_id
+            WHERE merged.album_id = tracks.album_id
+            AND split.release_date IS tracks.release_date
+        )
+        WHERE NOT EXISTS (
+            SELECT 1 FROM albums
+            WHERE albums.album_id = tracks.album_id
+            AND albums.release_date IS tracks.release_date
+        ) /* full scan */
+    ''')
+    connection_manager.execute('''
+        DELETE FROM albums
+        WHERE NOT EXISTS (
+            SELECT 1 FROM tracks WHERE tracks.album_id = albums.album_id
+        ) /* full scan */
+    ''')
+
+
+def _add_file_fingerprints(connection_manager: ConnectionManager):
+    """
+    Add the size, modification time and content hash of each file.
+
+    A moved file is recognised by its size and content hash, which are
+    looked up together in an index. Existing tracks have no hash until
+    the next scan reads their files.
+    """
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN file_size INTEGER NOT NULL DEFAULT 0
+    ''')
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN file_mtime INTEGER NOT NULL DEFAULT 0
+    ''')
+    connection_manager.execute('''
+        ALTER TABLE tracks
+        ADD COLUMN content_hash TEXT
+    ''')
+    connection_manager.execute('''
+        CREATE INDEX idx_tracks_fingerprint
+        ON tracks(file_size, content_hash)
+    ''')
+
+
+# Each migration upgrades the schema by one version. Migrations are
+# applied in order and must never be edited once released; schema
+# changes are made by appending a new migration.
+MIGRATIONS = [
+    _add_lookup_indexes,
+    _add_unique_artist_and_album_keys,
+    _space_playlist_positions,
+    _add_search_index,
+    _add_sort_columns_and_indexes,
+    _add_collection_stats,
+    _add_genres,
+    _add_cascading_foreign_keys,
+    _add_play_history,
+    _add_album_release_date_key,
+    _add_file_fingerprints,
+]
+
+
+def get_schema_version(connection_manager: ConnectionManager):
+    """Return the schema version stored in the database."""
+    cur = connection_manager.execute('PRAGMA user_version')
+    return cur.fetchone()[0]
+
+
+def migrate(connection_manager: ConnectionManager):
+    """
+    Upgrade the database schema to the latest version.
+
+    The schema version is kept in `PRAGMA user_version`. Every
+    migration newer than the stored version is applied in its own
+    transaction, so an existing database is upgraded in place and an
+    interrupted upgrade resumes from the last completed version.
+
+    Foreign keys are switched off while migrating, as rebuilding a
+    table would otherwise cascade the deletes of its old copy.
+
+    Parameters
+    ----------
+    connection_manager : ConnectionManager
+        The manager providing connections to the database.
+
+    Returns
+    -------
+    int
+        The schema version after upgrading.
+    """
+    version = get_schema_version(connection_manager)
+    if version >= len(MIGRATIONS):
+        return version
+
+    # The pragma has no effect inside a transaction, so it is set
+    # around the migrations rather than in them.
+    foreign_keys = connection_manager.execute(
+        'PRAGMA foreign_keys'
+    ).fetchone()[0]
+    connection_manager.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for new_version, migration in enumerate(MIGRATIONS, start=1):
+            if new_version <= version:
+                continue
+
+            with connection_manager.transaction():
+                migration(connection_manager)
+                connection_manager.execute(
+                    f'PRAGMA user_version = {new_version}'
+                )
+            version = new_version
+    finally:
+        connection_manager.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+
+    return version
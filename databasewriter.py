@@ -0,0 +1,314 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from connectionmanager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+def log_write_errors(future):
+    """
+    Log the exception of a write whose result isn't waited for.
+
+    Parameters
+    ----------
+    future : concurrent.futures.Future
+        A future returned by `DatabaseWriter.submit()`.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        The same future.
+    """
+    future.add_done_callback(_log_write_error)
+    return future
+
+
+def _log_write_error(future):
+    """Log the exception a write's future resolved to, if any."""
+    error = future.exception()
+    if error is not None:
+        logger.error("A database write failed", exc_info=error)
+
+
+class DatabaseWriter:
+    """
+    Class which applies database writes on a dedicated thread.
+
+    Writes are queued and executed in order by a single writer thread.
+    Writes queued close together are grouped into one transaction, so
+    they share a single commit rather than paying for one each. Every
+    write is run in its own savepoint, so a failing write is rolled
+    back without affecting the others in its group.
+
+    A thread can also group its writes explicitly with `batch()`. The
+    writer thread commits the writes queued before the batch and then
+    lends its connection to the batch's thread, which runs its writes
+    itself, in one transaction, until the batch ends. Other threads'
+    writes wait in the queue meanwhile.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+
+    Methods
+    -------
+    submit(operation, *args, after_commit=None):
+        Queue a write and return a future for its result.
+    wait_for_writes():
+        Block until the calling thread's queued writes are committed.
+    batch():
+        Context manager running the calling thread's writes in one
+        transaction.
+    close():
+        Commit the queued writes and stop the writer thread.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager,
+                 max_batch_latency=0.005, max_batch_size=1000):
+        """
+        Initialise a `DatabaseWriter` instance and start its thread.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        max_batch_latency : float, optional
+            The longest time in seconds a write waits for others to
+            join its group before the group is committed.
+        max_batch_size : int, optional
+            The largest number of writes committed together.
+        """
+        self._connection_manager = connection_manager
+        self._max_batch_latency = max_batch_latency
+        self._max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._condition = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+        # The sequence number of the last write queued by each thread.
+        self._last_submitted = {}
+        self._flush_requested = False
+        self._closed = False
+        # The thread in a batch, and the writes it has made so far
+        # with the callbacks to run once they are committed.
+        self._batch_thread = None
+        self._batch_callbacks = []
+
+        self._thread = threading.Thread(target=self._run,
+                                        name="DatabaseWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args, after_commit=None):
+        """
+        Queue a write and return a future for its result.
+
+        Parameters
+        ----------
+        operation : callable
+            Called with `args` on the writer thread, inside a
+            transaction.
+        *args
+            The arguments for `operation`.
+        after_commit : callable, optional
+            Called on the writer thread with the result of `operation`
+            once it has been committed, and before the write counts as
+            done for `wait_for_writes()`.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the result of `operation` once it has been
+            committed, or to the exception it raised. Inside a batch,
+            the write is run at once, in a savepoint, and the future
+            resolves as soon as it has run, as the batch's thread can't
+            wait for its own commit. `after_commit` is then called on
+            that thread when the batch commits.
+        """
+        future = Future()
+        if threading.current_thread() is self._batch_thread:
+            try:
+                with self._connection_manager.transaction():
+                    result = operation(*args)
+            except Exception as error:
+                future.set_exception(error)
+                return future
+            if after_commit is not None:
+                self._batch_callbacks.append((after_commit, result))
+            future.set_result(result)
+            return future
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot write to a closed database.")
+            self._submitted += 1
+            self._last_submitted[threading.get_ident()] = self._submitted
+            self._queue.put((future, operation, args, after_commit))
+        return future
+
+    def wait_for_writes(self):
+        """
+        Block until the calling thread's queued writes are committed.
+
+        Called before reads, so that a thread always reads its own
+        writes. Writes queued by other threads are not waited for, so a
+        reader is never held up behind another thread's backlog.
+        Returns at once if called from the writer thread itself.
+        """
+        if threading.current_thread() is self._thread:
+            return
+
+        with self._condition:
+            target = self._last_submitted.get(threading.get_ident(), 0)
+            if self._committed >= target:
+                return
+            # Don't make the reader wait out the batch latency.
+            self._flush_requested = True
+            self._condition.wait_for(lambda: self._committed >= target)
+
+    @contextmanager
+    def batch(self):
+        """
+        Run the calling thread's writes in one transaction.
+
+        Writes submitted by the thread inside the block are run on the
+        writer's connection in one transaction, and so are its reads,
+        which see the batch's writes before they are committed. The
+        batch commits when the block ends and rolls back if it raises.
+        A batch inside another becomes a savepoint, so it can be rolled
+        back alone.
+
+        The batch holds the write lock throughout, so the block should
+        not wait on other threads' writes.
+        """
+        current_thread = threading.current_thread()
+        if current_thread in (self._batch_thread, self._thread):
+            with self._connection_manager.transaction():
+                yield
+            return
+
+        loan = _Loan()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot write to a closed database.")
+            self._queue.put(loan)
+        loan.lent.wait()
+
+        callbacks = []
+        try:
+            with self._connection_manager.borrow(loan.connection):
+                self._batch_thread = current_thread
+                self._batch_callbacks = callbacks
+                try:
+                    with self._connection_manager.transaction():
+                        yield
+                finally:
+                    self._batch_thread = None
+                    self._batch_callbacks = []
+        finally:
+            loan.returned.set()
+
+        for after_commit, result in callbacks:
+            after_commit(result)
+
+    def _lend(self, loan):
+        """Lend the connection to a batch and wait for it to end."""
+        loan.connection = self._connection_manager.lend_connection()
+        loan.lent.set()
+        loan.returned.wait()
+
+    def _run(self):
+        """Take writes off the queue and commit them in groups."""
+        self._connection_manager.claim_writes()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_batch_latency
+            while len(batch) < self._max_batch_size:
+                if batch[-1] is None or isinstance(batch[-1], _Loan):
+                    break
+                # Writes already queued always join the group, but a
+                # waiting reader cuts short the wait for more.
+                with self._condition:
+                    flush_requested = self._flush_requested
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0 and not flush_requested:
+                        batch.append(self._queue.get(timeout=timeout))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # A group ends at a batch, which starts once the writes
+            # queued before it are committed.
+            stopping = batch[-1] is None
+            loan = batch.pop() if isinstance(batch[-1], _Loan) else None
+            writes = [write for write in batch if write is not None]
+            if writes:
+                self._commit(writes)
+            if loan is not None:
+                self._lend(loan)
+            if stopping:
+                return
+
+    def _commit(self, writes):
+        """Run a group of writes in one transaction and resolve them."""
+        results = []
+        try:
+            with self._connection_manager.transaction():
+                for future, operation, args, after_commit in writes:
+                    label = getattr(operation, "__qualname__", None)
+                    try:
+                        with self._connection_manager.transaction(), \
+                                self._connection_manager.labelled(label):
+                            results.append((operation(*args), None))
+                    except Exception as error:
+                        results.append((None, error))
+        except Exception as error:
+            # The commit itself failed, so none of the writes happened.
+            results = [(None, error)] * len(writes)
+
+        outcomes = []
+        for (future, operation, args, after_commit), (result, error) in zip(
+                writes, results):
+            if error is None and after_commit is not None:
+                try:
+                    after_commit(result)
+                except Exception as after_commit_error:
+                    error = after_commit_error
+            outcomes.append((future, result, error))
+
+        with self._condition:
+            self._committed += len(writes)
+            if self._committed >= self._submitted:
+                self._flush_requested = False
+            self._condition.notify_all()
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Commit the queued writes and stop the writer thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+
+class _Loan:
+    """The writer's connection, lent to a thread for a batch."""
+
+    def __init__(self):
+        self.connection = None
+        self.lent = threading.Event()
+        self.returned = threading.Event()
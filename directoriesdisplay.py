@@ -1,7 +1,9 @@
+from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox
 
 from scandirectory import DirectoryScan
+from tracklist import TrackList
 
 from root import colour_scheme
 
@@ -20,7 +22,7 @@ class DirectoriesDisplay:
         Refresh the display
     """
 
-    def __init__(self, directory_scan: DirectoryScan,
+    def __init__(self, directory_scan: DirectoryScan, track_list: TrackList,
                  display_frame):
         """
         Initialise a `DirectoriesDisplay` instance.
@@ -29,10 +31,13 @@ class DirectoriesDisplay:
         ----------
         directory_scan : DirectoryScan
             Instance of `DirectoryScan`.
+        track_list : TrackList
+            Instance of `TrackList`.
         display_frame : tkinter.Frame
             The frame to place widgets upon.
         """
         self._directory_scan = directory_scan
+        self._track_list = track_list
         self._directory_labels = []
         self._display_frame = display_frame
         self._colour_scheme = colour_scheme
@@ -70,15 +75,29 @@ class DirectoriesDisplay:
         count = 1
 
         for directory in directories:
+            # Directories on disconnected drives keep their tracks
+            text = directory
+            if not Path(directory).is_dir():
+                text += " (not found)"
             directory_txt = tk.Label(
                 self._display_frame,
-                text=directory,
+                text=text,
                 bg=self._colour_scheme["grey"],
                 fg=self._colour_scheme["battleship"],
                 font=("Arial", 16)
             )
             directory_txt.grid(row=count, column=0, sticky="news", pady=5)
 
+            rescan_button = tk.Button(
+                self._display_frame,
+                text="🔄",
+                command=lambda d=directory: self._rescan_directory(d),
+                bg=self._colour_scheme["grey"],
+                fg="white",
+                relief="flat",
+                font=("Arial", 18))
+            rescan_button.grid(row=count, column=1, sticky="e")
+
             remove_button = tk.Button(
                 self._display_frame,
                 text="❌",
@@ -87,11 +106,21 @@ class DirectoriesDisplay:
                 fg=self._colour_scheme["chili_red"],
                 relief="flat",
                 font=("Arial", 18))
-            remove_button.grid(row=count, column=1, sticky="e")
+            remove_button.grid(row=count, column=2, sticky="e")
 
             count += 1
 
-            self._directory_labels.extend([directory_txt, remove_button])
+            self._directory_labels.extend([directory_txt, rescan_button,
+                                           remove_button])
+
+    def _rescan_directory(self, directory):
+        """Rescan a directory, reloading the tracklist if it changed."""
+        if self._directory_scan.scan_directory([directory]):
+            self._track_list.get_collection()
+        else:
+            # The directory may have been found or lost since it was shown
+            self.clear_display()
+            self.display()
 
     def _remove_directory_function(self, directory):
         """Remove a directory from the display and scan."""
@@ -102,7 +131,6 @@ class DirectoriesDisplay:
 
         if result:
             self._directory_scan.remove_directory(directory)
-            self._directory_scan.scan_directory()
             # refresh the display
             self.clear_display()
             self.display()
@@ -0,0 +1,184 @@
+import ast
+import json
+
+from connectionmanager import ConnectionManager
+
+UNKNOWN_GENRE = "Unknown Genre"
+
+
+def split_genres(genre):
+    """
+    Return the list of genre names in a genre tag.
+
+    Parameters
+    ----------
+    genre : list of str or str
+        The tag's values, or a single genre. A string holding the repr
+        of a list, as stored by earlier versions of the scanner, is
+        parsed back into its values.
+
+    Returns
+    -------
+    list of str
+        The distinct names, ignoring case, in the order they were given.
+        `UNKNOWN_GENRE` if the tag holds no names.
+    """
+    if isinstance(genre, str):
+        try:
+            parsed = ast.literal_eval(genre) if genre.startswith("[") else genre
+        except (ValueError, SyntaxError):
+            parsed = genre
+        genre = [parsed] if isinstance(parsed, str) else parsed
+
+    names = {}
+    for name in genre:
+        name = str(name).strip()
+        if name:
+            names.setdefault(name.casefold(), name)
+    return list(names.values()) or [UNKNOWN_GENRE]
+
+
+class GenresDatabase:
+    """
+    Class responsible for handling operations with the genres database.
+
+    A track can have several genres, so tracks are linked to genres
+    through the `track_genres` table. Genre names are unique ignoring
+    case.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager):
+        """
+        Initialise a `GenresDatabase` instance.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        """
+        self._connection_manager = connection_manager
+
+    def upsert_genres(self, genre_names):
+        """
+        Add any new genres and return the ids of all the given genres.
+
+        Must be called inside a transaction, as the genres are written
+        with `executemany` and no commit of their own.
+
+        Parameters
+        ----------
+        genre_names : iterable of str
+            The names of the genres.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each genre name to its `genre_id`.
+        """
+        genre_names = list(dict.fromkeys(genre_names))
+        self._connection_manager.executemany(
+            '''INSERT INTO genres (genre_name)
+            VALUES (?)
+            ON CONFLICT (genre_name) DO NOTHING''',
+            ((genre_name,) for genre_name in genre_names)
+        )
+
+        # `genre_name` compares without case, so every spelling of a
+        # name finds the genre.
+        cur = self._connection_manager.execute(
+            '''SELECT names.value, genres.genre_id
+            FROM json_each(?) AS names
+            CROSS JOIN genres ON genres.genre_name = names.value''',
+            (json.dumps(genre_names),)
+        )
+        return dict(cur.fetchall())
+
+    def add_track_genres(self, track_genres):
+        """
+        Link tracks to their genres.
+
+        Must be called inside a transaction.
+
+        Parameters
+        ----------
+        track_genres : iterable of tuple
+            `(track_id, genre_id)` pairs.
+        """
+        self._connection_manager.executemany(
+            '''INSERT INTO track_genres (track_id, genre_id)
+            VALUES (?, ?)
+            ON CONFLICT DO NOTHING''',
+            track_genres
+        )
+
+    def get_genre_name(self, genre_id):
+        """Return the genre's name from its identifier."""
+        cur = self._connection_manager.execute(
+            '''SELECT genre_name
+            FROM genres
+            WHERE genre_id = ?''',
+            (genre_id,)
+        )
+        return cur.fetchone()[0]
+
+    def get_all_genres(self):
+        """Return a list of every `genre_id`, ordered by name."""
+        cur = self._connection_manager.execute(
+            '''SELECT genre_id
+            FROM genres
+            ORDER BY genre_name'''
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def get_genre_metadata(self, genre_ids):
+        """Return data about the genres from a list of `genre_id`s."""
+        ids_json = json.dumps([int(genre_id) for genre_id in genre_ids])
+
+        cur = self._connection_manager.execute(
+            '''SELECT genres.genre_id, genres.genre_name
+            FROM json_each(?) AS ids
+            CROSS JOIN genres ON genres.genre_id = ids.value''',
+            (ids_json,)
+        )
+
+        genres_info = {}
+        for genre_id, genre_name in cur:
+            genres_info[genre_id] = {
+                "genre_id": genre_id,
+                "genre_name": genre_name
+            }
+        return genres_info
+
+    def get_genre_tracklist(self, genre_id):
+        """Return the list of tracks with a genre."""
+        cur = self._connection_manager.execute(
+            '''SELECT track_id
+            FROM track_genres
+            WHERE genre_id = ?''',
+            (genre_id,)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def delete_trackless_genres(self):
+        """
+        Delete every genre that has no tracks.
+
+        Returns
+        -------
+        list of int
+            The `genre_id`s of the deleted genres.
+        """
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+                DELETE FROM genres
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM track_genres
+                    WHERE track_genres.genre_id = genres.genre_id
+                ) /* full scan */
+                RETURNING genre_id
+            ''')
+            return [row[0] for row in cur]
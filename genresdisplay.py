@@ -0,0 +1,76 @@
+from functools import partial
+
+from genreitem import GenreItem
+from musicdatabase import MusicDatabase
+
+
+class GenresDisplay:
+    """
+    Class for displaying the list of genres.
+
+    Attributes
+    ----------
+    genre_items_dict : dict
+        Dictionary with `genre_id` keys and `GenreItem` values.
+
+    Methods
+    -------
+    display_genre_list():
+        Display a list of all genres in the database.
+    clear_display():
+        Remove all widgets on the current display.
+
+    """
+
+    def __init__(self, display_frame, display_canvas,
+                 music_database: MusicDatabase, open_genre_command):
+        """
+        Initialise a `GenresDisplay` instance.
+
+        Parameters
+        ----------
+        display_frame : tkinter.Frame
+            The frame to place widgets upon.
+        display_canvas : tkinter.Canvas
+            The scrollable canvas that contains the `display_frame`.
+        music_database : MusicDatabase
+            Instance of the Music Database class.
+        open_genre_command : callable
+            Method called when an 'open' button is pressed.
+        """
+        self._display_frame = display_frame
+        self._display_canvas = display_canvas
+        self._music_database = music_database
+        self._open_genre_command = open_genre_command
+
+        self.genre_items_dict = {}
+
+    def display_genre_list(self):
+        """Display a list of all genres in the database."""
+        self.clear_display()
+
+        genre_list = self._music_database.get_all_genres()
+        genre_info = self._music_database.get_genre_metadata(genre_list)
+
+        for genre_id in genre_list:
+            info = genre_info[genre_id]
+            self._create_genre_item(genre_id, info)
+
+        # Move to the top of the scrollable canvas.
+        self._display_canvas.yview_moveto(0)
+
+    def _create_genre_item(self, genre_id, genre_info):
+        """Create an instance of the GenreItem class for the given genre"""
+        genre_name = genre_info["genre_name"]
+        open_genre_command = partial(self._open_genre_command, genre_id)
+        genre = GenreItem(self._display_frame,
+                          genre_name, open_genre_command)
+        genre.grid(column=0, sticky="news", pady=5, padx=10)
+        self.genre_items_dict[genre_id] = genre
+
+    def clear_display(self):
+        """Remove all widgets on the current display."""
+        for genre_item_id in self.genre_items_dict:
+            self.genre_items_dict[genre_item_id].destroy()
+
+        self.genre_items_dict = {}
@@ -5,7 +5,7 @@ from root import Root, colour_scheme
 from collectionsheader import CollectionsHeader
 from tracklist import TrackList
 from mixercontroller import MixerController
-from musicdatabase import MusicDatabase
+from musicdatabase import MusicDatabase, TRACK_SORTS, log_write_errors
 from listheader import ListHeader
 from sidebarframe import SideBarFrame
 from playlistheader import PlaylistsHeader
@@ -75,6 +75,7 @@ class HeaderFrame(tk.Frame):
         self._tracklist.tracklist_updated_observers.append(self)
         self._sidebarframe.open_artist_list_observers.append(self)
         self._sidebarframe.open_album_list_observers.append(self)
+        self._sidebarframe.open_genre_list_observers.append(self)
         self._sidebarframe.open_queue_observers.append(self)
         self._sidebarframe.open_playlist_observers.append(self)
         self._sidebarframe.open_directories_observers.append(self)
@@ -101,15 +102,16 @@ class HeaderFrame(tk.Frame):
         collection_type = self._tracklist.collection_type
         collection_id = self._tracklist.collection_id
         collection_title = self._tracklist.collection_title
-        track_count = len(self._tracklist.get_tracklist())
+        track_count = self._tracklist.get_track_count()
         duration = self._tracklist.get_total_tracklist_duration()
         if collection_type == "album":
-            artist_id = self._music_database.get_album_metadata(
+            subtitle = self._music_database.get_album_metadata(
                 [collection_id]
-            )[collection_id]["artist_id"]
-            subtitle = self._music_database.get_artist_name(artist_id)
+            )[collection_id]["artist_name"]
         else:
             subtitle = None
+        # Only the list of all songs can be reordered.
+        sort_options = TRACK_SORTS if collection_type == "all songs" else None
 
         collections_header = CollectionsHeader(
             parent=self,
@@ -119,7 +121,10 @@ class HeaderFrame(tk.Frame):
             collection_id=collection_id,
             track_count=track_count,
             duration=duration,
-            subtitle=subtitle
+            subtitle=subtitle,
+            sort_options=sort_options,
+            sort_key=self._tracklist.sort_key,
+            sort_command=self._tracklist.set_sort_key
         )
 
         collections_header.grid(row=0, column=0, sticky="news")
@@ -144,6 +149,13 @@ class HeaderFrame(tk.Frame):
         artist_list_header.grid(row=0, column=0, sticky="news")
         self._current_header = artist_list_header
 
+    def received_open_genre_list_signal(self):
+        """Display the header for the list of genres."""
+        self._current_header.destroy()
+        genre_list_header = ListHeader(self, "Genres")
+        genre_list_header.grid(row=0, column=0, sticky="news")
+        self._current_header = genre_list_header
+
     def received_open_queue_signal(self):
         """Display the header for the queue."""
         self._current_header.destroy()
@@ -162,7 +174,7 @@ class HeaderFrame(tk.Frame):
 
     def _playlist_header_command(self, playlist_name):
         """Create a playlist with the given name."""
-        self._music_database.create_playlist(playlist_name)
+        log_write_errors(self._music_database.create_playlist(playlist_name))
         self._sidebarframe.send_open_playlists_signal()
 
     def received_open_directories_signal(self):
@@ -0,0 +1,421 @@
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# The first bytes of every snapshot file, ending with its format version.
+MAGIC = b"MPSNAP1\n"
+# Arrays start on a multiple of this many bytes.
+ALIGNMENT = 64
+# The number of track positions remembered from the pages returned,
+# about the last 50 pages of 200 tracks.
+MAX_CACHED_POSITIONS = 10000
+# The numeric columns of each track, stored together as one record.
+TRACK_DTYPE = np.dtype([
+    ("track_id", "<i8"),
+    ("artist_id", "<i8"),
+    ("album_id", "<i8"),
+    ("track_number", "<i8"),
+    ("duration", "<f8"),
+])
+# The text columns of each track, stored one track after another as
+# UTF-8 bytes, with the offset of every value.
+TEXT_COLUMNS = ("track_name", "artist_name", "album_name", "release_date",
+                "file_path")
+# The arrays of a snapshot file, in the order they are written.
+ARRAY_DTYPES = {
+    "tracks": TRACK_DTYPE,
+    "text_offsets": np.dtype("<i8"),
+    "text_data": np.dtype(np.uint8),
+    "sorted_ids": np.dtype("<i8"),
+    "sorted_positions": np.dtype("<i8"),
+}
+
+
+class LibrarySnapshot:
+    """
+    Class holding a compact copy of the tracks listed by "all songs".
+
+    The snapshot is a single file with the data of every track, in the
+    default "all songs" order, as NumPy arrays. Loading it only reads a
+    short header and memory-maps the rest, so the library can be listed
+    at launch without waiting for the database, and only the pages that
+    are displayed are ever read from disk. A track's numbers and its
+    text are each stored together, so a page is read in a few
+    contiguous slices.
+
+    Each snapshot carries the stamp of the library it was written from.
+    The snapshot is stale if the database's current stamp differs.
+
+    A loaded snapshot's arrays are never changed, only replaced as a
+    whole, so it can be read from several threads at once. Its file is
+    unmapped before it is replaced or deleted, as Windows can't do
+    either to a mapped file. `save()` and `discard()` wait for the reads
+    in progress to finish first, and a read made while no snapshot is
+    loaded returns `None`, so the caller can read the database instead.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+
+    Methods
+    -------
+    load():
+        Memory-map the snapshot file.
+    save(stamp, rows):
+        Write a new snapshot file.
+    discard():
+        Delete the snapshot file.
+    get_tracks_page(after, limit):
+        Return one page of `track_id`s.
+    get_track_metadata(id_list):
+        Return the data of the tracks in a list.
+    get_stats():
+        Return the number of tracks and their total duration.
+    """
+
+    def __init__(self, path):
+        """
+        Initialise a `LibrarySnapshot` instance.
+
+        Parameters
+        ----------
+        path : str
+            The path of the snapshot file.
+        """
+        self._path = path
+        self.stamp = None
+        self._loaded = None
+        # Counts the reads in progress, which the file is not unmapped
+        # during.
+        self._readers = 0
+        self._readers_changed = threading.Condition()
+
+    def load(self):
+        """
+        Memory-map the snapshot file.
+
+        Returns
+        -------
+        bool
+            True if the snapshot was loaded, False if there is no
+            snapshot or it is unreadable or of an older format.
+        """
+        try:
+            with open(self._path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return False
+                (header_length,) = struct.unpack("<Q", f.read(8))
+                header = json.loads(f.read(header_length))
+            data = np.memmap(self._path, dtype=np.uint8, mode="r",
+                             offset=_data_start(header_length))
+        except (OSError, ValueError, struct.error):
+            return False
+
+        arrays = {}
+        for name, dtype in ARRAY_DTYPES.items():
+            offset, count = header["arrays"][name]
+            arrays[name] = data[offset:offset + count * dtype.itemsize].view(
+                dtype
+            )
+        # Reads in progress keep the snapshot they started with.
+        with self._readers_changed:
+            self._loaded = _Loaded(header, arrays)
+            self.stamp = header["stamp"]
+        return True
+
+    def save(self, stamp, rows):
+        """
+        Write a new snapshot file.
+
+        The file is written beside the old one and moved over it, so a
+        snapshot being read is never half written, and is then loaded.
+        The move waits for the reads in progress, and reads made from
+        the move until the new snapshot is loaded return `None`.
+
+        Parameters
+        ----------
+        stamp : list
+            The stamp of the library the rows were read from.
+        rows : iterable of tuple
+            `(track_id, track_name, artist_id, album_id, release_date,
+            file_path, duration, track_number, artist_name, album_name)`
+            rows in "all songs" order.
+        """
+        names = ("track_id", "track_name", "artist_id", "album_id",
+                 "release_date", "file_path", "duration", "track_number",
+                 "artist_name", "album_name")
+        columns = dict(zip(names, zip(*rows))) or dict.fromkeys(names, ())
+
+        tracks = np.empty(len(columns["track_id"]), dtype=TRACK_DTYPE)
+        for name in TRACK_DTYPE.names:
+            tracks[name] = columns[name]
+
+        values = [value for track in zip(*(columns[name]
+                                           for name in TEXT_COLUMNS))
+                  for value in track]
+        joined = "".join(values)
+        text_data = joined.encode("utf-8")
+        # Without multi-byte characters, each value's length in bytes is
+        # its length in characters.
+        if len(text_data) != len(joined):
+            values = [value.encode("utf-8") for value in values]
+        lengths = np.fromiter(map(len, values), dtype="<i8",
+                              count=len(values))
+
+        # Ids are looked up through a sorted copy, with the position of
+        # each in the "all songs" order.
+        positions = np.argsort(tracks["track_id"], kind="stable")
+        arrays = {
+            "tracks": tracks,
+            "text_offsets": np.concatenate(([0], np.cumsum(lengths)))
+            .astype("<i8"),
+            "text_data": np.frombuffer(text_data, dtype=np.uint8),
+            "sorted_ids": tracks["track_id"][positions],
+            "sorted_positions": positions.astype("<i8"),
+        }
+
+        header = {
+            "stamp": stamp,
+            "track_count": len(tracks),
+            "total_duration": float(tracks["duration"].sum()),
+            "arrays": {}
+        }
+        # Offsets count from the start of the arrays, after the header.
+        offset = 0
+        for name, array in arrays.items():
+            offset = _align(offset)
+            header["arrays"][name] = [offset, len(array)]
+            offset += array.nbytes
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = _data_start(len(header_bytes))
+
+        temporary_path = f"{self._path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                array_start = data_start + header["arrays"][name][0]
+                f.write(b"\0" * (array_start - f.tell()))
+                f.write(array.tobytes())
+        with self._unloaded():
+            os.replace(temporary_path, self._path)
+        self.load()
+
+    def discard(self):
+        """
+        Delete the snapshot file.
+
+        The snapshot is unloaded and has no stamp, so it is written
+        again by the next `save()`, even if the file can't be deleted.
+        """
+        with self._unloaded():
+            self.stamp = None
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+    @contextmanager
+    def _unloaded(self):
+        """Unload the snapshot, waiting for the reads in progress."""
+        with self._readers_changed:
+            # New reads find no snapshot, so they can't hold up the wait.
+            self._loaded = None
+            self._readers_changed.wait_for(lambda: self._readers == 0)
+            yield
+
+    @contextmanager
+    def _reading(self):
+        """Yield the loaded snapshot, which isn't unmapped until exit."""
+        with self._readers_changed:
+            loaded = self._loaded
+            if loaded is not None:
+                self._readers += 1
+        try:
+            yield loaded
+        finally:
+            if loaded is not None:
+                with self._readers_changed:
+                    self._readers -= 1
+                    self._readers_changed.notify_all()
+
+    def get_tracks_page(self, after=None, limit=200):
+        """
+        Return one page of `track_id`s in "all songs" order.
+
+        The cursors are the same as those of the database's pages, so
+        paging can carry on from the database where the snapshot left
+        off.
+
+        Parameters
+        ----------
+        after : tuple, optional
+            The cursor returned with the previous page. `None` returns
+            the first page.
+        limit : int, optional
+            The maximum number of tracks in the page. A negative limit
+            returns every track after the cursor.
+
+        Returns
+        -------
+        tuple or None
+            The list of `track_id`s and the cursor for the next page,
+            which is `None` if the page is empty. `None` if no snapshot
+            is loaded, or if the cursor's track isn't in the snapshot,
+            so the page has to be read from the database.
+        """
+        with self._reading() as loaded:
+            if loaded is None:
+                return None
+            return _page(loaded, after, limit)
+
+    def get_track_metadata(self, id_list):
+        """
+        Return the data of the tracks in a list.
+
+        Returns
+        -------
+        dict or None
+            A dictionary where keys are `track_id`s and the values are
+            dictionaries with the same keys as
+            `MusicDatabase.get_track_metadata()`. Tracks not in the
+            snapshot are left out. `None` if no snapshot is loaded.
+        """
+        with self._reading() as loaded:
+            if loaded is None:
+                return None
+            return _track_metadata(loaded, id_list)
+
+    def get_stats(self):
+        """
+        Return the number of tracks and their total duration.
+
+        Returns `None` if no snapshot is loaded.
+        """
+        loaded = self._loaded
+        if loaded is None:
+            return None
+        return loaded.header["track_count"], loaded.header["total_duration"]
+
+
+class _Loaded:
+    """The header and arrays of a loaded snapshot file."""
+
+    def __init__(self, header, arrays):
+        self.header = header
+        self.arrays = arrays
+        # Positions of the tracks in the pages returned recently, up to
+        # `MAX_CACHED_POSITIONS` of them.
+        self.positions = {}
+
+
+def _page(loaded, after, limit):
+    """Return a page of the loaded snapshot."""
+    start = 0
+    if after is not None:
+        position = int(_locate(loaded, np.asarray([after[-1]]))[0])
+        if position < 0:
+            # The cursor came from the database, for a track added since
+            # the snapshot was written.
+            return None
+        start = position + 1
+    tracks = loaded.arrays["tracks"]
+    end = len(tracks) if limit < 0 else start + limit
+    page = tracks["track_id"][start:end].tolist()
+    if not page:
+        return [], None
+
+    if len(loaded.positions) + len(page) > MAX_CACHED_POSITIONS:
+        # Older pages are forgotten wholesale, and are found again by a
+        # binary search of the ids if they are read.
+        loaded.positions.clear()
+    loaded.positions.update(zip(page, range(start, start + len(page))))
+    last = start + len(page) - 1
+    track_name = _texts(loaded, np.asarray([last]))[0][0]
+    return page, (track_name, page[-1])
+
+
+def _track_metadata(loaded, id_list):
+    """Return the data of tracks in the loaded snapshot."""
+    positions = _locate(loaded, np.asarray(id_list, dtype="<i8"))
+    found = positions >= 0
+    track_ids = [track_id for track_id, is_found
+                 in zip(id_list, found.tolist()) if is_found]
+    positions = positions[found]
+    records = loaded.arrays["tracks"][positions].tolist()
+    texts = _texts(loaded, positions)
+
+    tracks = {}
+    for track_id, record, text in zip(track_ids, records, texts):
+        _, artist_id, album_id, track_number, duration = record
+        (track_name, artist_name, album_name, release_date,
+         file_path) = text
+        tracks[track_id] = {
+            "track_id": track_id,
+            "track_name": track_name,
+            "artist": artist_id,
+            "album": album_id,
+            "release_date": release_date,
+            "file_path": file_path,
+            "duration": duration,
+            "track_number": track_number,
+            "artist_name": artist_name,
+            "album_name": album_name
+        }
+    return tracks
+
+
+def _locate(loaded, track_ids):
+    """Return the position of each track, or -1 if it isn't held."""
+    # The tracks displayed come from the pages returned, so their
+    # positions are known without searching the file.
+    try:
+        return np.asarray([loaded.positions[track_id]
+                           for track_id in track_ids.tolist()],
+                          dtype=np.int64)
+    except KeyError:
+        pass
+
+    sorted_ids = loaded.arrays["sorted_ids"]
+    if not len(sorted_ids):
+        return np.full(len(track_ids), -1)
+    indexes = np.searchsorted(sorted_ids, track_ids)
+    indexes = np.minimum(indexes, len(sorted_ids) - 1)
+    found = sorted_ids[indexes] == track_ids
+    return np.where(found, loaded.arrays["sorted_positions"][indexes], -1)
+
+
+def _texts(loaded, positions):
+    """Return the text columns of the tracks at the positions."""
+    if not len(positions):
+        return []
+    width = len(TEXT_COLUMNS)
+    offsets = loaded.arrays["text_offsets"]
+    value_indexes = positions[:, None] * width + np.arange(width)
+    starts = offsets[value_indexes]
+    ends = offsets[value_indexes + 1]
+    # A page's tracks are next to each other, so their text is read
+    # from disk in one slice.
+    low = int(starts.min())
+    data = loaded.arrays["text_data"][low:int(ends.max())].tobytes()
+    return [
+        [data[start:end].decode("utf-8")
+         for start, end in zip(track_starts, track_ends)]
+        for track_starts, track_ends
+        in zip((starts - low).tolist(), (ends - low).tolist())
+    ]
+
+
+def _align(offset):
+    """Round an offset up to the next multiple of `ALIGNMENT`."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _data_start(header_length):
+    """Return the offset of the arrays in a file with this header."""
+    return _align(len(MAGIC) + 8 + header_length)
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+
+
+class LookupCache:
+    """
+    A bounded least-recently-used cache for database point lookups.
+
+    Values are loaded on a miss and kept until they are evicted for
+    space or invalidated by a write to the database. A lookup which
+    finds nothing, loading `None`, is not kept, as the row may be added
+    later under the same key.
+
+    Methods
+    -------
+    get(key, loader):
+        Return the cached value for `key`, loading it on a miss.
+    invalidate(*keys):
+        Remove the given keys from the cache.
+    clear():
+        Remove every entry from the cache.
+    get_stats():
+        Return the cache's size and hit/miss counters.
+    """
+
+    def __init__(self, maxsize=4096):
+        """
+        Initialise a `LookupCache` instance.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            The maximum number of entries held. A size of 0 disables
+            caching.
+        """
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # Incremented on every invalidation, so a value loaded while a
+        # write was invalidating the cache is not stored.
+        self._generation = 0
+
+    def get(self, key, loader):
+        """
+        Return the cached value for `key`, loading it on a miss.
+
+        Parameters
+        ----------
+        key : hashable
+            The key identifying the lookup.
+        loader : callable
+            Called with no arguments to load the value on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key]
+            self._misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        if self._maxsize > 0 and value is not None:
+            with self._lock:
+                if generation != self._generation:
+                    return value
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                if len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self, *keys):
+        """Remove the given keys from the cache."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        """
+        Return the cache's size and hit/miss counters.
+
+        Returns
+        -------
+        dict
+            Dictionary with the current `size`, the `maxsize` and the
+            number of `hits` and `misses`.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "hits": self._hits,
+                "misses": self._misses
+            }
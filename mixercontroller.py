@@ -64,6 +64,8 @@ class MixerController:
         Start playing the track at this position in the queue.
     remove_from_queue(pos):
         Remove the track in this position from the queue.
+    received_tracks_removed_signal(track_ids):
+        Remove tracks deleted from the library from the queue.
     """
 
     def __init__(self, music_database: MusicDatabase,
@@ -162,6 +164,10 @@ class MixerController:
 
     def _song_end_procedure(self):
         """Perform the end of song procedure."""
+        # Playback was stopped with no track left to play.
+        if self.current_track_id is None:
+            return
+        self._record_play(skipped=False)
         if not self._loop_song_on:
             # Update the position in the queue
             if self.pos_in_queue < len(self.active_queue) - 1:
@@ -175,6 +181,11 @@ class MixerController:
         self._send_new_track_signal(self.current_track_id)
         self._load_next_song()
 
+    def _record_play(self, skipped):
+        """Record that the current track was played to the end or skipped."""
+        if self.current_track_id is not None:
+            self._music_database.record_play(self.current_track_id, skipped)
+
     def _queue_track(self, track_id):
         """Queue a track to play after the current track."""
         filepath = self._music_database.get_path(track_id)
@@ -217,6 +228,7 @@ class MixerController:
 
     def skip(self):
         """Skip to the next song in the queue."""
+        self._record_play(skipped=True)
         self.pos_in_queue += 1
         if self.pos_in_queue >= len(self.active_queue):
             self.pos_in_queue = 0
@@ -348,3 +360,43 @@ class MixerController:
         elif pos == self.pos_in_queue:
             self.pos_in_queue -= 1
             self._load_next_song()
+
+    def received_tracks_removed_signal(self, track_ids):
+        """Remove tracks deleted from the library from the queue."""
+        removed = set(track_ids)
+        current_removed = self.current_track_id in removed
+        # Count the removed tracks before the current position, so the
+        # position still points at the same place in the queue.
+        removed_before = sum(
+            1 for track_id in self.active_queue[:self.pos_in_queue]
+            if track_id in removed
+        )
+        self.active_queue = [track_id for track_id in self.active_queue
+                             if track_id not in removed]
+        self._raw_queue_list = [track_id for track_id in self._raw_queue_list
+                                if track_id not in removed]
+        self.pos_in_queue = max(self.pos_in_queue - removed_before, 0)
+
+        if current_removed:
+            self._current_track_removed()
+        elif self.active_queue:
+            self.pos_in_queue = min(self.pos_in_queue,
+                                    len(self.active_queue) - 1)
+            self._load_next_song()
+
+    def _current_track_removed(self):
+        """Move on from a current track removed from the library."""
+        # The tracks after the removed one have moved up a place, so
+        # the position is already that of the next track.
+        if self.pos_in_queue >= len(self.active_queue) and self._repeat_on:
+            self.pos_in_queue = 0
+        if self.pos_in_queue < len(self.active_queue) and self.is_playing():
+            self._play_track(self.active_queue[self.pos_in_queue])
+            return
+
+        # Otherwise playback stops, with no current track, so the end
+        # of the removed song isn't recorded and doesn't move the queue.
+        self.current_track_id = None
+        self.pos_in_queue = max(min(self.pos_in_queue,
+                                    len(self.active_queue) - 1), 0)
+        self._stop()
@@ -1,3 +1,5 @@
+import os
+
 from musicdatabase import MusicDatabase
 from scandirectory import DirectoryScan
 from mixercontroller import MixerController
@@ -16,8 +18,16 @@ class App:
     def __init__(self):
         """Initialise the components of the application."""
         database_path = "tracks.db"
+        snapshot_path = "library.snapshot"
         directories_file = "directories.txt"
-        self.music_database = MusicDatabase(database_path)
+        # Set MUSIC_PLAYER_PROFILE to time every database query. The
+        # report is printed on exit, or at any time by pressing F12.
+        self.profile_queries = "MUSIC_PLAYER_PROFILE" in os.environ
+        self.music_database = MusicDatabase(
+            database_path,
+            profile_queries=self.profile_queries,
+            snapshot_path=snapshot_path
+        )
 
         self.directory_scan = DirectoryScan(self.music_database, directories_file)
         self.track_list = TrackList(self.music_database)
@@ -55,18 +65,34 @@ class App:
             self.directory_scan,
             self.header_frame
         )
+        self.directory_scan.tracks_removed_observers.append(
+            self.mixer_controller
+        )
         self.logo = Logo(self.root)
         self.logo.grid(row=0, column=0, padx=2, pady=2, sticky="news")
+        if self.profile_queries:
+            self.root.bind("<F12>", lambda event: self.print_query_profile())
+
+    def print_query_profile(self):
+        """Print the statistics recorded for every database query."""
+        print(self.music_database.format_query_profile())
 
     def startup(self):
         """Call startup methods."""
-        self.directory_scan.scan_directory()  # Check for new music files
-        self.track_list.get_collection()  # Start up showing all tracks
+        # Show all tracks from the library snapshot before scanning
+        self.track_list.get_collection()
+        self.root.update()
+        # Check for new music files, and reload if the library changed
+        if self.directory_scan.scan_directory():
+            self.track_list.get_collection()
 
     def run(self):
         """Begin running the app."""
         self.startup()
         self.root.mainloop()
+        if self.profile_queries:
+            self.print_query_profile()
+        self.music_database.close()
 
 
 my_app = App()
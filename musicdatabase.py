@@ -1,88 +1,474 @@
+import functools
+import re
+import threading
+from contextlib import contextmanager
+
+from connectionmanager import ConnectionManager
+from queryprofiler import QueryProfiler
+from databasewriter import DatabaseWriter, log_write_errors
+from databasemigrations import migrate, get_schema_version
+from lookupcache import LookupCache
 from artistsdatabase import ArtistsDatabase
 from albumsdatabase import AlbumsDatabase
 from trackdatabase import TrackDatabase
 from playlistsdatabase import PlaylistDatabase
+from genresdatabase import GenresDatabase, split_genres
+from searchdatabase import SearchDatabase
+from statsdatabase import StatsDatabase
+from playhistorydatabase import PlayHistoryDatabase
+from playeventbuffer import PlayEventBuffer
+from librarysnapshot import LibrarySnapshot
+
+
+def _labelled(method):
+    """Name the queries a method runs after it in the query profile."""
+    label = method.__qualname__
+
+    @functools.wraps(method)
+    def labelled(self, *args, **kwargs):
+        with self._connection_manager.labelled(label):
+            return method(self, *args, **kwargs)
+    return labelled
+
+
+def _after_writes(method):
+    """Make a read wait until the caller's queued writes are committed."""
+    method = _labelled(method)
+
+    @functools.wraps(method)
+    def read(self, *args, **kwargs):
+        self._writer.wait_for_writes()
+        return method(self, *args, **kwargs)
+    return read
+
+
+# The orders tracks can be listed in, with a label for each.
+TRACK_SORTS = {
+    "track_name": "Title",
+    "artist": "Artist",
+    "album": "Album",
+    "release_date": "Release Date",
+    "duration": "Duration",
+    "date_added": "Recently Added",
+    "play_count": "Most Played",
+    "last_played": "Recently Played",
+}
+
+# The orders which read the play counters, so can't be read while
+# play events are still buffered.
+PLAY_HISTORY_SORT_KEYS = {"play_count", "last_played", "most_played",
+                          "recently_played"}
+
+# The order each collection is paged in when no sort key is given.
+DEFAULT_SORT_KEYS = {
+    "all songs": "track_name",
+    "album": "track_number",
+    "artist": "track_id",
+    "playlist": "position",
+    "genre": "genre_track_id",
+    "most played": "most_played",
+    "recently played": "recently_played",
+}
 
 
 class MusicDatabase:
-    """Class which provides an interface for database operations."""
-
-    def __init__(self, db_path):
-        """Initialise a `MusicDatabase` instance."""
-        self._artist_database = ArtistsDatabase(db_path)
-        self._albums_database = AlbumsDatabase(db_path, self._artist_database)
-        self._playlist_database = PlaylistDatabase(db_path)
-        self._tracks_database = TrackDatabase(db_path,
-                                              self._artist_database,
-                                              self._albums_database,
-                                              self._playlist_database)
-        self.create_database()
+    """
+    Class which provides an interface for database operations.
+
+    Point lookups of names, paths, durations and playlists are served
+    from an in-memory LRU cache. Every method that deletes or changes
+    those rows invalidates the affected entries.
+
+    Writes are not applied on the calling thread. They are queued for a
+    dedicated writer thread, which commits writes made close together
+    in one transaction, and each write method returns a
+    `concurrent.futures.Future` for its result. Reads wait for the
+    writes their thread queued before them, so a caller always reads
+    its own writes. Calls made inside `batch()` share one connection
+    and one transaction instead.
+
+    The database is opened in write-ahead logging mode and every thread
+    other than the writer reads through a read-only connection, so
+    reads are never blocked by a commit in progress.
+
+    Plays and skips are held in memory and written in batches, see
+    `record_play()`.
+
+    Every method may be called from any thread, such as the workers of
+    a thread pool. Each thread reads through its own connection, writes
+    from every thread are applied one at a time in the order they were
+    queued, and the cache, play event buffer and library snapshot are
+    shared under locks. A thread always reads its own writes, but only
+    sees another thread's writes once that thread's future has
+    resolved. `close()` must only be called once no other thread is
+    using the database.
+
+    Given a snapshot path, "all songs" is listed from the library
+    snapshot written after the last scan until the next scan calls
+    `refresh_library_snapshot()`, so the library can be shown as soon
+    as the app opens.
+    """
 
+    def __init__(self, db_path, cache_size=4096, max_batch_latency=0.005,
+                 pragmas=None, profile_queries=False,
+                 slow_query_threshold=0.01, snapshot_path=None):
+        """
+        Initialise a `MusicDatabase` instance.
+
+        Parameters
+        ----------
+        db_path : str
+            The path to the database.
+        cache_size : int, optional
+            The maximum number of lookups held in the cache.
+        max_batch_latency : float, optional
+            The longest time in seconds a queued write waits for others
+            to share its commit.
+        pragmas : dict, optional
+            Pragmas overriding the connection defaults in
+            `connectionmanager.DEFAULT_PRAGMAS`.
+        profile_queries : bool, optional
+            Whether to time every query for `get_query_profile()`.
+            Off by default, as timing adds a little to every query.
+        slow_query_threshold : float, optional
+            The time in seconds above which a profiled query is logged
+            with its query plan.
+        snapshot_path : str, optional
+            The path of the library snapshot. `None` keeps no snapshot.
+        """
+        # The snapshot is mapped first, as it doesn't need the database.
+        self._library_snapshot = (LibrarySnapshot(snapshot_path)
+                                  if snapshot_path else None)
+        # Only one thread at a time writes or discards the snapshot.
+        self._snapshot_lock = threading.Lock()
+        self._serving_snapshot = (self._library_snapshot is not None
+                                  and self._library_snapshot.load())
+
+        self._profiler = (QueryProfiler(slow_query_threshold)
+                          if profile_queries else None)
+        self._connection_manager = ConnectionManager(db_path, pragmas=pragmas,
+                                                     profiler=self._profiler)
+        self._cache = LookupCache(cache_size)
+        # The database classes create their tables as they are made, so
+        # their statements are profiled with the schema's.
+        with self._connection_manager.labelled(
+                "MusicDatabase.create_database"):
+            self._artist_database = ArtistsDatabase(self._connection_manager)
+            self._albums_database = AlbumsDatabase(self._connection_manager,
+                                                   self._artist_database)
+            self._playlist_database = PlaylistDatabase(
+                self._connection_manager
+            )
+            self._genres_database = GenresDatabase(self._connection_manager)
+            self._tracks_database = TrackDatabase(self._connection_manager,
+                                                  self._artist_database,
+                                                  self._albums_database,
+                                                  self._genres_database)
+            self._search_database = SearchDatabase(self._connection_manager)
+            self._stats_database = StatsDatabase(self._connection_manager)
+            self._play_history_database = PlayHistoryDatabase(
+                self._connection_manager
+            )
+            self.create_database()
+        self._writer = DatabaseWriter(self._connection_manager,
+                                      max_batch_latency)
+        self._play_events = PlayEventBuffer(self._write_play_events)
+
+    @_labelled
     def create_database(self):
-        """Create the database tables if they don't already exist."""
+        """
+        Create the database tables if they don't already exist.
+
+        The schema is then upgraded to the latest version by applying
+        any outstanding migrations.
+        """
         self._artist_database.create_database()
         self._albums_database.create_database()
         self._tracks_database.create_database()
         self._playlist_database.create_tables()
+        migrate(self._connection_manager)
+
+    def close(self):
+        """Commit any buffered and queued writes and close all connections."""
+        self._play_events.flush()
+        self._writer.close()
+        self._connection_manager.close()
+
+    def snapshot(self):
+        """
+        Return a context manager reading from one database snapshot.
+
+        The reads in the block see every write the calling thread queued
+        before it, and no write committed while it runs, so a view built from several
+        queries is consistent even while a scan is writing.
+        """
+        self._writer.wait_for_writes()
+        return self._connection_manager.snapshot()
+
+    @contextmanager
+    def batch(self):
+        """
+        Group the calling thread's calls into one transaction.
+
+        Every method called by the thread inside the block runs on the
+        writer's connection, so reads see the batch's writes, and all
+        the writes are committed together when the block ends. If the
+        block raises, every write in it is rolled back. Batches may be
+        nested, and a nested batch which raises is rolled back alone.
+
+        Inside a batch, each write's future resolves as soon as the
+        write has run. Writes from other threads wait until the batch
+        ends.
+        """
+        with self._writer.batch():
+            yield
+
+    def refresh_library_snapshot(self):
+        """
+        Check the library snapshot and rewrite it if it is stale.
+
+        Called after each scan. The snapshot's stamp is compared with
+        the library's, which is read from the track count, total
+        duration and newest track keys, so an unchanged library costs a
+        few single-row reads. From then on "all songs" is read from the
+        database.
+
+        Returns
+        -------
+        bool
+            True if the library differs from the snapshot it was
+            listed from, so any listing made from the snapshot is out
+            of date. False if it is current or there is no snapshot
+            path.
+        """
+        if self._library_snapshot is None:
+            return False
+
+        # New reads go to the database, and `save()` waits for the
+        # snapshot reads already in progress before replacing the file.
+        self._serving_snapshot = False
+        self._writer.wait_for_writes()
+        with self._snapshot_lock, self._connection_manager.snapshot():
+            stamp = [get_schema_version(self._connection_manager),
+                     *self._stats_database.get_collection_stats("all songs"),
+                     *self._tracks_database.get_newest_keys()]
+            changed = stamp != self._library_snapshot.stamp
+            if changed:
+                self._library_snapshot.save(
+                    stamp, self._tracks_database.get_display_rows()
+                )
+        return changed
+
+    def get_connection_stats(self):
+        """
+        Return counters describing the use of database connections.
+
+        Returns
+        -------
+        dict
+            Dictionary with the number of connections opened, the
+            number currently open, the number of statements executed
+            and how many of those had to be prepared.
+        """
+        return self._connection_manager.get_stats()
+
+    def _cached(self, key, loader):
+        """Return a lookup from the cache, loading it on a miss."""
+        # Inside a snapshot or batch the thread may read rows older or
+        # newer than those committed, which must not be cached.
+        if self._connection_manager.in_transaction():
+            return loader()
+        return self._cache.get(key, loader)
+
+    def get_cache_stats(self):
+        """
+        Return the size and hit/miss counters of the lookup cache.
+
+        Returns
+        -------
+        dict
+            Dictionary with the cache's `size`, `maxsize`, `hits` and
+            `misses`.
+        """
+        return self._cache.get_stats()
+
+    def get_query_profile(self):
+        """
+        Return the statistics recorded for every query.
+
+        Returns
+        -------
+        dict or None
+            Dictionary with the call count, total time, p50 and p99
+            latency and rows returned of each query, the slow query log
+            and the time spent opening connections. `None` if queries
+            are not being profiled.
+        """
+        if self._profiler is None:
+            return None
+        return self._profiler.get_report()
 
+    def format_query_profile(self):
+        """
+        Return the query statistics as a printable report.
+
+        Returns
+        -------
+        str or None
+            The report, or `None` if queries are not being profiled.
+        """
+        if self._profiler is None:
+            return None
+        return self._profiler.format_report()
+
+    @_after_writes
+    def verify_query_plans(self):
+        """
+        Check that the queries executed so far are backed by indexes.
+
+        Every statement run through the database classes is explained
+        with `EXPLAIN QUERY PLAN`. A statement with a `WHERE` clause
+        fails the check if it scans a table, with or without an index,
+        instead of searching one. Any statement fails if it sorts its
+        results in a temporary b-tree. Statements which read a whole
+        table by design are marked with a `/* full scan */` comment.
+
+        Raises
+        ------
+        AssertionError
+            If any statement does not use an index, listing each
+            offending statement with its query plan.
+        """
+        plans = self._connection_manager.explain_query_plans()
+        failures = []
+        for sql, plan in plans.items():
+            filtered = (re.search(r"\bWHERE\b", sql, re.IGNORECASE)
+                        and "/* full scan */" not in sql)
+            # Subqueries and views materialised by the plan are not
+            # tables, so scanning them is not a missed index.
+            subqueries = {detail.split(None, 1)[1] for detail in plan
+                          if detail.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+            for detail in plan:
+                scanned = detail.split()[1] if detail.startswith("SCAN") else None
+                table_scan = (scanned is not None
+                              and scanned not in subqueries
+                              and not scanned.startswith("(subquery")
+                              and "VIRTUAL TABLE" not in detail
+                              and "CONSTANT ROW" not in detail)
+                if ((table_scan and filtered)
+                        or "USE TEMP B-TREE" in detail):
+                    failures.append(f"{' '.join(sql.split())}\n    {plan}")
+                    break
+
+        assert not failures, (
+            "Queries not using an index:\n" + "\n".join(failures)
+        )
+
+    @_after_writes
     def artist_exists(self, artist_name):
         """Check if the provided artist is in the database."""
         return self._artist_database.artist_exists(artist_name)
 
     def insert_artist(self, artist_name):
-        """Add an artist to the database."""
-        self._artist_database.insert_artist(artist_name)
+        """Queue adding an artist, resolving to its `artist_id`."""
+        return self._writer.submit(
+            self._artist_database.insert_artist, artist_name,
+            after_commit=lambda artist_id: self._invalidate_ids(
+                {"artists": [artist_id]}
+            )
+        )
 
+    @_after_writes
     def get_artist_id(self, artist_name):
         """Return the artist's `artist_id`."""
         return self._artist_database.get_artist_id(artist_name)
 
+    @_after_writes
     def get_artist_name(self, artist_id):
         """Get the artist's name from the identifier."""
-        return self._artist_database.get_artist_name(artist_id)
+        return self._cached(
+            ("artist_name", artist_id),
+            lambda: self._artist_database.get_artist_name(artist_id)
+        )
 
+    @_after_writes
     def get_artist_tracklist(self, artist_id):
         """Return the list of tracks by an artist."""
         return self._artist_database.get_artist_tracklist(artist_id)
 
-    def album_exists(self, album_name, artist):
+    @_after_writes
+    def album_exists(self, album_name, artist, release_date):
         """
         Check if an album exists in the database
 
-        The album's title, artist and release date are considered to
-        ensure that only exact matches give a positive result.
+        The album's title, album artist and release date are considered
+        to ensure that only exact matches give a positive result.
 
         Parameters
         ----------
         album_name : str
             The title of the album.
         artist : str
-            The name of the artist
+            The name of the album artist.
+        release_date : str
+            The release date of the album.
 
         Returns
         -------
         bool
             `True` if the album exists in the database, `False` otherwise.
         """
-        return self._albums_database.album_exists(album_name,
-                                                  artist)
+        return self._albums_database.album_exists(album_name, artist,
+                                                  release_date)
 
     def insert_album(self, album_name, artist, release_date):
-        """Insert an album into the database."""
-        self._albums_database.insert_album(album_name, artist, release_date)
+        """Queue inserting an album, resolving to its `album_id`."""
+        return self._writer.submit(
+            self._albums_database.insert_album,
+            album_name, artist, release_date,
+            after_commit=lambda album_id: self._invalidate_ids(
+                {"albums": [album_id]}
+            )
+        )
+
+    def upsert_album(self, album_name, artist_id, release_date):
+        """
+        Queue adding an album if it is new.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the `album_id` of the new or existing album.
+        """
+        return self._writer.submit(
+            self._albums_database.upsert_album,
+            album_name, artist_id, release_date,
+            after_commit=lambda album_id: self._invalidate_ids(
+                {"albums": [album_id]}
+            )
+        )
 
-    def get_album_id(self, album_name, release_date):
+    @_after_writes
+    def get_album_id(self, album_name, artist, release_date):
         """Return an album's unique identifier."""
-        return self._albums_database.get_album_id(album_name, release_date)
+        return self._albums_database.get_album_id(album_name, artist,
+                                                  release_date)
 
+    @_after_writes
     def get_album_title(self, album_id):
         """Return the album's title from its identifier."""
-        return self._albums_database.get_album_title(album_id)
+        return self._cached(
+            ("album_title", album_id),
+            lambda: self._albums_database.get_album_title(album_id)
+        )
 
+    @_after_writes
     def get_album_metadata(self, album_ids):
         """
         Get data about albums from their identifiers.
 
+        The artist's name is joined in the same query.
+
         Parameters
         ----------
         album_ids : list of int
@@ -98,59 +484,390 @@ class MusicDatabase:
         """
         return self._albums_database.get_album_metadata(album_ids)
 
-    def get_all_albums(self):
-        """Return a list of every `album_id` in the albums database."""
-        return self._albums_database.get_all_albums()
+    @_after_writes
+    def get_all_albums(self, sort_by="album_name"):
+        """
+        Return a list of every `album_id` in the albums database.
 
+        Parameters
+        ----------
+        sort_by : {"album_name", "artist", "release_date"}, optional
+            The order of the albums.
+        """
+        return self._albums_database.get_all_albums(sort_by)
+
+    @_after_writes
     def get_album_tracklist(self, album_id):
         """Return a list of `track_id`s in the given album."""
         return self._albums_database.get_album_tracklist(album_id)
 
+    @_after_writes
     def track_exists(self, file_path):
         """Return True if the file path is in the database and False otherwise."""
         return self._tracks_database.track_exists(file_path)
 
-    def track_is_duplicate(self, track_name, artist, album, release_date):
-        """Return True if track is already in the database, False otherwise."""
-        return self._tracks_database.track_is_duplicate(track_name, artist,
-                                                        album, release_date)
+    @_after_writes
+    def track_is_duplicate(self, track_name, artist, album, release_date,
+                           album_artist=None):
+        """
+        Return True if track is already in the database, False otherwise.
+
+        The album is filed under `album_artist`, or under `artist` if
+        there is none.
+        """
+        return self._tracks_database.track_is_duplicate(
+            track_name, artist, album, release_date, album_artist
+        )
 
     def insert_track(self, track_name, artist, album, track_number,
                      release_date, genre, duration, file_path):
-        """Add a track to the database."""
-        self._tracks_database.insert_track(track_name, artist, album,
-                                           track_number, release_date,
-                                           genre, duration, file_path)
+        """
+        Queue adding a track to the database.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dictionary with the lists of `"tracks"`,
+            `"albums"` and `"genres"` written.
+        """
+        return self._writer.submit(self._tracks_database.insert_track,
+                                   track_name, artist, album, track_number,
+                                   release_date, genre, duration, file_path,
+                                   after_commit=self._invalidate_ids)
+
+    def ingest_tracks(self, batch):
+        """
+        Queue adding a batch of tracks, with their artists and albums.
 
-    def get_all_tracks(self):
-        """Return a list of all `track_id`s in the database."""
-        return self._tracks_database.get_all_tracks()
+        The artists, albums and tracks are upserted with one
+        `executemany` per table, so a large import is written once per
+        batch rather than several times per file.
+
+        Parameters
+        ----------
+        batch : list of dict
+            Tag records for the tracks. Each record has the keys
+            `track_name`, `artist`, `album`, `track_number`,
+            `release_date`, `genre`, `duration` and `file_path`.
+            `genre` is the list of the track's genres, or a single
+            genre. An optional `album_artist` key names the artist the
+            album is filed under, which is otherwise `artist`. The
+            optional `file_size`, `file_mtime` and `content_hash` keys
+            fingerprint the file, so it is recognised if it is moved.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dictionary with the lists of `"tracks"` added
+            and of the `"artists"`, `"albums"` and `"genres"` written.
+        """
+        return self._writer.submit(self._ingest_tracks, list(batch),
+                                   after_commit=self._invalidate_ids)
+
+    def _ingest_tracks(self, batch):
+        """Add a batch of tracks on the writer thread."""
+        if not batch:
+            return {"tracks": [], "artists": [], "albums": [], "genres": []}
+
+        with self._connection_manager.transaction():
+            album_keys = [
+                (record["album"],
+                 record.get("album_artist") or record["artist"],
+                 record["release_date"])
+                for record in batch
+            ]
+            artist_ids = self._artist_database.upsert_artists(
+                [record["artist"] for record in batch]
+                + [album_artist for _, album_artist, _ in album_keys]
+            )
+            album_ids = self._albums_database.upsert_albums(
+                (album_name, artist_ids[album_artist], release_date)
+                for album_name, album_artist, release_date in album_keys
+            )
+            genre_names = [split_genres(record["genre"]) for record in batch]
+            genre_ids = self._genres_database.upsert_genres(
+                name for names in genre_names for name in names
+            )
+
+            tracks = []
+            for record, names, album_key in zip(batch, genre_names,
+                                                album_keys):
+                album_name, album_artist, release_date = album_key
+                album_id = album_ids[(album_name, artist_ids[album_artist],
+                                      release_date)]
+                track = {
+                    "track_name": record["track_name"],
+                    "artist_id": artist_ids[record["artist"]],
+                    "album_id": album_id,
+                    "track_number": record["track_number"],
+                    "release_date": record["release_date"],
+                    "genre": "; ".join(names),
+                    "genre_ids": [genre_ids[name] for name in names],
+                    "duration": record["duration"],
+                    "file_path": record["file_path"],
+                    "file_size": record.get("file_size", 0),
+                    "file_mtime": record.get("file_mtime", 0),
+                    "content_hash": record.get("content_hash")
+                }
+                tracks.append(track)
+
+            track_ids = self._tracks_database.insert_tracks(tracks)
+        return {"tracks": track_ids,
+                "artists": list(set(artist_ids.values())),
+                "albums": list(set(album_ids.values())),
+                "genres": list(set(genre_ids.values()))}
+
+    @_after_writes
+    def get_all_tracks(self, sort_by="track_name"):
+        """
+        Return a list of all `track_id`s in the database.
+
+        Parameters
+        ----------
+        sort_by : str, optional
+            The order of the tracks, one of the `TRACK_SORTS` keys.
+        """
+        return self._tracks_database.get_all_tracks(sort_by)
+
+    @_labelled
+    def get_tracks_page(self, collection_type="all songs", collection_id=None,
+                        sort_key=None, after=None, limit=200):
+        """
+        Return one page of the tracks in a collection.
+
+        Pages are read with keyset pagination, so fetching any page
+        costs the same regardless of the size of the library or how
+        many pages have already been read.
+
+        Parameters
+        ----------
+        collection_type : {"all songs", "album", "artist", "playlist", "genre", "most played", "recently played"}, optional
+            The type of collection to read. "most played" and "recently
+            played" list the tracks that have been played.
+        collection_id : int, optional
+            The album, artist, playlist or genre to read. Ignored for
+            the other collections.
+        sort_key : str, optional
+            The order of the tracks. `None` uses the collection's
+            default from `DEFAULT_SORT_KEYS`. "all songs" can be read in
+            any of the `TRACK_SORTS` orders, while the other collections
+            only support their default order.
+        after : tuple, optional
+            The cursor returned with the previous page. `None` returns
+            the first page.
+        limit : int, optional
+            The maximum number of tracks in the page.
+
+        Returns
+        -------
+        tuple
+            The list of `track_id`s and the cursor to pass as `after`
+            for the next page, which is `None` once a page is empty.
+        """
+        if collection_type not in DEFAULT_SORT_KEYS:
+            raise ValueError(f"Unrecognised collection type: {collection_type}")
+        if sort_key is None:
+            sort_key = DEFAULT_SORT_KEYS[collection_type]
+
+        if (self._serving_snapshot and collection_type == "all songs"
+                and sort_key == DEFAULT_SORT_KEYS["all songs"]):
+            # The snapshot may be unloaded by a refresh on another thread
+            page = self._library_snapshot.get_tracks_page(after, limit)
+            if page is not None:
+                return page
+
+        # Buffered plays are written first, so they are read like any
+        # other write made before the read.
+        if sort_key in PLAY_HISTORY_SORT_KEYS:
+            self._play_events.flush()
+        self._writer.wait_for_writes()
+
+        if collection_type == "playlist":
+            if sort_key != "position":
+                raise ValueError("Playlists can only be read in playlist order.")
+            return self._playlist_database.get_playlist_page(
+                collection_id, after, limit
+            )
+
+        filter_column = {"album": "album_id",
+                         "artist": "artist_id",
+                         "genre": "genre_id"}.get(collection_type)
+        return self._tracks_database.get_tracks_page(
+            sort_key, after, limit, filter_column, collection_id
+        )
+
+    def record_play(self, track_id, skipped=False):
+        """
+        Record that a track was played or skipped.
 
+        The event is held in memory and written with others in one
+        batch, so recording a play usually costs no database write.
+        The track's `play_count` or `skip_count` and `last_played`
+        are updated as the batch is written.
+
+        Parameters
+        ----------
+        track_id : int
+            The track played.
+        skipped : bool, optional
+            True if the track was skipped rather than played.
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Resolves to the number of events written, if this event
+            filled the buffer. `None` if the event is still buffered.
+        """
+        return self._play_events.add(track_id, skipped)
+
+    def flush_play_events(self):
+        """
+        Queue writing every buffered play event.
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Resolves to the number of events written, or `None` if no
+            events were buffered.
+        """
+        return self._play_events.flush()
+
+    def _write_play_events(self, events):
+        """Queue writing a batch of play events."""
+        # Plays are recorded in passing, so nothing waits on the write.
+        return log_write_errors(self._writer.submit(
+            self._play_history_database.insert_play_events, events
+        ))
+
+    @_labelled
+    def get_play_stats(self, track_id):
+        """
+        Return the play counters of a track.
+
+        Returns
+        -------
+        dict
+            Dictionary with the track's `play_count`, `skip_count` and
+            `last_played`, the Unix timestamp of its last play or 0 if
+            it has never been played.
+        """
+        self._play_events.flush()
+        self._writer.wait_for_writes()
+        return self._play_history_database.get_play_stats(track_id)
+
+    @_after_writes
     def get_track_metadata(self, id_list):
         """
         Return the database data corresponding to the tracks in the list of
         track_ids.
 
+        Each row is fully denormalised in a single query: alongside the
+        track's own columns it carries the `artist_name` and
+        `album_name`, so callers need no further name lookups.
+
         Returns
         -------
         dict
             A dictionary where keys are `track_id`s and the values are
             dictionaries containing info about that track.
         """
+        if self._serving_snapshot:
+            tracks = self._library_snapshot.get_track_metadata(id_list)
+            if tracks is not None and len(tracks) == len(set(id_list)):
+                return tracks
         return self._tracks_database.get_track_metadata(id_list)
 
+    @_after_writes
+    def iter_track_metadata(self, id_list):
+        """
+        Yield `(track_id, track)` pairs in the order of `id_list`.
+
+        Like `get_track_metadata()`, but streams the rows as they are
+        read instead of building the whole dictionary first.
+        """
+        return self._tracks_database.iter_track_metadata(id_list)
+
+    @_after_writes
+    def get_collection_stats(self, collection_type="all songs",
+                             collection_id=None):
+        """
+        Return the number of tracks and total duration of a collection.
+
+        The totals are maintained by triggers as tracks and playlist
+        entries change, so this is a single-row read.
+
+        Parameters
+        ----------
+        collection_type : {"all songs", "album", "artist", "playlist", "genre"}, optional
+            The type of collection.
+        collection_id : int, optional
+            The album, artist, playlist or genre. Ignored for
+            "all songs".
+
+        Returns
+        -------
+        tuple
+            The track count and the total duration in seconds.
+        """
+        if collection_type == "all songs":
+            stats = (self._library_snapshot.get_stats()
+                     if self._serving_snapshot else None)
+            if stats is not None:
+                return stats
+            collection_id = 0
+        return self._stats_database.get_collection_stats(collection_type,
+                                                         collection_id)
+
+    @_after_writes
+    def search(self, query, limit=50):
+        """
+        Return the tracks which best match a search query.
+
+        Each word of the query is prefix-matched against the track
+        title, artist, album and genre, and results are ranked by
+        relevance. A query matching more than 1000 tracks is not
+        ranked; it returns the newest tracks matching in
+        the title, then the artist or album, then the genre, then
+        across columns. Such queries read the whole index entry of each
+        broad word, so one on a genre shared by much of a large library
+        is the slowest kind of search.
+
+        Parameters
+        ----------
+        query : str
+            The text to search for.
+        limit : int, optional
+            The maximum number of tracks returned.
+
+        Returns
+        -------
+        list of int
+            The `track_id`s of the matching tracks, best match first.
+        """
+        return self._search_database.search(query, limit)
+
+    @_after_writes
     def get_path(self, track_id):
         """Return the file path of the given track."""
-        return self._tracks_database.get_path(track_id)
+        return self._cached(
+            ("path", track_id),
+            lambda: self._tracks_database.get_path(track_id)
+        )
 
+    @_after_writes
     def get_duration(self, track_id):
         """Return the duration of a track."""
-        return self._tracks_database.get_duration(track_id)
+        return self._cached(
+            ("duration", track_id),
+            lambda: self._tracks_database.get_duration(track_id)
+        )
 
+    @_after_writes
     def get_all_artists(self):
         """Return a list of all the artist_ids in the database."""
         return self._artist_database.get_all_artists()
 
+    @_after_writes
     def get_artist_metadata(self, artist_ids):
         """
         Return data about artists from a list of `artist_id`s.
@@ -168,82 +885,320 @@ class MusicDatabase:
         """
         return self._artist_database.get_artist_metadata(artist_ids)
 
+    @_after_writes
     def get_artist_albumlist(self, artist_id):
         """Return a list of albums by the artist."""
         return self._artist_database.get_artist_albumlist(artist_id)
 
+    @_after_writes
+    def get_all_genres(self):
+        """Return a list of every `genre_id`, ordered by name."""
+        return self._genres_database.get_all_genres()
+
+    @_after_writes
+    def get_genre_name(self, genre_id):
+        """Return the genre's name from its identifier."""
+        return self._cached(
+            ("genre_name", genre_id),
+            lambda: self._genres_database.get_genre_name(genre_id)
+        )
+
+    @_after_writes
+    def get_genre_metadata(self, genre_ids):
+        """
+        Return data about genres from a list of `genre_id`s.
+
+        Parameters
+        ----------
+        genre_ids : list
+            The `genre_id`s for the genres.
+
+        Returns
+        -------
+        dict
+            Dictionary where the keys are `genre_id`s and the values
+            are dictionaries of that genre's data.
+        """
+        return self._genres_database.get_genre_metadata(genre_ids)
+
+    @_after_writes
+    def get_genre_tracklist(self, genre_id):
+        """Return the list of tracks with a genre."""
+        return self._genres_database.get_genre_tracklist(genre_id)
+
     def create_playlist(self, playlist_name):
-        """Create a new playlist with the given name."""
-        return self._playlist_database.create_playlist(playlist_name)
+        """Queue creating a playlist, resolving to its `playlist_id`."""
+        return self._writer.submit(
+            self._playlist_database.create_playlist, playlist_name,
+            after_commit=lambda playlist_id: self._cache.invalidate(
+                ("playlists",), ("playlist_name", playlist_id)
+            )
+        )
 
     def add_to_playlist(self, track_id, playlist_id):
-        """Add a track to a playlist."""
-        return self._playlist_database.add_to_playlist(track_id, playlist_id)
+        """Queue adding a track to a playlist."""
+        return self._writer.submit(self._playlist_database.add_to_playlist,
+                                   track_id, playlist_id)
 
     def remove_from_playlist(self, track_id, playlist_id):
-        """Remove a track from a playlist."""
-        return self._playlist_database.remove_from_playlist(track_id, playlist_id)
+        """Queue removing a track from a playlist."""
+        return self._writer.submit(self._playlist_database.remove_from_playlist,
+                                   track_id, playlist_id)
+
+    def remove_at(self, playlist_id, index):
+        """
+        Queue removing the track at an index in a playlist.
+
+        Only that entry is removed, where `remove_from_playlist()`
+        removes every entry of the track.
+        """
+        return self._writer.submit(self._playlist_database.remove_at,
+                                   playlist_id, index)
 
+    @_after_writes
     def get_playlist_tracks(self, playlist_id):
         """Return the list of tracks in a playlist."""
         return self._playlist_database.get_playlist_tracks(playlist_id)
 
+    @_after_writes
     def get_playlists(self):
         """Return a list of all playlists in the database."""
-        return self._playlist_database.get_playlists()
+        playlists = self._cached(
+            ("playlists",),
+            self._playlist_database.get_playlists
+        )
+        return playlists.copy()
 
+    @_after_writes
     def get_playlist_name(self, playlist_id):
         """Return the name of a playlist from its ID."""
-        return self._playlist_database.get_playlist_name(playlist_id)
+        return self._cached(
+            ("playlist_name", playlist_id),
+            lambda: self._playlist_database.get_playlist_name(playlist_id)
+        )
 
+    @_after_writes
     def get_all_paths(self):
         """Return a list containing all the file paths in the database."""
         return self._tracks_database.get_all_paths()
 
+    @_after_writes
+    def get_paths_under(self, directory):
+        """Return the file paths of the tracks inside a directory."""
+        return self._tracks_database.get_paths_under(directory)
+
+    @_after_writes
+    def get_fingerprints_under(self, directory):
+        """
+        Return the fingerprints of the tracks inside a directory.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each file path to its `(file_size,
+            file_mtime, content_hash)`.
+        """
+        return self._tracks_database.get_fingerprints_under(directory)
+
+    @_after_writes
+    def get_tracks_by_fingerprint(self, fingerprints):
+        """
+        Return the tracks whose files have the given fingerprints.
+
+        Parameters
+        ----------
+        fingerprints : iterable of tuple
+            `(file_size, content_hash)` pairs.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each pair found to a list of the
+            `(track_id, file_path)` of the tracks with it.
+        """
+        return self._tracks_database.get_tracks_by_fingerprint(fingerprints)
+
+    def update_fingerprints(self, fingerprints):
+        """
+        Queue storing the fingerprints of files which are already tracks.
+
+        Parameters
+        ----------
+        fingerprints : list of tuple
+            `(file_path, file_size, file_mtime, content_hash)` for each
+            file.
+        """
+        return self._writer.submit(self._tracks_database.update_fingerprints,
+                                   list(fingerprints))
+
+    def relocate_tracks(self, moves):
+        """
+        Queue pointing tracks at the new paths of their moved files.
+
+        The tracks keep their ids, playlist entries and play history.
+        The library snapshot is discarded first, as its stamp can't
+        tell that paths have changed, and is written again by the next
+        `refresh_library_snapshot()`. "All songs" is read from the
+        database until then.
+
+        Parameters
+        ----------
+        moves : list of tuple
+            `(track_id, file_path, file_size, file_mtime)` for each
+            moved file.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the list of `track_id`s of the moved tracks.
+        """
+        if self._library_snapshot is not None:
+            self._serving_snapshot = False
+            with self._snapshot_lock:
+                self._library_snapshot.discard()
+        return self._writer.submit(self._tracks_database.relocate_tracks,
+                                   list(moves),
+                                   after_commit=self._invalidate_tracks)
+
     def remove_by_paths(self, file_paths):
-        """Remove database entries corresponding to the file paths."""
-        return self._tracks_database.remove_by_paths(file_paths)
+        """
+        Queue removing the database entries for the file paths.
+
+        Deleting the tracks cascades to their playlist entries and
+        genre links.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the list of `track_id`s of the removed tracks.
+        """
+        return self._writer.submit(self._tracks_database.remove_by_paths,
+                                   list(file_paths),
+                                   after_commit=self._invalidate_tracks)
+
+    def _invalidate_tracks(self, track_ids):
+        """Remove cached lookups for the given tracks."""
+        keys = []
+        for track_id in track_ids:
+            keys.extend((("path", track_id), ("duration", track_id)))
+        self._cache.invalidate(*keys)
 
     def delete_playlist(self, playlist_id):
-        """Delete a playlist from the database."""
-        return self._playlist_database.delete_playlist(playlist_id)
+        """Queue deleting a playlist from the database."""
+        return self._writer.submit(
+            self._playlist_database.delete_playlist, playlist_id,
+            after_commit=lambda result: self._cache.invalidate(
+                ("playlists",), ("playlist_name", playlist_id)
+            )
+        )
 
     def swap_positions(self, playlist_id, pos_1, pos_2):
-        """Swap the positions of two tracks in a playlist."""
-        return self._playlist_database.swap_positions(playlist_id, pos_1, pos_2)
+        """Queue swapping the positions of two tracks in a playlist."""
+        return self._writer.submit(self._playlist_database.swap_positions,
+                                   playlist_id, pos_1, pos_2)
+
+    def move_track(self, playlist_id, from_index, to_index):
+        """
+        Queue moving the track at `from_index` in a playlist to `to_index`.
+
+        Indexes count from 0 in playlist order. Only the moved track's
+        row is written in the common case.
+        """
+        return self._writer.submit(self._playlist_database.move_track,
+                                   playlist_id, from_index, to_index)
 
+    def insert_at(self, playlist_id, track_ids, index):
+        """Queue inserting a list of tracks into a playlist at an index."""
+        return self._writer.submit(self._playlist_database.insert_at,
+                                   playlist_id, list(track_ids), index)
+
+    @_after_writes
     def get_track_pos(self, playlist_id, track_id):
         """Return the position of a track in a playlist."""
         return self._playlist_database.get_track_pos(playlist_id, track_id)
 
+    @_after_writes
     def get_min_pos(self, playlist_id):
         """Return the minimum position of a track in the database."""
         return self._playlist_database.get_min_pos(playlist_id)
 
+    @_after_writes
     def get_max_pos(self, playlist_id):
         """Return the largest position of a track in the playlist."""
         return self._playlist_database.get_max_pos(playlist_id)
 
-    def verify_albums(self):
-        """Verify and remove trackless albums from database."""
-        albums = self.get_all_albums()
-        for album_id in albums:
-            album_tracklist = self.get_album_tracklist(album_id)
-            if not album_tracklist:
-                self.delete_album(album_id)
-
-    def verify_artists(self):
-        """Verify and remove trackless artists from database."""
-        artists = self.get_all_artists()
-        for artist_id in artists:
-            artist_tracklist = self.get_artist_tracklist(artist_id)
-            if not artist_tracklist:
-                self.delete_artist(artist_id)
+    def remove_orphans(self):
+        """
+        Queue removing trackless albums, artists and genres.
+
+        Each delete is a single set-based statement.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dictionary with the lists of `"albums"`,
+            `"artists"` and `"genres"` removed.
+        """
+        return self._writer.submit(self._remove_orphans,
+                                   after_commit=self._invalidate_ids)
+
+    def _remove_orphans(self):
+        """Remove trackless albums, artists and genres on the writer thread."""
+        with self._connection_manager.transaction():
+            albums_removed = self._albums_database.delete_trackless_albums()
+            artists_removed = self._artist_database.delete_trackless_artists()
+            genres_removed = self._genres_database.delete_trackless_genres()
+        return {"albums": albums_removed, "artists": artists_removed,
+                "genres": genres_removed}
+
+    def _invalidate_ids(self, written):
+        """
+        Remove cached lookups for the rows written by an insert or delete.
+
+        `written` is a dictionary with lists of the `"tracks"`,
+        `"albums"`, `"artists"` and `"genres"` added or removed, any of
+        which may be left out.
+        """
+        self._invalidate_tracks(written.get("tracks", []))
+        self._cache.invalidate(
+            *[("album_title", album_id)
+              for album_id in written.get("albums", [])],
+            *[("artist_name", artist_id)
+              for artist_id in written.get("artists", [])],
+            *[("genre_name", genre_id)
+              for genre_id in written.get("genres", [])]
+        )
 
     def delete_album(self, album_id):
-        """Delete an album from the database."""
-        return self._albums_database.delete_album(album_id)
+        """
+        Queue deleting an album from the database.
+
+        The delete cascades to the album's tracks, and from them to
+        their playlist entries and genre links.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dictionary with the lists of `"albums"` and
+            `"tracks"` removed.
+        """
+        return self._writer.submit(self._albums_database.delete_album,
+                                   album_id,
+                                   after_commit=self._invalidate_ids)
 
     def delete_artist(self, artist_id):
-        """Delete an album from the database."""
-        return self._artist_database.delete_artist(artist_id)
+        """
+        Queue deleting an artist from the database.
+
+        The delete cascades to the artist's albums and tracks, and from
+        them to their playlist entries and genre links.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dictionary with the lists of `"artists"`,
+            `"albums"` and `"tracks"` removed.
+        """
+        return self._writer.submit(self._artist_database.delete_artist,
+                                   artist_id,
+                                   after_commit=self._invalidate_ids)
@@ -204,10 +204,8 @@ class PlayBarFrame(tk.Frame):
             id_list=[track_id]
         )[track_id]
         track_name = track_info["track_name"]
-        artist_id = track_info["artist"]
-        artist_name = self._music_database.get_artist_name(artist_id)
-        album_id = track_info["album"]
-        album_title = self._music_database.get_album_title(album_id)
+        artist_name = track_info["artist_name"]
+        album_title = track_info["album_name"]
 
         self._now_playing_info.update_now_playing(
             track_title=track_name,
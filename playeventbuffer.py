@@ -0,0 +1,96 @@
+import threading
+import time
+
+
+class PlayEventBuffer:
+    """
+    Class which holds play events in memory and writes them in batches.
+
+    A play event is recorded on every change of track, and writing each
+    one as it happens would cost a commit per song. Events are instead
+    kept in memory until enough have been recorded, or the oldest has
+    waited long enough, and then handed on together. Events still held
+    when the process dies are lost, which costs at most a few play
+    counts.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+
+    Methods
+    -------
+    add(track_id, skipped):
+        Record a play or skip of a track.
+    flush():
+        Hand on every event held.
+    """
+
+    def __init__(self, write_events, max_events=50, max_age=600.0):
+        """
+        Initialise a `PlayEventBuffer` instance.
+
+        Parameters
+        ----------
+        write_events : callable
+            Called with a list of `(track_id, played_at, skipped)`
+            triples to write them to the database.
+        max_events : int, optional
+            The number of events held before they are written.
+        max_age : float, optional
+            The time in seconds after which the oldest event is written
+            with the next event recorded.
+        """
+        self._write_events = write_events
+        self._max_events = max_events
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._events = []
+        self._oldest = None
+
+    def __len__(self):
+        """Return the number of events held."""
+        return len(self._events)
+
+    def add(self, track_id, skipped=False):
+        """
+        Record a play or skip of a track.
+
+        Parameters
+        ----------
+        track_id : int
+            The track played.
+        skipped : bool, optional
+            True if the track was skipped rather than played.
+
+        Returns
+        -------
+        object
+            The result of writing the events if this event filled the
+            buffer, otherwise `None`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self._events:
+                self._oldest = now
+            self._events.append((track_id, int(time.time()), skipped))
+            full = (len(self._events) >= self._max_events
+                    or now - self._oldest >= self._max_age)
+        if full:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """
+        Hand on every event held.
+
+        Returns
+        -------
+        object
+            The result of writing the events, or `None` if none were
+            held.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return None
+        return self._write_events(events)
@@ -0,0 +1,81 @@
+from connectionmanager import ConnectionManager
+
+
+class PlayHistoryDatabase:
+    """
+    Class responsible for handling operations with the play history.
+
+    Every play and skip is appended to the `play_events` table. A
+    trigger rolls each event up into the track's `play_count`,
+    `skip_count` and `last_played` columns, which the "most played" and
+    "recently played" orders read from their indexes.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager):
+        """
+        Initialise a `PlayHistoryDatabase` instance.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        """
+        self._connection_manager = connection_manager
+
+    def insert_play_events(self, events):
+        """
+        Append a batch of play events to the history.
+
+        Events for tracks which have been deleted since they were
+        recorded are dropped.
+
+        Parameters
+        ----------
+        events : list of tuple
+            `(track_id, played_at, skipped)` triples, where `played_at`
+            is a Unix timestamp and `skipped` is true if the track was
+            skipped rather than played.
+
+        Returns
+        -------
+        int
+            The number of events added.
+        """
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.executemany('''
+                INSERT INTO play_events (track_id, played_at, skipped)
+                SELECT :track_id, :played_at, :skipped
+                WHERE EXISTS (
+                    SELECT 1 FROM tracks WHERE track_id = :track_id
+                )
+            ''', (
+                {"track_id": track_id, "played_at": played_at,
+                 "skipped": int(bool(skipped))}
+                for track_id, played_at, skipped in events
+            ))
+            return cur.rowcount
+
+    def get_play_stats(self, track_id):
+        """
+        Return the play counters of a track.
+
+        Returns
+        -------
+        dict
+            Dictionary with the track's `play_count`, `skip_count` and
+            `last_played`, the Unix timestamp of its last play or 0 if
+            it has never been played.
+        """
+        cur = self._connection_manager.execute(
+            '''SELECT play_count, skip_count, last_played
+            FROM tracks
+            WHERE track_id = ?''',
+            (track_id,)
+        )
+        play_count, skip_count, last_played = cur.fetchone()
+        return {"play_count": play_count, "skip_count": skip_count,
+                "last_played": last_played}
@@ -2,6 +2,7 @@ import tkinter as tk
 from functools import partial
 
 from tracksdisplay import TracksDisplay
+from musicdatabase import log_write_errors
 from root import colour_scheme
 
 
@@ -15,6 +16,8 @@ class PlaylistDisplay(TracksDisplay):
         Display the playlist corresponding to the given id.
     display_tracklist():
         Display the tracklist. Overrides `TracksDisplay.display_tracklist()`.
+    clear_display():
+        Remove all widgets. Overrides `TracksDisplay.clear_display()`.
     """
 
     def __init__(self, display_frame, display_canvas, music_database,
@@ -45,10 +48,10 @@ class PlaylistDisplay(TracksDisplay):
         super().__init__(display_frame, display_canvas, music_database,
                          track_list, mixer_controller, play_track_function,
                          add_to_queue_function, play_next_function)
-        self._remove_from_playlist_command = self._music_db.remove_from_playlist
         self._colour_scheme = colour_scheme
         self._playlist_id = None
-        self._remove_buttons = {}
+        # Maps playlist indexes to the track items at them, as a track
+        # can be in the playlist more than once.
         self._pos_to_item = {}
         self._start_column = 1
 
@@ -61,10 +64,9 @@ class PlaylistDisplay(TracksDisplay):
         """
         return self._music_db.get_playlist_tracks(self._playlist_id)
 
-    def _create_remove_buttons(self, track_id, track_item):
+    def _create_remove_buttons(self, track_item):
         """Create the remove buttons."""
-        remove_track_command = partial(self._remove_from_playlist,
-                                       track_id, self._playlist_id)
+        remove_track_command = partial(self._remove_from_playlist, track_item)
 
         remove_button = tk.Button(track_item,
                                   text="❌",
@@ -78,85 +80,98 @@ class PlaylistDisplay(TracksDisplay):
 
         track_item.track_widgets.append(remove_button)
 
-        if track_id == self.highlighted_track:
+        if track_item.track_id == self.highlighted_track:
             remove_button.config(bg=self._colour_scheme["munsell"])
 
-        self._remove_buttons[track_id] = remove_button
-
-    def _remove_from_playlist(self, track_id, collection_id):
-        """Remove a track from the playlist."""
-        # remove button and widget:
-        track_widget = self.widgets_dict[track_id]
-        track_widget.destroy()
-        self.widgets_dict.pop(track_id)
-
-        self._remove_buttons[track_id].destroy()
-        self._remove_buttons.pop(track_id)
-
-        # Call the remove from playlist command
-        self._remove_from_playlist_command(track_id, collection_id)
-
-    def _create_move_buttons(self, track_id, track_item):
+    def _get_item_row(self, track_item):
+        """Return the row of a track item in the displayed playlist."""
+        for pos, item in self._pos_to_item.items():
+            if item is track_item:
+                return pos
+
+    def _remove_from_playlist(self, track_item):
+        """Remove a track item's entry from the playlist."""
+        row = self._get_item_row(track_item)
+        log_write_errors(self._music_db.remove_at(self._playlist_id, row))
+
+        # remove the widget, with its buttons:
+        track_item.destroy()
+        self.all_track_widgets.remove(track_item)
+
+        # Close the gap left in the list, so rows stay equal to indexes
+        for pos in range(row + 1, len(self._pos_to_item)):
+            item = self._pos_to_item[pos]
+            item.grid_configure(row=pos - 1)
+            item.track_number_widget.config(text=pos)
+            self._pos_to_item[pos - 1] = item
+        self._pos_to_item.pop(len(self._pos_to_item) - 1)
+
+        # Another entry of the same track may still be shown
+        track_id = track_item.track_id
+        if self.widgets_dict.get(track_id) is track_item:
+            self.widgets_dict.pop(track_id)
+            for item in self._pos_to_item.values():
+                if item.track_id == track_id:
+                    self.widgets_dict[track_id] = item
+
+    def _create_move_buttons(self, track_item):
         """Create the move buttons."""
         # Add buttons to the track items
         move_up_button = tk.Button(track_item, text="⬆️",
-                                   command=lambda t=(track_id, track_item): self._move_up(t),
+                                   command=lambda t=track_item: self._move_up(t),
                                    width=4, bg=self._colour_scheme["dark"], fg=self._colour_scheme["yellow"])
         move_up_button.grid(row=0, column=0)
         move_down_button = tk.Button(track_item, text="⬇️",
-                                     command=lambda t=(track_id, track_item): self._move_down(t),
+                                     command=lambda t=track_item: self._move_down(t),
                                      width=4, bg=self._colour_scheme["dark"], fg=self._colour_scheme["yellow"])
         move_down_button.grid(row=1, column=0)
 
         track_item.track_widgets.extend([move_down_button, move_up_button])
 
-    def _move_up(self, track):
+    def _move_up(self, track_item):
         """Move the track up one place in the playlist."""
-        track_id = track[0]
-        track_pos = self._music_db.get_track_pos(self._playlist_id, track_id)
-        old_index = track_pos
+        old_index = self._get_item_row(track_item)
         new_index = old_index - 1
-        min_pos = self._music_db.get_min_pos(self._playlist_id)
-        if new_index < min_pos:
-            new_index = min_pos
 
-        if old_index != new_index:
-            self._swap_items(track[1], old_index, new_index)
+        if new_index >= 0:
+            self._swap_items(old_index, new_index)
 
-    def _move_down(self, track):
+    def _move_down(self, track_item):
         """Move the track down one place in the playlist."""
-
-        track_id = track[0]
-        track_pos = self._music_db.get_track_pos(self._playlist_id, track_id)
-        old_index = track_pos
+        old_index = self._get_item_row(track_item)
         new_index = old_index + 1
-        max_pos = self._music_db.get_max_pos(self._playlist_id)
-        if new_index > max_pos:
-            new_index = max_pos
 
-        if old_index != new_index:
-            self._swap_items(track[1], old_index, new_index)
+        if new_index < len(self._pos_to_item):
+            self._swap_items(old_index, new_index)
 
-    def _swap_items(self, track_item, pos_1, pos_2):
-        """Swap the positions of the tracks at these positions in the playlist."""
+    def _swap_items(self, pos_1, pos_2):
+        """Swap the positions of the tracks at these indexes in the playlist."""
         # Update the database
-        self._music_db.swap_positions(self._playlist_id, pos_1, pos_2)
+        log_write_errors(
+            self._music_db.move_track(self._playlist_id, pos_1, pos_2)
+        )
 
         # update widgets
-        item_1 = track_item
-        row_1 = item_1.grid_info()['row']
-        # Find the other item
-        if pos_2 > pos_1:  # Moving down
-            row_2 = row_1 + 1
-        else:  # Moving up
-            row_2 = row_1 - 1
-        item_2 = self._pos_to_item[row_2]
-        item_1.grid_configure(row=row_2)
-        item_1.track_number_widget.config(text=row_2+1)
-        item_2.grid_configure(row=row_1)
-        item_2.track_number_widget.config(text=row_1+1)
-        self._pos_to_item[row_1] = item_2
-        self._pos_to_item[row_2] = item_1
+        item_1 = self._pos_to_item[pos_1]
+        item_2 = self._pos_to_item[pos_2]
+        item_1.grid_configure(row=pos_2)
+        item_1.track_number_widget.config(text=pos_2+1)
+        item_2.grid_configure(row=pos_1)
+        item_2.track_number_widget.config(text=pos_1+1)
+        self._pos_to_item[pos_1] = item_2
+        self._pos_to_item[pos_2] = item_1
+
+    def clear_display(self):
+        """
+        Remove all widgets on the current display.
+
+        Overrides `TracksDisplay.clear_display()` to also destroy the
+        items of repeated tracks, which aren't in `widgets_dict`.
+        """
+        for track_item in self.all_track_widgets:
+            track_item.destroy()
+        self._pos_to_item = {}
+        super().clear_display()
 
     def display_collection(self, collection_id):
         """Display the playlist corresponding to the given id."""
@@ -172,11 +187,11 @@ class PlaylistDisplay(TracksDisplay):
         """
         super().display_tracklist()
 
-        pos = 0
-        for track_id in self.widgets_dict:
-            track_item = self.widgets_dict[track_id]
+        # Every entry has its own item, in playlist order, even when
+        # `widgets_dict` holds only one item for a repeated track.
+        self._pos_to_item = {}
+        for pos, track_item in enumerate(self.all_track_widgets):
             track_item.grid_configure(row=pos)
             self._pos_to_item[pos] = track_item
-            pos += 1
-            self._create_remove_buttons(track_id, track_item)
-            self._create_move_buttons(track_id, track_item)
+            self._create_remove_buttons(track_item)
+            self._create_move_buttons(track_item)
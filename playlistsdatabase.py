@@ -1,4 +1,4 @@
-import sqlite3
+from connectionmanager import ConnectionManager
 
 
 class PlaylistDatabase:
@@ -7,57 +7,63 @@ class PlaylistDatabase:
 
     This class is not used directly by other components, as the
     `MusicDatabase` class provides the interface for database operations.
+
+    Track positions within a playlist are spaced `POSITION_GAP` apart, so
+    a track can be moved or inserted by giving it a position between its
+    new neighbours without renumbering the rest of the playlist. The
+    playlist is only renumbered once a gap has been used up.
     """
 
-    def __init__(self, db_path):
-        """Initialise a `PlaylistDatabase` instance."""
-        self._db_path = db_path
+    POSITION_GAP = 1024
+
+    def __init__(self, connection_manager: ConnectionManager):
+        """
+        Initialise a `PlaylistDatabase` instance.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        """
+        self._connection_manager = connection_manager
         self.create_tables()
 
     def create_tables(self):
         """Create the `playlists` and `playlist_tracks` tables if they don't exist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS playlists (
-                playlist_id INTEGER PRIMARY KEY,
-                playlist_name TEXT NOT NULL
-            )
-        ''')
-
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS playlist_tracks (
-                identifier INTEGER PRIMARY KEY,
-                playlist_id INTEGER NOT NULL,
-                track_id INTEGER NOT NULL,
-                position INTEGER NOT NULL,
-                FOREIGN KEY (playlist_id) REFERENCES playlists(playlist_id),
-                FOREIGN KEY (track_id) REFERENCES tracks(track_id)
-                UNIQUE (playlist_id, track_id, position)
-            )
-        ''')
-
-        con.commit()
-        con.close()
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                CREATE TABLE IF NOT EXISTS playlists (
+                    playlist_id INTEGER PRIMARY KEY,
+                    playlist_name TEXT NOT NULL
+                )
+            ''')
+
+            self._connection_manager.execute('''
+                CREATE TABLE IF NOT EXISTS playlist_tracks (
+                    identifier INTEGER PRIMARY KEY,
+                    playlist_id INTEGER NOT NULL,
+                    track_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    FOREIGN KEY (playlist_id) REFERENCES playlists(playlist_id),
+                    FOREIGN KEY (track_id) REFERENCES tracks(track_id)
+                    UNIQUE (playlist_id, track_id, position)
+                )
+            ''')
 
     def create_playlist(self, playlist_name):
-        """Create a new playlist with the given name."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            INSERT INTO playlists (playlist_name)
-            VALUES (?)    
-        ''', (playlist_name,))
-        con.commit()
-        con.close()
+        """Create a new playlist and return its `playlist_id`."""
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+                INSERT INTO playlists (playlist_name)
+                VALUES (?)
+                RETURNING playlist_id
+            ''', (playlist_name,))
+            return cur.fetchone()[0]
 
     def get_max_pos(self, playlist_id):
         """Return the largest position of a track in the playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-
         # Find position of the new track
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT MAX(position) FROM playlist_tracks
             WHERE playlist_id = ?
         ''', (playlist_id,))
@@ -65,16 +71,12 @@ class PlaylistDatabase:
         if max_position is None:
             max_position = 0
 
-        con.close()
         return max_position
 
     def get_min_pos(self, playlist_id):
         """Return the minimum position of a track in the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-
         # Find position of the new track
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT MIN(position) FROM playlist_tracks
             WHERE playlist_id = ?
         ''', (playlist_id,))
@@ -82,45 +84,43 @@ class PlaylistDatabase:
         if min_position is None:
             min_position = 0
 
-        con.close()
         return min_position
 
     def add_to_playlist(self, track_id, playlist_id):
         """Add a track to a playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
+        with self._connection_manager.transaction():
+            max_position = self.get_max_pos(playlist_id)
 
-        max_position = self.get_max_pos(playlist_id)
-
-        cur.execute('''
-            INSERT INTO playlist_tracks (playlist_id, track_id, position)
-            VALUES (?, ?, ?)    
-        ''', (playlist_id, track_id, max_position+1))
-        con.commit()
-        con.close()
+            self._connection_manager.execute('''
+                INSERT INTO playlist_tracks (playlist_id, track_id, position)
+                VALUES (?, ?, ?)
+            ''', (playlist_id, track_id, max_position + self.POSITION_GAP))
 
     def remove_from_playlist(self, track_id, playlist_id):
         """Remove a track from a playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            DELETE FROM playlist_tracks
-            WHERE playlist_id = ? AND track_id = ?
-        ''', (playlist_id, track_id))
-        con.commit()
-        con.close()
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                DELETE FROM playlist_tracks
+                WHERE playlist_id = ? AND track_id = ?
+            ''', (playlist_id, track_id))
+
+    def remove_at(self, playlist_id, index):
+        """Remove the track at an index in the playlist, counting from 0."""
+        with self._connection_manager.transaction():
+            rows = self._get_positions_from(playlist_id, index, 1)
+            if rows:
+                self._connection_manager.execute('''
+                    DELETE FROM playlist_tracks WHERE identifier = ?
+                ''', (rows[0][0],))
 
     def get_playlist_tracks(self, playlist_id):
         """Return the list of tracks in a playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT track_id FROM playlist_tracks
             WHERE playlist_id = ?
-            ORDER BY position
+            ORDER BY position, identifier
         ''', (playlist_id,))
         track_rows = cur.fetchall()
-        con.close()
 
         tracks = []
         for row in track_rows:
@@ -128,16 +128,55 @@ class PlaylistDatabase:
 
         return tracks
 
+    def get_playlist_page(self, playlist_id, after=None, limit=200):
+        """
+        Return one page of the tracks in a playlist.
+
+        Parameters
+        ----------
+        playlist_id : int
+            The playlist to read.
+        after : tuple, optional
+            The cursor returned with the previous page. `None` returns
+            the first page.
+        limit : int, optional
+            The maximum number of tracks in the page.
+
+        Returns
+        -------
+        tuple
+            The list of `track_id`s and the cursor for the next page,
+            which is `None` if the page is empty.
+        """
+        if after is None:
+            cur = self._connection_manager.execute('''
+                SELECT track_id, position, identifier FROM playlist_tracks
+                WHERE playlist_id = ?
+                ORDER BY position, identifier
+                LIMIT ?
+            ''', (playlist_id, limit))
+        else:
+            position, identifier = after
+            cur = self._connection_manager.execute('''
+                SELECT track_id, position, identifier FROM playlist_tracks
+                WHERE playlist_id = ? AND position >= ?
+                AND (position, identifier) > (?, ?)
+                ORDER BY position, identifier
+                LIMIT ?
+            ''', (playlist_id, position, position, identifier, limit))
+        rows = cur.fetchall()
+
+        track_ids = [row[0] for row in rows]
+        cursor = (rows[-1][1], rows[-1][2]) if rows else None
+        return track_ids, cursor
+
     def get_playlists(self):
         """Return a list of all playlists in the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT playlist_id, playlist_name
-            FROM playlists       
+            FROM playlists
         ''')
         playlist_rows = cur.fetchall()
-        con.close()
 
         playlists = {}
         for row in playlist_rows:
@@ -149,87 +188,219 @@ class PlaylistDatabase:
 
     def get_playlist_name(self, playlist_id):
         """Return the name of a playlist from its ID."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT playlist_name
-                    FROM playlists
-                    WHERE playlist_id = ?''',
-                    (playlist_id,))
+        cur = self._connection_manager.execute(
+            '''SELECT playlist_name
+            FROM playlists
+            WHERE playlist_id = ?''',
+            (playlist_id,)
+        )
         playlist = cur.fetchone()
-        con.close()
         playlist_name = playlist[0]
         return playlist_name
 
-    def remove_from_all(self, track_id):
-        """Remove a track from all playlists."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            SELECT playlist_id
-            FROM playlist_tracks
-            WHERE track_id = ?
-            ''', (track_id,))
-        rows = cur.fetchall()
-        for row in rows:
-            playlist_id = row[0]
-            self.remove_from_playlist(track_id, playlist_id)
-
     def delete_playlist(self, playlist_id):
-        """Delete a playlist from the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-
-        # Delete playlist
-        cur.execute('''
-            DELETE FROM playlists
-            WHERE playlist_id = ?
-        ''', (playlist_id,))
+        """
+        Delete a playlist from the database.
 
-        # Delete playlist-track pairs for that playlist
-        cur.execute('''
-            DELETE FROM playlist_tracks
-            WHERE playlist_id = ?
-        ''', (playlist_id,))
-
-        con.commit()
-        con.close()
+        Its entries in `playlist_tracks` are deleted by the cascade.
+        """
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                DELETE FROM playlists
+                WHERE playlist_id = ?
+            ''', (playlist_id,))
 
     def swap_positions(self, playlist_id, pos_1, pos_2):
         """Swap the positions of two tracks in a playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        # Move track in pos_1 to a temporary position
-        cur.execute('''
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                UPDATE playlist_tracks
+                SET position = CASE position WHEN ? THEN ? ELSE ? END
+                WHERE playlist_id = ? AND position IN (?, ?)
+                ''', (pos_1, pos_2, pos_1, playlist_id, pos_1, pos_2))
+
+    def _get_positions_from(self, playlist_id, index, count):
+        """
+        Return the positions of `count` tracks starting at `index`.
+
+        The rows before `index` are stepped over in the position index,
+        so the cost grows with `index`. Edits only touch the rows they
+        change, but locating them reads up to `index` index entries.
+        """
+        cur = self._connection_manager.execute('''
+            SELECT identifier, position FROM playlist_tracks
+            WHERE playlist_id = ?
+            ORDER BY position, identifier
+            LIMIT ? OFFSET ?
+            ''', (playlist_id, count, index))
+        return cur.fetchall()
+
+    def _get_neighbour_positions(self, playlist_id, index):
+        """
+        Return the positions either side of a slot in the playlist.
+
+        The slot is the gap before the track currently at `index`.
+        `None` is returned for a side with no track.
+        """
+        if index == 0:
+            rows = self._get_positions_from(playlist_id, 0, 1)
+            lower = None
+            upper = rows[0][1] if rows else None
+        else:
+            rows = self._get_positions_from(playlist_id, index - 1, 2)
+            if not rows:
+                # The slot is past the end of the playlist.
+                return self.get_max_pos(playlist_id), None
+            lower = rows[0][1]
+            upper = rows[1][1] if len(rows) > 1 else None
+        return lower, upper
+
+    def _get_free_positions(self, lower, upper, count):
+        """
+        Return `count` evenly spaced positions between two positions.
+
+        Returns `None` if the gap is too small to fit them.
+        """
+        if lower is None and upper is None:
+            lower = 0
+        if upper is None:
+            return [lower + self.POSITION_GAP * (i + 1) for i in range(count)]
+        if lower is None:
+            lower = upper - self.POSITION_GAP * (count + 1)
+
+        step = (upper - lower) // (count + 1)
+        if step < 1:
+            return None
+        return [lower + step * (i + 1) for i in range(count)]
+
+    def _renumber(self, playlist_id, gap_index=0, gap_count=0):
+        """
+        Respace the playlist's positions `POSITION_GAP` apart.
+
+        Room for `gap_count` extra tracks is left before the track at
+        `gap_index`.
+        """
+        # The same track may appear more than once in a playlist, so the
+        # rows are first moved below every existing position to keep
+        # the unique constraint satisfied part way through the update.
+        self._connection_manager.execute('''
             UPDATE playlist_tracks
-            SET position = -1
-            WHERE playlist_id = ? AND position = ?
-            ''', (playlist_id, pos_1))
-
-        # Move track in pos_2 to pos_1
-        cur.execute('''
-                    UPDATE playlist_tracks
-                    SET position = ?
-                    WHERE playlist_id = ? AND position = ?
-                    ''', (pos_1, playlist_id, pos_2))
-
-        # move first track into pos_2
-        cur.execute('''
-                    UPDATE playlist_tracks
-                    SET position = ?
-                    WHERE playlist_id = ? AND position = -1
-                    ''', (pos_2, playlist_id))
-
-        con.commit()
-        con.close()
+            SET position = ranked.offset - ranked.row_number
+            FROM (
+                SELECT identifier,
+                    MIN(MIN(position) OVER (), 0) AS offset,
+                    ROW_NUMBER() OVER (
+                        ORDER BY position, identifier
+                    ) AS row_number
+                FROM playlist_tracks
+                WHERE playlist_id = ?
+            ) AS ranked
+            WHERE playlist_tracks.identifier = ranked.identifier
+            ''', (playlist_id,))
+        # The first update reversed the order, so rank by descending
+        # position to restore it.
+        self._connection_manager.execute('''
+            UPDATE playlist_tracks
+            SET position = ranked.row_number * :gap
+                + CASE WHEN ranked.row_number > :gap_index
+                    THEN :gap_count * :gap ELSE 0 END
+            FROM (
+                SELECT identifier,
+                    ROW_NUMBER() OVER (
+                        ORDER BY position DESC, identifier DESC
+                    ) AS row_number
+                FROM playlist_tracks
+                WHERE playlist_id = :playlist_id
+            ) AS ranked
+            WHERE playlist_tracks.identifier = ranked.identifier
+            ''', {"gap": self.POSITION_GAP, "gap_index": gap_index,
+                  "gap_count": gap_count, "playlist_id": playlist_id})
+
+    def move_track(self, playlist_id, from_index, to_index):
+        """
+        Move the track at one index in the playlist to another index.
+
+        Only the moved track's row is updated, unless the gap at the
+        destination is used up and the playlist has to be renumbered.
+
+        Parameters
+        ----------
+        playlist_id : int
+            The unique identifier of the playlist.
+        from_index : int
+            The current index of the track, counting from 0.
+        to_index : int
+            The index the track should have after the move.
+        """
+        if from_index == to_index:
+            return
+
+        with self._connection_manager.transaction():
+            rows = self._get_positions_from(playlist_id, from_index, 1)
+            if not rows:
+                return
+            identifier = rows[0][0]
+
+            # The track is placed before the track currently at `slot`.
+            # Moving down skips past the moved track's own row.
+            slot = to_index + 1 if to_index > from_index else to_index
+            lower, upper = self._get_neighbour_positions(playlist_id, slot)
+            positions = self._get_free_positions(lower, upper, 1)
+            if positions is None:
+                self._renumber(playlist_id)
+                lower, upper = self._get_neighbour_positions(playlist_id, slot)
+                positions = self._get_free_positions(lower, upper, 1)
+
+            self._connection_manager.execute('''
+                UPDATE playlist_tracks
+                SET position = ?
+                WHERE identifier = ?
+                ''', (positions[0], identifier))
+
+    def insert_at(self, playlist_id, track_ids, index):
+        """
+        Insert tracks into a playlist before the track at `index`.
+
+        The new tracks are given positions in the gap before `index`,
+        so no existing rows are touched unless the gap is too small.
+
+        Parameters
+        ----------
+        playlist_id : int
+            The unique identifier of the playlist.
+        track_ids : list of int
+            The tracks to insert, in order.
+        index : int
+            The index the first inserted track will have. An index past
+            the end of the playlist appends the tracks.
+        """
+        track_ids = list(track_ids)
+        if not track_ids:
+            return
+
+        with self._connection_manager.transaction():
+            lower, upper = self._get_neighbour_positions(playlist_id, index)
+            positions = self._get_free_positions(lower, upper,
+                                                 len(track_ids))
+            if positions is None:
+                self._renumber(playlist_id, index, len(track_ids))
+                lower, upper = self._get_neighbour_positions(playlist_id,
+                                                             index)
+                positions = self._get_free_positions(lower, upper,
+                                                     len(track_ids))
+
+            self._connection_manager.executemany('''
+                INSERT INTO playlist_tracks (playlist_id, track_id, position)
+                VALUES (?, ?, ?)
+                ''', ((playlist_id, track_id, position)
+                      for track_id, position in zip(track_ids, positions)))
 
     def get_track_pos(self, playlist_id, track_id):
         """Return the position of a track in a playlist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''SELECT position
-                    FROM playlist_tracks
-                    WHERE playlist_id = ? AND track_id = ?  
-                    ''', (playlist_id, track_id))
+        cur = self._connection_manager.execute('''
+            SELECT position
+            FROM playlist_tracks
+            WHERE playlist_id = ? AND track_id = ?
+            ''', (playlist_id, track_id))
         position = cur.fetchone()[0]
-        con.close()
         return position
@@ -0,0 +1,229 @@
+import threading
+from collections import deque
+
+
+class QueryProfiler:
+    """
+    Class which records the cost of every query made to the database.
+
+    Queries are named after the label of the database method that
+    executed them.
+    For each named query the profiler keeps its call count, the time
+    spent in it, the latency of its recent calls and the number of
+    rows it returned. The time spent opening connections is recorded
+    separately. A query slower than the threshold is logged with its
+    parameters and its `EXPLAIN QUERY PLAN`.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database
+    operations.
+
+    Methods
+    -------
+    record_query(name, sql, seconds, rows):
+        Record one execution of a query.
+    record_rows(name, sql, rows):
+        Add the rows fetched from a query to its total.
+    record_slow_query(name, sql, parameters, seconds, plan):
+        Add a query to the slow query log.
+    record_connection(seconds):
+        Record the time taken to open a connection.
+    is_slow(seconds):
+        Check if a query took long enough to be logged.
+    get_report():
+        Return the recorded statistics.
+    format_report():
+        Return the recorded statistics as a printable table.
+    reset():
+        Forget everything recorded so far.
+    """
+
+    def __init__(self, slow_query_threshold=0.01, max_samples=10000,
+                 max_slow_queries=100):
+        """
+        Initialise a `QueryProfiler` instance.
+
+        Parameters
+        ----------
+        slow_query_threshold : float, optional
+            The time in seconds above which a query is logged with its
+            query plan.
+        max_samples : int, optional
+            The number of most recent latencies kept per query for the
+            percentiles.
+        max_slow_queries : int, optional
+            The number of most recent slow queries kept in the log.
+        """
+        self._slow_query_threshold = slow_query_threshold
+        self._max_samples = max_samples
+        self._max_slow_queries = max_slow_queries
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._queries = {}
+            self._slow_queries = deque(maxlen=self._max_slow_queries)
+            self._connections_opened = 0
+            self._connection_time = 0.0
+
+    def is_slow(self, seconds):
+        """Check if a query took long enough to be logged."""
+        return seconds >= self._slow_query_threshold
+
+    def record_query(self, name, sql, seconds, rows):
+        """
+        Record one execution of a query.
+
+        Parameters
+        ----------
+        name : str
+            The qualified name of the method that executed the query.
+        sql : str
+            The statement executed.
+        seconds : float
+            The time taken to execute the statement up to its first row.
+        rows : int
+            The number of rows changed by a write. The rows returned by
+            a query are added as they are fetched with `record_rows()`.
+        """
+        key = (name, sql)
+        with self._lock:
+            query = self._queries.get(key)
+            if query is None:
+                query = self._queries[key] = {
+                    "calls": 0,
+                    "total_time": 0.0,
+                    "rows": 0,
+                    "samples": deque(maxlen=self._max_samples)
+                }
+            query["calls"] += 1
+            query["total_time"] += seconds
+            query["rows"] += max(rows, 0)
+            query["samples"].append(seconds)
+
+    def record_rows(self, name, sql, rows):
+        """Add the rows fetched from a recorded query to its total."""
+        with self._lock:
+            query = self._queries.get((name, sql))
+            if query is not None:
+                query["rows"] += rows
+
+    def record_slow_query(self, name, sql, parameters, seconds, plan):
+        """
+        Add a query to the slow query log.
+
+        Parameters
+        ----------
+        name : str
+            The qualified name of the method that executed the query.
+        sql : str
+            The statement executed.
+        parameters : tuple
+            The parameters it was executed with.
+        seconds : float
+            The time it took.
+        plan : list of str
+            The detail strings of its query plan.
+        """
+        with self._lock:
+            self._slow_queries.append({
+                "name": name,
+                "sql": sql,
+                "parameters": parameters,
+                "time": seconds,
+                "plan": plan
+            })
+
+    def record_connection(self, seconds):
+        """Record the time taken to open a connection."""
+        with self._lock:
+            self._connections_opened += 1
+            self._connection_time += seconds
+
+    def get_report(self):
+        """
+        Return the recorded statistics.
+
+        Returns
+        -------
+        dict
+            Dictionary with a `queries` list, slowest total time first,
+            holding each query's `name`, `sql`, `calls`, `total_time`,
+            `p50`, `p99` and `rows`. Also holds the `slow_queries` log
+            and the `connections_opened` and `connection_time`. Times
+            are in seconds.
+        """
+        with self._lock:
+            queries = [
+                {
+                    "name": name,
+                    "sql": sql,
+                    "calls": query["calls"],
+                    "total_time": query["total_time"],
+                    "p50": _percentile(query["samples"], 50),
+                    "p99": _percentile(query["samples"], 99),
+                    "rows": query["rows"]
+                }
+                for (name, sql), query in self._queries.items()
+            ]
+            report = {
+                "queries": sorted(queries, key=lambda query: query["total_time"],
+                                  reverse=True),
+                "slow_queries": list(self._slow_queries),
+                "connections_opened": self._connections_opened,
+                "connection_time": self._connection_time
+            }
+        return report
+
+    def format_report(self):
+        """Return the recorded statistics as a printable table."""
+        report = self.get_report()
+        lines = [
+            f"{'query':<44} {'calls':>7} {'total ms':>10} {'p50 ms':>8} "
+            f"{'p99 ms':>8} {'rows':>9}"
+        ]
+        for query in report["queries"]:
+            lines.append(
+                f"{query['name'][:44]:<44} {query['calls']:>7} "
+                f"{query['total_time'] * 1000:>10.1f} "
+                f"{query['p50'] * 1000:>8.3f} {query['p99'] * 1000:>8.3f} "
+                f"{query['rows']:>9}"
+            )
+            lines.append(f"    {_one_line(query['sql'])[:100]}")
+
+        lines.append(
+            f"\n{report['connections_opened']} connections opened in "
+            f"{report['connection_time'] * 1000:.1f} ms"
+        )
+
+        if report["slow_queries"]:
+            lines.append(
+                f"\nSlow queries (over "
+                f"{self._slow_query_threshold * 1000:g} ms):"
+            )
+        for slow_query in report["slow_queries"]:
+            lines.append(
+                f"{slow_query['time'] * 1000:.1f} ms {slow_query['name']} "
+                f"{slow_query['parameters']!r:.100}"
+            )
+            lines.append(f"    {_one_line(slow_query['sql'])}")
+            for detail in slow_query["plan"]:
+                lines.append(f"      {detail}")
+
+        return "\n".join(lines)
+
+
+def _percentile(samples, percent):
+    """Return the nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(rank)]
+
+
+def _one_line(sql):
+    """Collapse the whitespace in a statement onto one line."""
+    return " ".join(sql.split())
@@ -1,16 +1,59 @@
+import hashlib
+import threading
 from pathlib import Path
 from musicdatabase import MusicDatabase
+from trackdatabase import directory_range
 from mutagen.easyid3 import EasyID3
 from mutagen.mp3 import MP3
 
+# The number of bytes hashed from each end of a file.
+HASH_BLOCK_SIZE = 8192
+
+
+def content_hash(file_path, file_size):
+    """
+    Return a hash of the start and end of a file.
+
+    Reading only the ends keeps fingerprinting cheap for large files.
+    Together with the file's size it tells files apart, as the tags are
+    at the ends and the audio of two files is rarely the same size.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(HASH_BLOCK_SIZE))
+        if file_size > HASH_BLOCK_SIZE:
+            f.seek(max(HASH_BLOCK_SIZE, file_size - HASH_BLOCK_SIZE))
+            digest.update(f.read(HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
 
 class DirectoryScan:
     """
     Class to scan directories for music files to add to the database.
 
+    Each directory is a root of the library and is scanned, rebuilt or
+    removed on its own, reading only its tracks from the database. A
+    directory that can't be found, such as one on a disconnected drive,
+    is skipped by scans and its tracks are kept.
+
+    Files are fingerprinted by their size, modification time and a hash
+    of their ends. A new file with the fingerprint of a track whose
+    file is gone is taken to be that file moved or renamed, so the
+    track is kept, with its playlist entries, and the tags aren't read.
+    Only tracks in directories which can be found are taken, as the
+    file of a track on a disconnected drive isn't gone.
+
+    Scans may be started from any thread. They hold the state of the
+    scan in progress, so they run one at a time.
+
     Attributes
     ----------
     directories_updated_observers : list
+        List of observers with the `received_directories_updated_signal()`
+        method.
+    tracks_removed_observers : list
+        List of observers with the `received_tracks_removed_signal()`
+        method.
 
     Methods
     -------
@@ -19,11 +62,14 @@ class DirectoryScan:
     add_directory(directory_path):
         Add a directory to the file of directories.
     remove_directory(directory_path):
-        Remove a directory from the directories file.
-    scan_directory():
+        Remove a directory and its tracks from the library.
+    rebuild_directory(directory_path):
+        Remove a directory's tracks and scan it again.
+    scan_directory(directories=None):
         Scan directories for music files.
     """
-    def __init__(self, music_database: MusicDatabase, directories_file):
+    def __init__(self, music_database: MusicDatabase, directories_file,
+                 batch_size=500):
         """
         Initialise a `DirectoryScan` instance.
 
@@ -33,11 +79,24 @@ class DirectoryScan:
             Instance of `MusicDatabase`
         directories_file : str
             Path to a text file containing the directories to scan.
+        batch_size : int, optional
+            The number of new tracks added to the database at once.
         """
         self._music_database = music_database
         self._directories_file = directories_file
+        self._batch_size = batch_size
+        self._known_paths = {}
         self._unverified_paths = set()
+        self._moved_paths = set()
+        # The path ranges of the directories found by the scan.
+        self._present_ranges = []
+        self._pending_tracks = []
+        self._pending_fingerprints = []
+        # Writes queued by the scan in progress, checked as it ends.
+        self._pending_writes = []
+        self._scan_lock = threading.RLock()
         self.directories_updated_observers = []
+        self.tracks_removed_observers = []
 
     def _update_directories(self, directories):
         """Rewrite the directories to the directories file."""
@@ -48,59 +107,135 @@ class DirectoryScan:
     def mp3_found(self, file_path):
         """Process a discovered mp3 file."""
         file_path_str = str(file_path)
+        stat = file_path.stat()
+        file_size, file_mtime = stat.st_size, stat.st_mtime_ns
+
         # Need to check whether file path is already in the database
-        if self._music_database.track_exists(file_path_str):
+        if file_path_str in self._known_paths:
             # File found in database - filepath is verified
-            self._unverified_paths.remove(file_path_str)
+            self._unverified_paths.discard(file_path_str)
+            # The hash is read again only if the file has changed, or
+            # was added before files were fingerprinted.
+            known_size, known_mtime, known_hash = \
+                self._known_paths[file_path_str]
+            if (known_hash is None or known_size != file_size
+                    or known_mtime != file_mtime):
+                self._pending_fingerprints.append((
+                    file_path_str, file_size, file_mtime,
+                    content_hash(file_path, file_size)
+                ))
         else:
-            # Obtain track metadata using mutagen
-            audio = MP3(file_path, ID3=EasyID3)
-            track_name = str(audio.get('title', ['Unknown Title'])[0])
-            artist = str(audio.get('artist', ['Unknown Artist'])[0])
-            album = str(audio.get('album', ['Unknown Album'])[0])
-            track_number_str = str(audio.get('tracknumber', [-1])[0])
-            track_number = int(track_number_str.split('/')[0])
-            release_date = str(audio.get('date', ['Unknown Date'])[0])
-            duration = audio.info.length
-            genre = str(audio.get('genre', ['Unknown Genre']))
-            album_artist = str(
-                audio.get('albumartist', ['Unknown Album Artist'])[0]
-            )
-
-            self._check_to_add_artist(artist)
-            self._check_to_add_album(album, artist, release_date)
-            self._check_to_add_track(track_name, artist, album,
-                                     track_number, release_date,
-                                     genre, duration, file_path_str)
-
-    def _check_to_add_artist(self, artist_name):
-        """Check if a new artist should be added to the database."""
-        if self._music_database.artist_exists(artist_name):
-            return
-
-        self._music_database.insert_artist(artist_name)
-        return
+            fingerprint = (file_size, file_mtime,
+                           content_hash(file_path, file_size))
+            self._pending_tracks.append((file_path, fingerprint))
+            self._known_paths[file_path_str] = fingerprint
+            if len(self._pending_tracks) >= self._batch_size:
+                self._add_pending_tracks()
+
+    def _read_tags(self, file_path, fingerprint):
+        """Return the tag record of a new mp3 file using mutagen."""
+        audio = MP3(file_path, ID3=EasyID3)
+        track_name = str(audio.get('title', ['Unknown Title'])[0])
+        artist = str(audio.get('artist', ['Unknown Artist'])[0])
+        album = str(audio.get('album', ['Unknown Album'])[0])
+        track_number_str = str(audio.get('tracknumber', [-1])[0])
+        track_number = int(track_number_str.split('/')[0])
+        release_date = str(audio.get('date', ['Unknown Date'])[0])
+        duration = audio.info.length
+        # A track can have several genres, one per value of the tag.
+        genre = [str(name) for name in audio.get('genre', ['Unknown Genre'])]
+        # Albums are filed under their album artist, so a compilation
+        # is one album. Tracks without the tag use their own artist.
+        album_artist = str(audio.get('albumartist', [artist])[0])
+        file_size, file_mtime, file_hash = fingerprint
+
+        return {
+            "track_name": track_name,
+            "artist": artist,
+            "album": album,
+            "album_artist": album_artist,
+            "track_number": track_number,
+            "release_date": release_date,
+            "genre": genre,
+            "duration": duration,
+            "file_path": str(file_path),
+            "file_size": file_size,
+            "file_mtime": file_mtime,
+            "content_hash": file_hash
+        }
+
+    def _add_pending_tracks(self):
+        """
+        Add the files found since the last batch to the database.
 
-    def _check_to_add_album(self, album_name, artist, release_date):
-        """Check if a new album should be added to the database."""
-        if self._music_database.album_exists(album_name, artist):
+        A file with the size and content hash of a track whose file is
+        gone has been moved, so the track is pointed at it instead, and
+        its tags aren't read. A track outside the directories found
+        may be on a disconnected drive, so is never taken.
+        """
+        if self._pending_fingerprints:
+            self._pending_writes.append(
+                self._music_database.update_fingerprints(
+                    self._pending_fingerprints
+                )
+            )
+            self._pending_fingerprints = []
+        if not self._pending_tracks:
             return
 
-        self._music_database.insert_album(album_name, artist, release_date)
-        return
-
-    def _check_to_add_track(self, track_name, artist, album,
-                            track_number, release_date, genre,
-                            duration, file_path_str):
-        """Check if a new track should be added to the database."""
-        # Check whether it's a duplicate
-        if (self._music_database.track_is_duplicate(track_name, artist,
-                                                    album, release_date)
-                and track_name != "Unknown Title"):
-            return
-        self._music_database.insert_track(track_name, artist, album,
-                                          track_number, release_date,
-                                          genre, duration, file_path_str)
+        candidates = self._music_database.get_tracks_by_fingerprint(
+            (file_size, file_hash)
+            for _, (file_size, _, file_hash) in self._pending_tracks
+        )
+        moves = []
+        new_tracks = []
+        for file_path, fingerprint in self._pending_tracks:
+            file_size, file_mtime, file_hash = fingerprint
+            for track_id, old_path in candidates.get((file_size, file_hash),
+                                                     []):
+                # A copy leaves the original in place, and each
+                # original is only moved once.
+                if (old_path not in self._moved_paths
+                        and self._is_present(old_path)
+                        and not Path(old_path).exists()):
+                    self._moved_paths.add(old_path)
+                    self._unverified_paths.discard(old_path)
+                    moves.append((track_id, str(file_path), file_size,
+                                  file_mtime))
+                    break
+            else:
+                new_tracks.append(self._read_tags(file_path, fingerprint))
+        self._pending_tracks = []
+
+        if moves:
+            self._pending_writes.append(
+                self._music_database.relocate_tracks(moves)
+            )
+        self._pending_writes.append(
+            self._music_database.ingest_tracks(new_tracks)
+        )
+
+    def _is_present(self, file_path):
+        """Return True if the path is inside a directory that was found."""
+        return any(low <= file_path < high
+                   for low, high in self._present_ranges)
+
+    def _finish_pending_writes(self):
+        """Wait for the scan's writes, raising the first that failed."""
+        writes, self._pending_writes = self._pending_writes, []
+        for future in writes:
+            future.result()
+
+    def _remove_tracks(self, file_paths):
+        """Remove the tracks at the file paths from the database."""
+        track_ids = self._music_database.remove_by_paths(file_paths).result()
+        if track_ids:
+            self._send_tracks_removed_signal(track_ids)
+
+    def _send_tracks_removed_signal(self, track_ids):
+        """Call `received_tracks_removed_signal(track_ids)` on observers."""
+        for observer in self.tracks_removed_observers:
+            observer.received_tracks_removed_signal(track_ids)
 
     def get_directories(self):
         """Return a list of the directories in the directories text file."""
@@ -113,64 +248,142 @@ class DirectoryScan:
             with open(self._directories_file, 'w') as f:
                 return []
 
-        directories_updated = False
-        for directory in directories:
-            path = Path(directory)
-            if not path.exists() and not path.is_dir():
-                print("exists: ", path.exists(), "is_dir: ", path.is_dir())
-                print(directory, " is an invalid directory")
-                directories.remove(directory)
-                directories_updated = True
-
-        if directories_updated:
-            self._update_directories(directories)
-
         return directories
 
     def add_directory(self, directory_path):
         """Add a directory to the file of directories."""
-        directories = self.get_directories()
+        with self._scan_lock:
+            directories = self.get_directories()
 
-        # Prevent duplicates
-        if directory_path in directories:
-            return
+            # Prevent duplicates
+            if directory_path in directories:
+                return
 
-        with open(self._directories_file, 'a') as f:
-            f.write(directory_path + '\n')
+            with open(self._directories_file, 'a') as f:
+                f.write(directory_path + '\n')
 
-        self.scan_directory()
+            self.scan_directory([directory_path])
 
         for observer in self.directories_updated_observers:
             observer.received_directories_updated_signal()
 
     def remove_directory(self, directory_path):
-        """Remove a directory from the directories file."""
-        directories = self.get_directories()
-        directories.remove(directory_path)
-        self._update_directories(directories)
+        """
+        Remove a directory and its tracks from the library.
+
+        Tracks which are also inside another directory are kept.
+        """
+        with self._scan_lock:
+            directories = self.get_directories()
+            directories.remove(directory_path)
+            self._update_directories(directories)
+
+            with self._music_database.batch():
+                self._remove_directory_tracks(directory_path, directories)
+                self._music_database.remove_orphans().result()
+            self._music_database.refresh_library_snapshot()
+
+    def rebuild_directory(self, directory_path):
+        """
+        Remove a directory's tracks and scan it again.
+
+        Every file in the directory has its tags read again. The tracks
+        get new identifiers, so they are removed from playlists. The
+        tracks are removed and added back in one transaction, so if the
+        scan fails the directory is left as it was.
 
-    def scan_directory(self):
+        Returns
+        -------
+        bool
+            True if the library differs from the last snapshot.
+        """
+        with self._scan_lock:
+            with self._music_database.batch():
+                self._remove_directory_tracks(directory_path, [])
+                self._scan([directory_path])
+            return self._music_database.refresh_library_snapshot()
+
+    def _remove_directory_tracks(self, directory_path, other_directories):
+        """Remove the tracks in a directory which aren't in the others."""
+        other_ranges = [directory_range(str(Path(directory)))
+                        for directory in other_directories]
+        file_paths = [
+            file_path for file_path
+            in self._music_database.get_paths_under(str(Path(directory_path)))
+            if not any(low <= file_path < high for low, high in other_ranges)
+        ]
+        if file_paths:
+            self._remove_tracks(file_paths)
+
+    def scan_directory(self, directories=None):
         """
         Scan directories for music files.
 
-        Currently scans for mp3 files only.
+        Currently scans for mp3 files only. Only the tracks inside the
+        scanned directories are checked against the files found, and
+        directories which can't be found are skipped. The library
+        snapshot is rewritten afterwards if the library has changed.
+
+        Parameters
+        ----------
+        directories : list of str, optional
+            The directories to scan. `None` scans every directory in
+            the directories file.
+
+        Returns
+        -------
+        bool
+            True if the library differs from the last snapshot.
         """
+        with self._scan_lock:
+            if directories is None:
+                directories = self.get_directories()
+            self._scan(directories)
+            return self._music_database.refresh_library_snapshot()
+
+    def _scan(self, directories):
+        """Scan directories, leaving the library snapshot alone."""
+        roots = []
+        for directory in directories:
+            if Path(directory).is_dir():
+                roots.append(Path(directory))
+            else:
+                print(directory, "can't be found, so it was not scanned")
+        # Moved files are matched to tracks in every directory found,
+        # not only those scanned.
+        self._present_ranges = [
+            directory_range(str(Path(directory)))
+            for directory in set(self.get_directories()) | set(directories)
+            if Path(directory).is_dir()
+        ]
+
         # While scanning, use the results to verify tracks in the database
-        self._unverified_paths = set(self._music_database.get_all_paths())
+        self._known_paths = {}
+        for root in roots:
+            self._known_paths.update(
+                self._music_database.get_fingerprints_under(str(root))
+            )
+        self._unverified_paths = set(self._known_paths)
+        self._moved_paths = set()
+        self._pending_writes = []
 
-        for directory in self.get_directories():
-            mp3_files = Path(directory).glob("**/*.mp3")
+        for root in roots:
+            mp3_files = root.glob("**/*.mp3")
 
             for file_path in mp3_files:
                 self.mp3_found(file_path)
 
+        self._add_pending_tracks()
+        # The tracks found are written while the scan goes on, so a
+        # failed write is only raised here.
+        self._finish_pending_writes()
+
         # if any database tracks are unverified after the scan
         if self._unverified_paths:
-            self._music_database.remove_by_paths(self._unverified_paths)
+            self._remove_tracks(self._unverified_paths)
 
-        # Verify the albums and artists in the database
-        self._music_database.verify_albums()
-        self._music_database.verify_artists()
+        # Remove albums and artists left without any tracks
+        self._music_database.remove_orphans().result()
 
     def verify_paths(self, path_list):
         """
@@ -185,7 +398,7 @@ class DirectoryScan:
             if not path.exists() or not path.is_file():
                 invalid_paths.append(path_str)
 
-        self._music_database.remove_by_paths(invalid_paths)
+        self._remove_tracks(invalid_paths)
 
     def verify_all_paths(self):
         """
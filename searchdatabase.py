@@ -0,0 +1,118 @@
+import re
+
+from connectionmanager import ConnectionManager
+
+# Queries matching more tracks than this are not ranked with BM25, as
+# its cost grows with the number of matches rather than the limit.
+RANKED_MATCH_LIMIT = 1000
+
+# Column groups tried in turn for queries with too many matches to rank.
+# The last tier matches the words in any mix of columns.
+COLUMN_TIERS = ("{track_name}", "{artist_name album_name}", "{genre}",
+                None)
+
+
+class SearchDatabase:
+    """
+    Class for full-text searches of the music library.
+
+    Searches run against the `track_search` FTS5 table, which is kept
+    in sync with the `tracks`, `artists` and `albums` tables by
+    triggers.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database operations.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager):
+        """
+        Initialise a `SearchDatabase` instance.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        """
+        self._connection_manager = connection_manager
+
+    def search(self, query, limit=50):
+        """
+        Return the tracks which best match a search query.
+
+        Every word in the query must match the start of a word in the
+        track's title, artist, album or genre. Results are ranked with
+        BM25, weighting matches in the title above the other columns.
+        Queries matching too many tracks to rank quickly return the
+        newest matches instead, grouped by the column they match in.
+
+        Parameters
+        ----------
+        query : str
+            The text to search for.
+        limit : int, optional
+            The maximum number of tracks returned.
+
+        Returns
+        -------
+        list of int
+            The `track_id`s of the matching tracks, best match first.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+
+        # Quoting each word stops it being read as FTS5 syntax, and the
+        # trailing `*` makes it a prefix match.
+        match_expression = " ".join(f'"{word}"*' for word in words)
+
+        if self._count_exceeds(match_expression, RANKED_MATCH_LIMIT):
+            return self._search_by_column(match_expression, limit)
+
+        cur = self._connection_manager.execute('''
+            SELECT rowid FROM track_search
+            WHERE track_search MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (match_expression, limit))
+        return [row[0] for row in cur]
+
+    def _count_exceeds(self, match_expression, count):
+        """Return whether more than `count` tracks match the expression."""
+        # Matches are read in rowid order, so this stops after `count`
+        # rows instead of visiting every match.
+        cur = self._connection_manager.execute('''
+            SELECT rowid FROM track_search
+            WHERE track_search MATCH ?
+            ORDER BY rowid DESC
+            LIMIT 1 OFFSET ?
+        ''', (match_expression, count))
+        return cur.fetchone() is not None
+
+    def _search_by_column(self, match_expression, limit):
+        """
+        Return the newest matching tracks, title matches first.
+
+        Used in place of BM25 for broad queries. Tracks matching in the
+        title come first, then the artist or album, then the genre,
+        mirroring the column weights of the ranked search. Tracks whose
+        words are spread over several columns come last.
+        """
+        track_ids = []
+        for columns in COLUMN_TIERS:
+            if columns is not None:
+                expression = f"{columns} : ({match_expression})"
+            else:
+                expression = match_expression
+            cur = self._connection_manager.execute('''
+                SELECT rowid FROM track_search
+                WHERE track_search MATCH ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            ''', (expression, limit))
+            for (track_id,) in cur:
+                if track_id not in track_ids:
+                    track_ids.append(track_id)
+            if len(track_ids) >= limit:
+                break
+
+        return track_ids[:limit]
@@ -21,6 +21,15 @@ class SideBarFrame(tk.Frame):
     open_artist_list_observers : list
         List of observers with the `received_open_artist_list_signal()`
         method.
+    open_genre_list_observers : list
+        List of observers with the `received_open_genre_list_signal()`
+        method.
+    open_most_played_observers : list
+        List of observers with the `received_open_most_played_signal()`
+        method.
+    open_recently_played_observers : list
+        List of observers with the
+        `received_open_recently_played_signal()` method.
     open_queue_observers : list
         List of observers with the `received_open_queue_signal()`
         method.
@@ -30,6 +39,8 @@ class SideBarFrame(tk.Frame):
     open_directories_observers : list
         List of observers with the `received_open_directories_signal()`
         method.
+    search_observers : list
+        List of observers with the `received_search_signal()` method.
     """
 
     def __init__(self, parent: Root, track_list: TrackList):
@@ -60,9 +71,13 @@ class SideBarFrame(tk.Frame):
         self.open_song_list_observers = [track_list]
         self.open_album_list_observers = []
         self.open_artist_list_observers = []
+        self.open_genre_list_observers = []
+        self.open_most_played_observers = [track_list]
+        self.open_recently_played_observers = [track_list]
         self.open_queue_observers = []
         self.open_playlist_observers = []
         self.open_directories_observers = []
+        self.search_observers = [track_list]
 
         self._grid_config()
 
@@ -120,6 +135,42 @@ class SideBarFrame(tk.Frame):
             relief="flat",
             anchor="w"
         ).grid(row=3, column=0, padx=10, pady=5)
+        tk.Button(
+            self,
+            text="🏷️ Genres",
+            font=("Ariel", 16),
+            command=self.send_open_genre_list_signal,
+            width=11,
+            fg="white",
+            bg=self._colour_scheme["grey"],
+            highlightthickness=0,
+            relief="flat",
+            anchor="w"
+        ).grid(row=4, column=0, padx=10, pady=5)
+        tk.Button(
+            self,
+            text="🔥 Top Songs",
+            font=("Ariel", 16),
+            command=self.send_open_most_played_signal,
+            width=11,
+            fg="white",
+            bg=self._colour_scheme["grey"],
+            highlightthickness=0,
+            relief="flat",
+            anchor="w"
+        ).grid(row=5, column=0, padx=10, pady=5)
+        tk.Button(
+            self,
+            text="🕘 Recent",
+            font=("Ariel", 16),
+            command=self.send_open_recently_played_signal,
+            width=11,
+            fg="white",
+            bg=self._colour_scheme["grey"],
+            highlightthickness=0,
+            relief="flat",
+            anchor="w"
+        ).grid(row=6, column=0, padx=10, pady=5)
         tk.Button(
             self,
             text="📂 Playlists",
@@ -131,7 +182,7 @@ class SideBarFrame(tk.Frame):
             highlightthickness=0,
             relief="flat",
             anchor="w"
-        ).grid(row=4, column=0, padx=10, pady=5)
+        ).grid(row=7, column=0, padx=10, pady=5)
 
         tk.Button(
             self,
@@ -144,7 +195,22 @@ class SideBarFrame(tk.Frame):
             highlightthickness=0,
             relief="flat",
             anchor="w"
-        ).grid(row=5, column=0, padx=10, pady=5)
+        ).grid(row=8, column=0, padx=10, pady=5)
+
+        self._search_entry = tk.Entry(
+            self,
+            font=("Ariel", 14),
+            width=14,
+            fg="white",
+            bg=self._colour_scheme["dark"],
+            insertbackground="white",
+            relief="flat"
+        )
+        self._search_entry.grid(row=9, column=0, padx=10, pady=5)
+        self._search_entry.bind(
+            "<Return>",
+            lambda event: self.send_search_signal(self._search_entry.get())
+        )
 
     def send_open_playlists_signal(self):
         """Calls the observers' `received_open_playlists_signal()` method."""
@@ -166,6 +232,24 @@ class SideBarFrame(tk.Frame):
         for observer in self.open_artist_list_observers:
             observer.received_open_artist_list_signal()
 
+    def send_open_genre_list_signal(self):
+        """Calls the observers' `received_open_genre_list_signal()` method."""
+        for observer in self.open_genre_list_observers:
+            observer.received_open_genre_list_signal()
+
+    def send_open_most_played_signal(self):
+        """Calls the observers' `received_open_most_played_signal()` method."""
+        for observer in self.open_most_played_observers:
+            observer.received_open_most_played_signal()
+
+    def send_open_recently_played_signal(self):
+        """
+        Calls the observers' `received_open_recently_played_signal()`
+        method.
+        """
+        for observer in self.open_recently_played_observers:
+            observer.received_open_recently_played_signal()
+
     def send_open_queue_signal(self):
         """Calls the observers' `received_open_queue_signal()` method."""
         for observer in self.open_queue_observers:
@@ -175,3 +259,10 @@ class SideBarFrame(tk.Frame):
         """Calls the observers' `received_open_directories_signal()` method."""
         for observer in self.open_directories_observers:
             observer.received_open_directories_signal()
+
+    def send_search_signal(self, query):
+        """Calls the observers' `received_search_signal()` method."""
+        if not query.strip():
+            return
+        for observer in self.search_observers:
+            observer.received_search_signal(query)
@@ -0,0 +1,53 @@
+from connectionmanager import ConnectionManager
+
+
+class StatsDatabase:
+    """
+    Class for reading the track count and duration of collections.
+
+    The totals of the library and of every album, artist, genre and
+    playlist are kept exact in the `collection_stats` table by triggers
+    on the `tracks`, `track_genres` and `playlist_tracks` tables, so
+    reading the totals of a collection never touches its tracks.
+
+    This class is not used directly by other components, as the
+    `MusicDatabase` class provides the interface for database operations.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager):
+        """
+        Initialise a `StatsDatabase` instance.
+
+        Parameters
+        ----------
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
+        """
+        self._connection_manager = connection_manager
+
+    def get_collection_stats(self, collection_type, collection_id=0):
+        """
+        Return the number of tracks and total duration of a collection.
+
+        Parameters
+        ----------
+        collection_type : {"all songs", "album", "artist", "playlist", "genre"}
+            The type of collection.
+        collection_id : int, optional
+            The album, artist, genre or playlist. The library total is
+            stored under "all songs" with id 0.
+
+        Returns
+        -------
+        tuple
+            The track count and the total duration in seconds. A
+            collection with no tracks returns `(0, 0.0)`.
+        """
+        cur = self._connection_manager.execute('''
+            SELECT track_count, total_duration FROM collection_stats
+            WHERE collection_type = ? AND collection_id = ?
+        ''', (collection_type, collection_id))
+        row = cur.fetchone()
+        if row is None:
+            return 0, 0.0
+        return row[0], row[1]
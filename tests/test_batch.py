@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+
+
+class TestBatch(unittest.TestCase):
+    """Calls in a `batch()` block commit or roll back together."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.database = MusicDatabase(self.db_path)
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(1, 6)]
+        ).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _committed_playlists(self):
+        """Return the playlist names committed, read from outside."""
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return [row[0] for row in connection.execute(
+                "SELECT playlist_name FROM playlists ORDER BY playlist_id")]
+        finally:
+            connection.close()
+
+    def test_writes_commit_together(self):
+        with self.database.batch():
+            playlist_id = self.database.create_playlist("Mix").result()
+            for track_id in (1, 2, 3):
+                self.database.add_to_playlist(track_id, playlist_id)
+            # Reads in the batch see its writes before they commit.
+            self.assertEqual(self.database.get_playlist_tracks(playlist_id),
+                             [1, 2, 3])
+            self.assertEqual(self._committed_playlists(), [])
+        self.assertEqual(self._committed_playlists(), ["Mix"])
+        self.assertEqual(self.database.get_playlists(), {playlist_id: "Mix"})
+
+    def test_exception_rolls_back_every_write(self):
+        with self.assertRaises(ValueError):
+            with self.database.batch():
+                self.database.create_playlist("Mix")
+                self.database.remove_by_paths(["/music/library/1.mp3"])
+                raise ValueError
+        self.assertEqual(self._committed_playlists(), [])
+        self.assertEqual(self.database.get_playlists(), {})
+        self.assertEqual(self.database.get_path(1), "/music/library/1.mp3")
+
+    def test_nested_batch_rolls_back_alone(self):
+        with self.database.batch():
+            self.database.create_playlist("Kept")
+            with self.assertRaises(ValueError):
+                with self.database.batch():
+                    self.database.create_playlist("Dropped")
+                    raise ValueError
+        self.assertEqual(self._committed_playlists(), ["Kept"])
+
+    def test_other_threads_wait_for_the_batch(self):
+        written = threading.Event()
+        results = []
+
+        def write():
+            results.append(self.database.create_playlist("Other").result())
+            written.set()
+
+        with self.database.batch():
+            self.database.create_playlist("Batch")
+            thread = threading.Thread(target=write)
+            thread.start()
+            self.assertFalse(written.wait(0.1))
+        thread.join()
+        self.assertEqual(self._committed_playlists(), ["Batch", "Other"])
+        self.assertEqual(results, [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+
+# Tables compared between the cascaded and the hand-deleted library.
+TABLES = ["artists", "albums", "tracks", "genres", "track_genres",
+          "playlists", "playlist_tracks", "play_events", "collection_stats"]
+
+
+def delete_by_hand(connection, table, where, parameters=()):
+    """
+    Delete rows and every row depending on them, one table at a time.
+
+    This is what the delete paths did before foreign keys were
+    enforced: the dependent rows are found from the schema's foreign
+    keys and deleted first, so the triggers see the same rows the
+    cascade would leave them.
+    """
+    for child in _tables(connection):
+        for key in connection.execute(
+                f"PRAGMA foreign_key_list({child})").fetchall():
+            _, _, parent, column, parent_column, _, on_delete, _ = key
+            if parent == table and on_delete == "CASCADE":
+                delete_by_hand(
+                    connection, child,
+                    f"{column} IN (SELECT {parent_column} FROM {table} "
+                    f"WHERE {where})",
+                    parameters
+                )
+    connection.execute(f"DELETE FROM {table} WHERE {where}", parameters)
+
+
+def _tables(connection):
+    """Return the names of the ordinary tables of a database."""
+    return [name for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'track_search%'"
+    )]
+
+
+class TestCascadingDeletes(unittest.TestCase):
+    """Deletes cascade to the same end state as deleting by hand."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.reference_path = os.path.join(self._directory.name,
+                                           "reference.db")
+
+        database = MusicDatabase(self.db_path)
+        database.ingest_tracks(
+            [track_record(number) for number in range(300)]
+        ).result()
+        for number in range(6):
+            database.create_playlist(f"Playlist {number}")
+        for number in range(300):
+            database.add_to_playlist(number % 290 + 1, number % 6 + 1)
+            database.add_to_playlist(number // 3 + 1, number % 5 + 1)
+        for track_id in range(1, 300, 7):
+            database.record_play(track_id)
+        database.close()
+        shutil.copy(self.db_path, self.reference_path)
+
+        self.database = MusicDatabase(self.db_path)
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _statements(self, write):
+        """Return the number of statements a write executes."""
+        before = self.database.get_connection_stats()["statements_executed"]
+        write().result()
+        return (self.database.get_connection_stats()["statements_executed"]
+                - before)
+
+    def _assert_same_as_reference(self, deletes):
+        """Apply hand-written deletes to the reference and compare."""
+        self.database.close()
+        reference = sqlite3.connect(self.reference_path)
+        for table, where, parameters in deletes:
+            delete_by_hand(reference, table, where, parameters)
+        reference.commit()
+
+        library = sqlite3.connect(self.db_path)
+        self.assertEqual(library.execute("PRAGMA foreign_key_check")
+                         .fetchall(), [])
+        queries = [f"SELECT * FROM {table}" for table in TABLES]
+        queries.append("SELECT rowid, * FROM track_search")
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    sorted(library.execute(query).fetchall(), key=repr),
+                    sorted(reference.execute(query).fetchall(), key=repr)
+                )
+        library.close()
+        reference.close()
+
+    def test_delete_playlist(self):
+        self.assertEqual(
+            self._statements(lambda: self.database.delete_playlist(2)), 1
+        )
+        self._assert_same_as_reference([
+            ("playlists", "playlist_id = ?", (2,)),
+        ])
+
+    def test_delete_album(self):
+        # The cascaded ids are read for the cache, then one delete.
+        self.assertEqual(
+            self._statements(lambda: self.database.delete_album(3)), 2
+        )
+        self._assert_same_as_reference([
+            ("albums", "album_id = ?", (3,)),
+        ])
+
+    def test_delete_artist(self):
+        # The cascaded ids are read for the cache, then one delete.
+        self.assertEqual(
+            self._statements(lambda: self.database.delete_artist(4)), 2
+        )
+        self._assert_same_as_reference([
+            ("artists", "artist_id = ?", (4,)),
+        ])
+
+    def test_remove_by_paths(self):
+        paths = [f"/music/{number}.mp3" for number in range(0, 300, 11)]
+        self.assertEqual(
+            self._statements(lambda: self.database.remove_by_paths(paths)), 1
+        )
+        placeholders = ", ".join("?" * len(paths))
+        self._assert_same_as_reference([
+            ("tracks", f"file_path IN ({placeholders})", paths),
+        ])
+
+    def test_deletes_together(self):
+        paths = [f"/music/{number}.mp3" for number in range(5, 300, 17)]
+        self.database.remove_by_paths(paths)
+        self.database.delete_playlist(1)
+        self.database.delete_album(7)
+        self.database.delete_artist(2).result()
+        placeholders = ", ".join("?" * len(paths))
+        self._assert_same_as_reference([
+            ("tracks", f"file_path IN ({placeholders})", paths),
+            ("playlists", "playlist_id = ?", (1,)),
+            ("albums", "album_id = ?", (7,)),
+            ("artists", "artist_id = ?", (2,)),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+
+# The totals of each collection type, counted from the rows themselves.
+EXPECTED_TOTALS = {
+    "all songs": '''SELECT 0, COUNT(*), SUM(duration) FROM tracks''',
+    "album": '''SELECT album_id, COUNT(*), SUM(duration) FROM tracks
+        GROUP BY album_id''',
+    "artist": '''SELECT artist_id, COUNT(*), SUM(duration) FROM tracks
+        GROUP BY artist_id''',
+    "genre": '''SELECT genre_id, COUNT(*), SUM(duration) FROM track_genres
+        JOIN tracks USING (track_id) GROUP BY genre_id''',
+    "playlist": '''SELECT playlist_id, COUNT(*), SUM(duration)
+        FROM playlist_tracks JOIN tracks USING (track_id)
+        GROUP BY playlist_id''',
+}
+
+
+class TestCollectionStats(unittest.TestCase):
+    """The stored totals follow every write to tracks and playlists."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.database = MusicDatabase(self.db_path)
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(1, 41)]
+        ).result()
+        for number in range(1, 3):
+            self.database.create_playlist(f"Playlist {number}")
+        for track_id in range(1, 30, 2):
+            self.database.add_to_playlist(track_id, 1 + track_id % 2)
+        self.database.add_to_playlist(3, 2).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def assertStatsMatchRows(self):
+        """Check every collection's stats against its rows."""
+        # A read waits for the queued writes, so the rows are counted
+        # after them.
+        self.database.get_collection_stats()
+        connection = sqlite3.connect(self.db_path)
+        try:
+            expected = {
+                (collection_type, collection_id): (count, duration)
+                for collection_type, sql in EXPECTED_TOTALS.items()
+                for collection_id, count, duration in connection.execute(sql)
+                if count
+            }
+            collection_ids = {
+                (collection_type, collection_id)
+                for collection_type, collection_id in connection.execute(
+                    '''SELECT collection_type, collection_id
+                    FROM collection_stats WHERE track_count > 0''')
+            }
+        finally:
+            connection.close()
+
+        self.assertEqual(collection_ids, set(expected))
+        for (collection_type, collection_id), totals in expected.items():
+            with self.subTest(collection_type=collection_type,
+                              collection_id=collection_id):
+                count, duration = self.database.get_collection_stats(
+                    collection_type, collection_id
+                )
+                self.assertEqual(count, totals[0])
+                self.assertAlmostEqual(duration, totals[1])
+
+    def test_after_ingest(self):
+        self.assertEqual(self.database.get_collection_stats(),
+                         (40, sum(float(n + 1) for n in range(1, 41))))
+        self.assertStatsMatchRows()
+
+    def test_after_removing_tracks(self):
+        self.database.remove_by_paths(
+            [f"/music/library/{number}.mp3" for number in (1, 2, 3, 20)]
+        )
+        self.database.delete_album(
+            self.database.get_album_id("Album 4", "Artist 4", "1994")
+        )
+        self.database.delete_artist(self.database.get_artist_id("Artist 6"))
+        self.assertStatsMatchRows()
+
+    def test_after_playlist_edits(self):
+        self.database.insert_at(1, [2, 4, 6], 1)
+        self.database.move_track(1, 0, 3)
+        self.database.remove_at(1, 2)
+        self.database.remove_from_playlist(3, 2)
+        self.assertStatsMatchRows()
+        self.database.delete_playlist(2)
+        self.assertStatsMatchRows()
+        self.assertEqual(self.database.get_collection_stats("playlist", 2),
+                         (0, 0.0))
+
+    def test_empty_collection(self):
+        self.assertEqual(self.database.get_collection_stats("album", 999),
+                         (0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
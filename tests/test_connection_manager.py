@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from connectionmanager import ConnectionManager
+
+
+class TestConnectionManager(unittest.TestCase):
+    """Each thread has its own pooled connection and prepared statements."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.manager = ConnectionManager(
+            os.path.join(self._directory.name, "library.db")
+        )
+        self.manager.execute("CREATE TABLE items (value INTEGER)")
+
+    def tearDown(self):
+        self.manager.close()
+        self._directory.cleanup()
+
+    def _in_thread(self, function):
+        """Run a function on a new thread and return its result."""
+        results = []
+        thread = threading.Thread(target=lambda: results.append(function()))
+        thread.start()
+        thread.join()
+        return results[0]
+
+    def test_one_connection_per_thread(self):
+        connection = self.manager.get_connection()
+        self.assertIs(self.manager.get_connection(), connection)
+        other = self._in_thread(self.manager.get_connection)
+        self.assertIsNot(other, connection)
+        self.assertEqual(self.manager.get_stats()["connections_opened"], 2)
+
+    def test_exited_threads_connections_are_closed(self):
+        for _ in range(5):
+            self._in_thread(lambda: self.manager.execute("SELECT 1"))
+        # Only the connection of the last thread to exit is still open,
+        # as it is closed when the next connection opens.
+        stats = self.manager.get_stats()
+        self.assertEqual(stats["connections_opened"], 6)
+        self.assertEqual(stats["open_connections"], 2)
+
+    def test_repeated_statements_are_prepared_once(self):
+        before = self.manager.get_stats()
+        for value in range(10):
+            self.manager.execute("INSERT INTO items (value) VALUES (?)",
+                                 (value,))
+        after = self.manager.get_stats()
+        self.assertEqual(
+            after["statements_executed"] - before["statements_executed"], 10
+        )
+        self.assertEqual(
+            after["statements_prepared"] - before["statements_prepared"], 1
+        )
+
+    def test_nested_transaction_rolls_back_alone(self):
+        with self.manager.transaction():
+            self.manager.execute("INSERT INTO items (value) VALUES (1)")
+            with self.assertRaises(ValueError):
+                with self.manager.transaction():
+                    self.manager.execute(
+                        "INSERT INTO items (value) VALUES (2)"
+                    )
+                    raise ValueError
+            self.assertTrue(self.manager.in_transaction())
+        self.assertFalse(self.manager.in_transaction())
+        values = self.manager.execute("SELECT value FROM items").fetchall()
+        self.assertEqual(values, [(1,)])
+
+    def test_writes_are_visible_to_other_threads_after_commit(self):
+        with self.manager.transaction():
+            self.manager.execute("INSERT INTO items (value) VALUES (1)")
+            count = self._in_thread(lambda: self.manager.execute(
+                "SELECT COUNT(*) FROM items").fetchone()[0])
+            self.assertEqual(count, 0)
+        count = self._in_thread(lambda: self.manager.execute(
+            "SELECT COUNT(*) FROM items").fetchone()[0])
+        self.assertEqual(count, 1)
+
+    def test_closed_manager_refuses_connections(self):
+        self.manager.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.manager.get_connection()
+
+
+if __name__ == "__main__":
+    unittest.main()
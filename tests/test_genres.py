@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from genresdatabase import UNKNOWN_GENRE, split_genres
+from musicdatabase import MusicDatabase
+
+
+class TestSplitGenres(unittest.TestCase):
+    """Genre tags are split into distinct names."""
+
+    def test_single_name(self):
+        self.assertEqual(split_genres(" Rock "), ["Rock"])
+
+    def test_repeats_ignore_case(self):
+        self.assertEqual(split_genres(["Rock", "rock", "Pop"]),
+                         ["Rock", "Pop"])
+
+    def test_stored_list_repr(self):
+        self.assertEqual(split_genres("['Jazz', 'Funk']"), ["Jazz", "Funk"])
+
+    def test_empty_tag(self):
+        self.assertEqual(split_genres(""), [UNKNOWN_GENRE])
+        self.assertEqual(split_genres([" "]), [UNKNOWN_GENRE])
+
+
+class TestGenres(unittest.TestCase):
+    """Tracks are browsed by each of their genres."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = MusicDatabase(
+            os.path.join(self._directory.name, "library.db")
+        )
+        self.database.ingest_tracks([
+            track_record(1, genre=["Rock", "Pop"]),
+            track_record(2, genre="rock"),
+            track_record(3, genre=["Jazz"]),
+            track_record(4, genre=[]),
+        ]).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _genre_ids(self):
+        """Return the genres mapped from name to id."""
+        genre_ids = self.database.get_all_genres()
+        return {genre["genre_name"]: genre_id for genre_id, genre
+                in self.database.get_genre_metadata(genre_ids).items()}
+
+    def test_genres_are_listed_once_by_name(self):
+        genre_ids = self.database.get_all_genres()
+        names = [self.database.get_genre_name(genre_id)
+                 for genre_id in genre_ids]
+        self.assertEqual(names, ["Jazz", "Pop", "Rock", UNKNOWN_GENRE])
+
+    def test_tracks_of_a_genre(self):
+        genre_ids = self._genre_ids()
+        self.assertEqual(
+            sorted(self.database.get_genre_tracklist(genre_ids["Rock"])),
+            [1, 2]
+        )
+        self.assertEqual(self.database.get_genre_tracklist(genre_ids["Pop"]),
+                         [1])
+        self.assertEqual(
+            self.database.get_genre_tracklist(genre_ids[UNKNOWN_GENRE]), [4]
+        )
+        self.assertEqual(
+            self.database.get_collection_stats("genre", genre_ids["Rock"]),
+            (2, 5.0)
+        )
+
+    def test_trackless_genres_are_removed(self):
+        jazz = self._genre_ids()["Jazz"]
+        self.database.remove_by_paths(["/music/library/3.mp3"])
+        removed = self.database.remove_orphans().result()
+        self.assertEqual(removed["genres"], [jazz])
+        self.assertNotIn("Jazz", self._genre_ids())
+        with self.assertRaises(TypeError):
+            self.database.get_genre_name(jazz)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import gc
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import librarysnapshot
+from librarysnapshot import LibrarySnapshot
+
+
+def _rows(count):
+    """Return "all songs" rows for `count` tracks."""
+    return [(track_id, f"Track {track_id}", 1, 1, "2000",
+             f"/music/{track_id}.mp3", 60.0, track_id, "Artist", "Album")
+            for track_id in range(1, count + 1)]
+
+
+class TestLibrarySnapshot(unittest.TestCase):
+    """Write, map and replace snapshot files."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "library.snapshot")
+
+    def tearDown(self):
+        gc.collect()
+        self._directory.cleanup()
+
+    def _assert_unmapped(self, path):
+        """Fail if any memory map of the file is still open."""
+        gc.collect()
+        mapped = [obj for obj in gc.get_objects()
+                  if isinstance(obj, np.memmap) and obj._mmap is not None
+                  and obj.filename == os.path.abspath(path)]
+        self.assertEqual(mapped, [])
+
+    def test_save_unmaps_the_old_file_before_replacing_it(self):
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.save(["a"], _rows(3))
+        self.assertEqual(snapshot.get_stats(), (3, 180.0))
+
+        replace = os.replace
+
+        def checked_replace(source, target):
+            # Windows refuses to replace a file that is mapped.
+            self._assert_unmapped(target)
+            replace(source, target)
+
+        with mock.patch.object(librarysnapshot.os, "replace",
+                               checked_replace):
+            snapshot.save(["b"], _rows(5))
+
+        self.assertEqual(snapshot.stamp, ["b"])
+        self.assertEqual(snapshot.get_tracks_page(limit=2), ([1, 2],
+                                                             ("Track 2", 2)))
+        self.assertEqual(snapshot.get_stats(), (5, 300.0))
+
+    def test_discard_unmaps_the_file_before_deleting_it(self):
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.save(["a"], _rows(3))
+
+        remove = os.remove
+
+        def checked_remove(path):
+            # Windows refuses to delete a file that is mapped.
+            self._assert_unmapped(path)
+            remove(path)
+
+        with mock.patch.object(librarysnapshot.os, "remove", checked_remove):
+            snapshot.discard()
+
+        self.assertIsNone(snapshot.stamp)
+        self.assertFalse(os.path.exists(self.path))
+        snapshot.discard()
+
+    def test_discard_leaves_a_stale_snapshot_if_deleting_fails(self):
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.save(["a"], _rows(3))
+        with mock.patch.object(librarysnapshot.os, "remove",
+                               side_effect=PermissionError):
+            snapshot.discard()
+
+        # The next save writes the snapshot again, whatever its stamp.
+        self.assertIsNone(snapshot.stamp)
+        snapshot.save(["a"], _rows(2))
+        self.assertEqual(snapshot.get_stats(), (2, 120.0))
+
+    def test_reads_during_saves(self):
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.save(["a"], _rows(50))
+        errors = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    metadata = snapshot.get_track_metadata([1, 50])
+                    stats = snapshot.get_stats()
+                    page = snapshot.get_tracks_page(limit=5)
+                except Exception as error:
+                    errors.append(error)
+                    return
+                # Each read sees a whole snapshot, or none while one is
+                # being replaced.
+                if metadata is not None:
+                    self.assertEqual(metadata[50]["file_path"],
+                                     "/music/50.mp3")
+                if stats is not None:
+                    self.assertIn(stats, [(50, 3000.0), (60, 3600.0)])
+                if page is not None:
+                    self.assertEqual(page[0], [1, 2, 3, 4, 5])
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for number in range(30):
+                snapshot.save([number], _rows(50 if number % 2 else 60))
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+    def test_load_reads_a_saved_snapshot(self):
+        LibrarySnapshot(self.path).save(["a"], _rows(4))
+        snapshot = LibrarySnapshot(self.path)
+        self.assertTrue(snapshot.load())
+        self.assertEqual(snapshot.stamp, ["a"])
+        metadata = snapshot.get_track_metadata([4, 9])
+        self.assertEqual(list(metadata), [4])
+        self.assertEqual(metadata[4]["file_path"], "/music/4.mp3")
+
+    def test_pages_carry_on_from_any_cursor(self):
+        LibrarySnapshot(self.path).save(["a"], _rows(10))
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.load()
+        page, after = snapshot.get_tracks_page(limit=4)
+        self.assertEqual(page, [1, 2, 3, 4])
+        # A cursor from another snapshot is found by its track.
+        self.assertEqual(snapshot.get_tracks_page(("Track 5", 5), 2),
+                         ([6, 7], ("Track 7", 7)))
+        self.assertEqual(snapshot.get_tracks_page(after, -1)[0],
+                         [5, 6, 7, 8, 9, 10])
+
+    def test_unknown_cursor_is_left_to_the_database(self):
+        LibrarySnapshot(self.path).save(["a"], _rows(10))
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.load()
+        self.assertIsNone(snapshot.get_tracks_page(("Track 11", 11)))
+
+    def test_remembered_positions_are_bounded(self):
+        LibrarySnapshot(self.path).save(["a"], _rows(100))
+        snapshot = LibrarySnapshot(self.path)
+        snapshot.load()
+        after = None
+        track_ids = []
+        with mock.patch.object(librarysnapshot, "MAX_CACHED_POSITIONS", 25):
+            while True:
+                page, after = snapshot.get_tracks_page(after, 10)
+                if after is None:
+                    break
+                track_ids.extend(page)
+                self.assertLessEqual(len(snapshot._loaded.positions), 25)
+        self.assertEqual(sorted(track_ids), list(range(1, 101)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from lookupcache import LookupCache
+from musicdatabase import MusicDatabase
+
+
+class TestLookupCache(unittest.TestCase):
+    """Hits, misses and invalidation of the cache itself."""
+
+    def test_hits_and_misses(self):
+        cache = LookupCache(maxsize=2)
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+        self.assertEqual(cache.get("a", lambda: 2), 1)
+        self.assertEqual(cache.get_stats(),
+                         {"size": 1, "maxsize": 2, "hits": 1, "misses": 1})
+
+    def test_none_is_not_kept(self):
+        cache = LookupCache()
+        self.assertIsNone(cache.get("a", lambda: None))
+        # The row may be added later under the same key.
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+        self.assertEqual(cache.get_stats()["size"], 1)
+
+    def test_invalidate_only_removes_the_given_keys(self):
+        cache = LookupCache()
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.invalidate("a")
+        self.assertEqual(cache.get("a", lambda: 3), 3)
+        self.assertEqual(cache.get("b", lambda: 4), 2)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LookupCache(maxsize=2)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.get("a", lambda: 1)
+        cache.get("c", lambda: 3)
+        self.assertEqual(cache.get("a", lambda: 5), 1)
+        self.assertEqual(cache.get("b", lambda: 6), 6)
+
+
+class TestCacheInvalidation(unittest.TestCase):
+    """Every insert and delete drops the cached lookups it changes."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = MusicDatabase(
+            os.path.join(self._directory.name, "library.db")
+        )
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _hits(self):
+        return self.database.get_cache_stats()["hits"]
+
+    def test_reused_track_ids_are_read_again(self):
+        written = self.database.ingest_tracks(
+            [track_record(1), track_record(2)]
+        ).result()
+        self.assertEqual(written["tracks"], [1, 2])
+        self.assertEqual(self.database.get_path(2), "/music/library/2.mp3")
+        self.assertEqual(self.database.get_duration(2), 3.0)
+
+        self.database.remove_by_paths(["/music/library/2.mp3"])
+        # SQLite hands out the largest removed rowid again.
+        written = self.database.ingest_tracks([track_record(3)]).result()
+        self.assertEqual(written["tracks"], [2])
+        self.assertEqual(self.database.get_path(2), "/music/library/3.mp3")
+        self.assertEqual(self.database.get_duration(2), 4.0)
+
+    def test_reused_album_and_artist_ids_are_read_again(self):
+        self.database.ingest_tracks([
+            track_record(1, artist="First", album="One"),
+            track_record(2, artist="Second", album="Two")
+        ])
+        artist_id = self.database.get_artist_id("Second")
+        album_id = self.database.get_album_id("Two", "Second", "1992")
+        self.assertEqual(self.database.get_artist_name(artist_id), "Second")
+        self.assertEqual(self.database.get_album_title(album_id), "Two")
+
+        self.database.delete_artist(artist_id)
+        self.database.ingest_tracks(
+            [track_record(3, artist="Third", album="Three")]
+        )
+        self.assertEqual(self.database.get_artist_id("Third"), artist_id)
+        self.assertEqual(self.database.get_artist_name(artist_id), "Third")
+        self.assertEqual(self.database.get_album_title(album_id), "Three")
+
+    def test_insert_track_invalidates_its_ids(self):
+        self.database.ingest_tracks([track_record(1)])
+        self.database.get_path(1)
+        self.database.remove_by_paths(["/music/library/1.mp3"])
+        written = self.database.insert_track(
+            "New", "Artist 1", "Album 1", 1, "1991", "Rock", 5.0,
+            "/music/new.mp3"
+        ).result()
+        self.assertEqual(written["tracks"], [1])
+        self.assertEqual(self.database.get_path(1), "/music/new.mp3")
+
+    def test_delete_album_keeps_other_lookups(self):
+        self.database.ingest_tracks([track_record(1, album="One"),
+                                     track_record(2, album="Two")])
+        one = self.database.get_album_id("One", "Artist 1", "1991")
+        two = self.database.get_album_id("Two", "Artist 2", "1992")
+        for album_id in (one, two):
+            self.database.get_album_title(album_id)
+        self.database.get_path(1)
+        self.database.get_path(2)
+
+        removed = self.database.delete_album(one).result()
+        self.assertEqual(removed, {"albums": [one], "tracks": [1]})
+
+        hits = self._hits()
+        self.assertEqual(self.database.get_album_title(two), "Two")
+        self.assertEqual(self.database.get_path(2), "/music/library/2.mp3")
+        self.assertEqual(self._hits(), hits + 2)
+        with self.assertRaises(TypeError):
+            self.database.get_path(1)
+
+    def test_delete_artist_removes_its_albums_and_tracks(self):
+        self.database.ingest_tracks([
+            track_record(1, artist="First", album="One"),
+            track_record(2, artist="Second", album="Two")
+        ])
+        artist_id = self.database.get_artist_id("First")
+        album_id = self.database.get_album_id("One", "First", "1991")
+        removed = self.database.delete_artist(artist_id).result()
+        self.assertEqual(removed, {"artists": [artist_id],
+                                   "albums": [album_id], "tracks": [1]})
+
+    def test_new_playlist_name_is_read(self):
+        playlist_id = self.database.create_playlist("Mix").result()
+        self.assertEqual(self.database.get_playlist_name(playlist_id), "Mix")
+        self.assertEqual(self.database.get_playlists(), {playlist_id: "Mix"})
+        self.database.delete_playlist(playlist_id)
+        self.assertEqual(self.database.get_playlists(), {})
+        new_id = self.database.create_playlist("Other").result()
+        self.assertEqual(self.database.get_playlist_name(new_id), "Other")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+
+
+class TestMetadata(unittest.TestCase):
+    """Track and album rows carry their names from a single query."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = MusicDatabase(
+            os.path.join(self._directory.name, "library.db")
+        )
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(1, 11)]
+        ).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _statements(self):
+        return self.database.get_connection_stats()["statements_executed"]
+
+    def test_track_names_are_joined(self):
+        before = self._statements()
+        tracks = self.database.get_track_metadata([7, 2, 5])
+        self.assertEqual(self._statements() - before, 1)
+
+        self.assertEqual(list(tracks), [7, 2, 5])
+        track = tracks[2]
+        self.assertEqual(track["track_name"], "library 2")
+        self.assertEqual(track["artist_name"], "Artist 2")
+        self.assertEqual(track["album_name"], "Album 2")
+        self.assertEqual(track["track_number"], 2)
+        self.assertEqual(track["release_date"], "1992")
+        self.assertEqual(track["file_path"], "/music/library/2.mp3")
+        self.assertEqual(
+            self.database.get_artist_name(track["artist"]), "Artist 2"
+        )
+        self.assertEqual(
+            self.database.get_album_title(track["album"]), "Album 2"
+        )
+
+    def test_compilation_tracks_keep_their_own_artist(self):
+        track = self.database.get_track_metadata([5])[5]
+        self.assertEqual(track["artist_name"], "Artist 5")
+        album = self.database.get_album_metadata([track["album"]])
+        self.assertEqual(album[track["album"]]["artist_name"],
+                         "Various Artists")
+
+    def test_album_artist_names_are_joined(self):
+        album_id = self.database.get_album_id("Album 3", "Artist 3", "1993")
+        before = self._statements()
+        albums = self.database.get_album_metadata([album_id])
+        self.assertEqual(self._statements() - before, 1)
+        self.assertEqual(albums[album_id]["album_name"], "Album 3")
+        self.assertEqual(albums[album_id]["artist_name"], "Artist 3")
+        self.assertEqual(albums[album_id]["release_date"], "1993")
+
+    def test_unknown_ids_are_left_out(self):
+        self.assertEqual(list(self.database.get_track_metadata([3, 999, 1])),
+                         [3, 1])
+        self.assertEqual(self.database.get_album_metadata([999]), {})
+        self.assertEqual(self.database.get_track_metadata([]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
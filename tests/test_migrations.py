@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from connectionmanager import ConnectionManager
+from databasemigrations import _add_album_release_date_key
+from musicdatabase import MusicDatabase
+
+# The schema created by the first release, before any migration.
+BASELINE_SCHEMA = '''
+    CREATE TABLE artists(
+        artist_id INTEGER PRIMARY KEY,
+        artist_name TEXT NOT NULL);
+    CREATE TABLE albums (
+        album_id INTEGER PRIMARY KEY,
+        album_name TEXT NOT NULL,
+        release_date TEXT NOT NULL,
+        artist_id INTEGER NOT NULL,
+        FOREIGN KEY(artist_id) REFERENCES artists(artist_id)
+    );
+    CREATE TABLE tracks (
+        track_id INTEGER PRIMARY KEY,
+        track_name TEXT NOT NULL,
+        release_date TEXT NOT NULL,
+        genre TEXT NOT NULL,
+        duration REAL NOT NULL,
+        file_path  TEXT NOT NULL UNIQUE,
+        track_number INTEGER NOT NULL,
+        album_id INTEGER NOT NULL,
+        artist_id INTEGER NOT NULL,
+        FOREIGN KEY(album_id) REFERENCES albums(album_id),
+        FOREIGN KEY (artist_id) REFERENCES artists(artist_id)
+    );
+    CREATE TABLE playlists (
+        playlist_id INTEGER PRIMARY KEY,
+        playlist_name TEXT NOT NULL
+    );
+    CREATE TABLE playlist_tracks (
+        identifier INTEGER PRIMARY KEY,
+        playlist_id INTEGER NOT NULL,
+        track_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        FOREIGN KEY (playlist_id) REFERENCES playlists(playlist_id),
+        FOREIGN KEY (track_id) REFERENCES tracks(track_id)
+        UNIQUE (playlist_id, track_id, position)
+    );
+'''
+
+
+class TestMigrations(unittest.TestCase):
+    """Upgrade databases written by the first release."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _write_baseline(self, rows):
+        """Create a baseline database holding the given rows."""
+        connection = sqlite3.connect(self.db_path)
+        connection.executescript(BASELINE_SCHEMA)
+        for table, values in rows.items():
+            for row in values:
+                placeholders = ", ".join("?" * len(row))
+                connection.execute(
+                    f"INSERT INTO {table} VALUES ({placeholders})", row
+                )
+        connection.commit()
+        connection.close()
+
+    def _check_consistent(self):
+        """Check the keys, integrity and stats of the upgraded database."""
+        connection = sqlite3.connect(self.db_path)
+        query = lambda sql: connection.execute(sql).fetchall()
+        self.assertEqual(query("PRAGMA foreign_key_check"), [])
+        self.assertEqual(query("PRAGMA integrity_check"), [("ok",)])
+        self.assertEqual(
+            query('''SELECT track_count, total_duration FROM collection_stats
+                  WHERE collection_type = 'all songs' '''),
+            query("SELECT COUNT(*), COALESCE(SUM(duration), 0.0) FROM tracks")
+        )
+        self.assertEqual(
+            query('''SELECT collection_id, track_count FROM collection_stats
+                  WHERE collection_type = 'playlist' ORDER BY 1'''),
+            query('''SELECT playlist_id, COUNT(*) FROM playlist_tracks
+                  GROUP BY playlist_id ORDER BY 1''')
+        )
+        self.assertEqual(query("SELECT COUNT(*) FROM track_search"),
+                         query("SELECT COUNT(*) FROM tracks"))
+        connection.close()
+
+    def test_upgrade_with_dangling_references(self):
+        """Rows pointing at deleted rows don't stop the upgrade."""
+        self._write_baseline({
+            "artists": [(1, "A"), (2, "A"), (3, "B")],
+            "albums": [
+                (1, "Hits", "2000", 1),
+                (2, "Hits", "2000", 2),
+                # The album's artist was deleted.
+                (3, "Lost", "2001", 99),
+            ],
+            "tracks": [
+                (1, "One", "2000", "Pop", 100.0, "/m/1.mp3", 1, 1, 1),
+                (2, "Two", "2000", "Pop", 120.0, "/m/2.mp3", 2, 2, 2),
+                (3, "Three", "2001", "Rock", 90.0, "/m/3.mp3", 1, 3, 3),
+                # The track's album and artist were deleted.
+                (4, "Four", "2002", "Rock", 80.0, "/m/4.mp3", 1, 98, 97),
+                # The track's album was deleted.
+                (5, "Five", "2002", "Rock", 70.0, "/m/5.mp3", 1, 96, 3),
+            ],
+            "playlists": [(1, "Mix")],
+            "playlist_tracks": [
+                (1, 1, 1, 0),
+                (2, 1, 2, 1),
+                # The entry's track, and another's playlist, were deleted.
+                (3, 1, 95, 2),
+                (4, 94, 1, 0),
+            ],
+        })
+
+        database = MusicDatabase(self.db_path)
+        tracks = database.get_all_tracks()
+        playlist = database.get_playlist_tracks(1)
+        database.close()
+
+        # Duplicate artists are merged, and rows which can't be linked
+        # to their parents are dropped.
+        self.assertEqual(sorted(tracks), [1, 2])
+        self.assertEqual(playlist, [1, 2])
+        self._check_consistent()
+
+    def test_upgrade_of_a_consistent_library(self):
+        """A baseline library keeps every track through the upgrade."""
+        self._write_baseline({
+            "artists": [(1, "A"), (2, "B")],
+            "albums": [(1, "Hits", "2000", 1), (2, "Other", "2001", 2)],
+            "tracks": [
+                (1, "One", "2000", "Pop", 100.0, "/m/1.mp3", 1, 1, 1),
+                (2, "Two", "2001", "Rock", 120.0, "/m/2.mp3", 1, 2, 2),
+            ],
+            "playlists": [(1, "Mix")],
+            "playlist_tracks": [(1, 1, 2, 0), (2, 1, 1, 1)],
+        })
+
+        database = MusicDatabase(self.db_path)
+        self.assertEqual(sorted(database.get_all_tracks()), [1, 2])
+        self.assertEqual(database.get_playlist_tracks(1), [2, 1])
+        database.close()
+        self._check_consistent()
+
+    def test_compilation_stays_one_album(self):
+        """Tracks by other artists stay on their album."""
+        self._write_baseline({
+            "artists": [(1, "A"), (2, "B"), (3, "C")],
+            "albums": [(1, "Now", "2000", 1)],
+            "tracks": [
+                (1, "One", "2000", "Pop", 100.0, "/m/1.mp3", 1, 1, 1),
+                (2, "Two", "2000", "Pop", 120.0, "/m/2.mp3", 2, 1, 2),
+                (3, "Three", "2000", "Pop", 90.0, "/m/3.mp3", 3, 1, 3),
+            ],
+        })
+
+        database = MusicDatabase(self.db_path)
+        self.assertEqual(database.get_all_albums(), [1])
+        self.assertEqual(sorted(database.get_album_tracklist(1)), [1, 2, 3])
+        self.assertEqual(database.get_collection_stats("album", 1),
+                         (3, 310.0))
+        database.close()
+        self._check_consistent()
+
+    def test_merged_releases_are_split_by_date(self):
+        """An album's tracks from another year get their own album."""
+        self._write_baseline({
+            "artists": [(1, "A"), (2, "B")],
+            "albums": [(1, "Hits", "2000", 1)],
+            "tracks": [
+                (1, "One", "2000", "Pop", 100.0, "/m/1.mp3", 1, 1, 1),
+                (2, "Two", "2005", "Pop", 120.0, "/m/2.mp3", 1, 1, 1),
+                (3, "Three", "2005", "Pop", 90.0, "/m/3.mp3", 2, 1, 2),
+            ],
+        })
+
+        database = MusicDatabase(self.db_path)
+        newer = database.get_album_id("Hits", "A", "2005")
+        self.assertEqual(database.get_album_tracklist(1), [1])
+        self.assertEqual(sorted(database.get_album_tracklist(newer)), [2, 3])
+        self.assertTrue(database.album_exists("Hits", "A", "2005"))
+        self.assertFalse(database.album_exists("Hits", "B", "2005"))
+        self.assertEqual(database.get_collection_stats("album", newer),
+                         (2, 210.0))
+        database.close()
+        self._check_consistent()
+
+    def test_split_without_release_dates(self):
+        """Tracks without a date are moved to one album, not dropped."""
+        manager = ConnectionManager(self.db_path)
+        manager.execute('''CREATE TABLE albums (
+            album_id INTEGER PRIMARY KEY, album_name TEXT,
+            release_date TEXT, artist_id INTEGER)''')
+        manager.execute('''CREATE TABLE tracks (
+            track_id INTEGER PRIMARY KEY, release_date TEXT,
+            album_id INTEGER, artist_id INTEGER)''')
+        manager.execute('''CREATE UNIQUE INDEX idx_albums_identity
+            ON albums(album_name, artist_id)''')
+        with manager.transaction():
+            manager.executemany("INSERT INTO albums VALUES (?, ?, ?, ?)", [
+                (1, "Hits", "2000", 1),
+                (2, "Demos", None, 1),
+            ])
+            manager.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?)", [
+                (1, "2000", 1, 1),
+                (2, None, 1, 1),
+                (3, None, 1, 2),
+                (4, None, 2, 1),
+            ])
+            _add_album_release_date_key(manager)
+
+        albums = manager.execute(
+            "SELECT album_id, album_name, release_date FROM albums"
+        ).fetchall()
+        tracks = dict(manager.execute(
+            "SELECT track_id, album_id FROM tracks"
+        ).fetchall())
+        manager.close()
+
+        undated = [album_id for album_id, name, date in albums
+                   if name == "Hits" and date is None]
+        self.assertEqual(len(undated), 1)
+        self.assertEqual(tracks, {1: 1, 2: undated[0], 3: undated[0], 4: 2})
+        self.assertEqual(len(albums), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
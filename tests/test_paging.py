@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import TRACK_SORTS, MusicDatabase
+
+LIBRARY_SIZE = 50
+PAGE_SIZE = 7
+
+
+class TestKeysetPaging(unittest.TestCase):
+    """Pages read after a cursor cover a collection once, in order."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = MusicDatabase(
+            os.path.join(self._directory.name, "library.db")
+        )
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(LIBRARY_SIZE)]
+        ).result()
+        for track_id in range(1, LIBRARY_SIZE, 3):
+            for _ in range(track_id % 4):
+                self.database.record_play(track_id)
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _walk(self, collection_type="all songs", collection_id=None,
+              sort_key=None):
+        """Return every track of a collection, read a page at a time."""
+        track_ids = []
+        after = None
+        while True:
+            page, after = self.database.get_tracks_page(
+                collection_type, collection_id, sort_key, after, PAGE_SIZE
+            )
+            self.assertLessEqual(len(page), PAGE_SIZE)
+            if after is None:
+                self.assertEqual(page, [])
+                return track_ids
+            track_ids.extend(page)
+
+    def test_pages_match_the_full_list(self):
+        for sort_key in TRACK_SORTS:
+            with self.subTest(sort_key=sort_key):
+                self.assertEqual(self._walk(sort_key=sort_key),
+                                 self.database.get_all_tracks(sort_key))
+
+    def test_collections_are_paged(self):
+        album_id = self.database.get_album_id("Album 1", "Artist 1", "1991")
+        self.assertEqual(self._walk("album", album_id),
+                         self.database.get_album_tracklist(album_id))
+        self.assertEqual(sorted(self._walk("artist", 2)),
+                         sorted(self.database.get_artist_tracklist(2)))
+        self.assertEqual(sorted(self._walk("genre", 1)),
+                         sorted(self.database.get_genre_tracklist(1)))
+
+    def test_tracks_added_while_paging_are_not_repeated(self):
+        first, after = self.database.get_tracks_page(limit=PAGE_SIZE)
+        self.database.ingest_tracks(
+            [track_record(number, "later") for number in range(10)]
+        ).result()
+        rest = []
+        while after is not None:
+            page, after = self.database.get_tracks_page(after=after,
+                                                        limit=PAGE_SIZE)
+            rest.extend(page)
+        track_ids = first + rest
+        self.assertEqual(len(track_ids), len(set(track_ids)))
+        self.assertLessEqual(set(range(1, LIBRARY_SIZE + 1)), set(track_ids))
+
+    def test_unknown_collection_type(self):
+        with self.assertRaises(ValueError):
+            self.database.get_tracks_page("folder")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import playeventbuffer
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+from playeventbuffer import PlayEventBuffer
+
+
+class TestPlayEventBuffer(unittest.TestCase):
+    """Events are handed on once 50 are held or the oldest is 600 s old."""
+
+    def setUp(self):
+        self.batches = []
+        self.buffer = PlayEventBuffer(self._write)
+        self.now = 1000.0
+        patcher = mock.patch.object(playeventbuffer.time, "monotonic",
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, events):
+        self.batches.append(events)
+        return len(events)
+
+    def test_full_buffer_is_written(self):
+        for track_id in range(49):
+            self.assertIsNone(self.buffer.add(track_id))
+        self.assertEqual(self.batches, [])
+        self.assertEqual(self.buffer.add(49, skipped=True), 50)
+        [events] = self.batches
+        self.assertEqual([event[0] for event in events], list(range(50)))
+        self.assertTrue(events[-1][2])
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_old_events_are_written_with_the_next(self):
+        self.buffer.add(1)
+        self.now += 599
+        self.assertIsNone(self.buffer.add(2))
+        self.now += 1
+        self.assertEqual(self.buffer.add(3), 3)
+        self.assertEqual(len(self.batches), 1)
+
+    def test_age_counts_from_the_oldest_held_event(self):
+        self.buffer.add(1)
+        self.buffer.flush()
+        self.now += 900
+        # The previous events were written, so this one starts afresh.
+        self.assertIsNone(self.buffer.add(2))
+        self.assertEqual(len(self.buffer), 1)
+
+    def test_flush(self):
+        self.assertIsNone(self.buffer.flush())
+        self.buffer.add(1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertIsNone(self.buffer.flush())
+
+
+class TestPlayHistory(unittest.TestCase):
+    """Buffered plays reach the play counters and the history."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.database = MusicDatabase(self.db_path)
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(1, 4)]
+        ).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _stored_events(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(
+                "SELECT COUNT(*) FROM play_events").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_plays_are_held_until_read(self):
+        self.database.record_play(1)
+        self.database.record_play(1)
+        self.database.record_play(2, skipped=True)
+        self.assertEqual(self._stored_events(), 0)
+
+        stats = self.database.get_play_stats(1)
+        self.assertEqual((stats["play_count"], stats["skip_count"]), (2, 0))
+        self.assertGreater(stats["last_played"], 0)
+        stats = self.database.get_play_stats(2)
+        self.assertEqual((stats["play_count"], stats["skip_count"]), (0, 1))
+        self.assertEqual(self._stored_events(), 3)
+
+    def test_fiftieth_play_writes_the_batch(self):
+        for _ in range(49):
+            self.assertIsNone(self.database.record_play(3))
+        self.assertEqual(self.database.record_play(3).result(), 50)
+        self.assertEqual(self._stored_events(), 50)
+
+    def test_plays_of_removed_tracks_are_dropped(self):
+        self.database.record_play(1)
+        self.database.record_play(2)
+        self.database.remove_by_paths(["/music/library/2.mp3"]).result()
+        self.assertEqual(self.database.flush_play_events().result(), 1)
+
+    def test_most_played_order(self):
+        for track_id, plays in ((1, 1), (2, 3), (3, 2)):
+            for _ in range(plays):
+                self.database.record_play(track_id)
+        page, _ = self.database.get_tracks_page("most played")
+        self.assertEqual(page, [2, 3, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from musicdatabase import MusicDatabase
+
+
+class TestPlaylistEntries(unittest.TestCase):
+    """Entries are moved and removed by index, so repeats stay apart."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.database = MusicDatabase(self.db_path)
+        self.database.ingest_tracks([
+            {"track_name": f"Track {number}", "artist": "Artist",
+             "album": "Album", "track_number": number,
+             "release_date": "2000", "genre": "Rock", "duration": 60.0,
+             "file_path": f"/music/{number}.mp3"}
+            for number in range(1, 4)
+        ]).result()
+        self.database.create_playlist("Mix")
+        # Track 1 is in the playlist twice.
+        for track_id in (1, 2, 1, 3):
+            self.database.add_to_playlist(track_id, 1)
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def test_move_a_repeated_track(self):
+        self.database.move_track(1, 2, 3)
+        self.assertEqual(self.database.get_playlist_tracks(1), [1, 2, 3, 1])
+        self.database.move_track(1, 0, 1)
+        self.assertEqual(self.database.get_playlist_tracks(1), [2, 1, 3, 1])
+
+    def test_remove_one_entry_of_a_repeated_track(self):
+        self.database.remove_at(1, 2)
+        self.assertEqual(self.database.get_playlist_tracks(1), [1, 2, 3])
+        self.assertEqual(self.database.get_collection_stats("playlist", 1),
+                         (3, 180.0))
+
+    def test_remove_past_the_end(self):
+        self.database.remove_at(1, 4).result()
+        self.assertEqual(self.database.get_playlist_tracks(1), [1, 2, 1, 3])
+
+    def test_remove_every_entry_of_a_track(self):
+        self.database.remove_from_playlist(1, 1)
+        self.assertEqual(self.database.get_playlist_tracks(1), [2, 3])
+
+    def test_tied_positions_keep_one_order(self):
+        # Different tracks may share a position, so every read and edit
+        # breaks the tie by identifier.
+        self.database.create_playlist("Tied").result()
+        with sqlite3.connect(self.db_path) as connection:
+            connection.executemany('''
+                INSERT INTO playlist_tracks (playlist_id, track_id, position)
+                VALUES (2, ?, 1024)
+                ''', [(3,), (1,), (2,)])
+        connection.close()
+        self.assertEqual(self.database.get_playlist_tracks(2), [3, 1, 2])
+        page, cursor = self.database.get_tracks_page("playlist", 2, limit=2)
+        self.assertEqual(page, [3, 1])
+        page, _ = self.database.get_tracks_page("playlist", 2, after=cursor)
+        self.assertEqual(page, [2])
+
+        self.database.remove_at(2, 1)
+        self.assertEqual(self.database.get_playlist_tracks(2), [3, 2])
+        self.database.insert_at(2, [1], 1)
+        self.assertEqual(self.database.get_playlist_tracks(2), [3, 1, 2])
+        self.database.move_track(2, 2, 0)
+        self.assertEqual(self.database.get_playlist_tracks(2), [2, 3, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import inspect
+import os
+import re
+import tempfile
+import unittest
+
+from albumsdatabase import ALBUM_SORT_ORDERS
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import DEFAULT_SORT_KEYS, TRACK_SORTS, MusicDatabase
+
+# Tables that grow with the library, which must never be read in full
+# to answer a query about part of it.
+LARGE_TABLES = {"tracks", "playlist_tracks", "track_genres", "play_events",
+                "albums", "artists"}
+
+# Public methods which run no queries of their own.
+NOT_QUERIES = {"batch", "close", "create_database", "snapshot",
+               "verify_query_plans", "get_query_profile",
+               "format_query_profile", "get_cache_stats",
+               "get_connection_stats"}
+
+LIBRARY_SIZE = 60
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Run every query the app makes and check each is backed by an index."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self._directory.name, "library.db")
+        # The schema is created and migrated by the first connection, so
+        # only the app's own queries are recorded by the second.
+        MusicDatabase(db_path).close()
+        self.database = MusicDatabase(
+            db_path,
+            snapshot_path=os.path.join(self._directory.name, "library.snap")
+        )
+        self.called = set()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def call(self, name, *args, **kwargs):
+        """Call a `MusicDatabase` method, waiting for queued writes."""
+        self.called.add(name)
+        result = getattr(self.database, name)(*args, **kwargs)
+        if hasattr(result, "result") and callable(result.result):
+            result = result.result()
+        return result
+
+    def run_every_query(self):
+        """Call each public method the way the app does."""
+        call = self.call
+        call("ingest_tracks",
+             [track_record(number, str(number % 4))
+              for number in range(LIBRARY_SIZE)])
+        call("insert_track", "Extra", "Artist 1", "Album 1", 1, "1990",
+             "Rock", 30.0, "/music/extra.mp3")
+        call("insert_artist", "Lone Artist")
+        artist_id = call("get_artist_id", "Lone Artist")
+        call("insert_album", "Lone Album", "Lone Artist", "2001")
+        call("upsert_album", "Lone Album", artist_id, "2001")
+        call("artist_exists", "Artist 1")
+        call("album_exists", "Album 1", "Artist 1", "1990")
+        album_id = call("get_album_id", "Album 1", "Artist 1", "1990")
+        call("track_exists", "/music/1/1.mp3")
+        call("track_is_duplicate", "1 1", "Artist 1", "Album 1", "1991")
+        call("track_is_duplicate", "1 5", "Artist 5", "Album 5", "1995",
+             "Various Artists")
+
+        for number in range(1, 4):
+            call("create_playlist", f"Playlist {number}")
+        for track_id in range(1, 20):
+            call("add_to_playlist", track_id, 1 + track_id % 3)
+        call("insert_at", 1, [4, 5, 6], 2)
+        call("move_track", 1, 0, 3)
+        call("swap_positions", 1, 0, 1)
+        call("remove_at", 1, 1)
+        call("remove_from_playlist", 5, 1)
+        call("get_track_pos", 1, 9)
+        call("get_min_pos", 1)
+        call("get_max_pos", 1)
+        call("get_playlist_name", 1)
+        call("get_playlists")
+        call("get_playlist_tracks", 1)
+
+        for track_id in range(1, 30):
+            call("record_play", track_id, skipped=track_id % 4 == 0)
+        call("flush_play_events")
+        call("get_play_stats", 3)
+
+        call("get_all_artists")
+        call("get_all_genres")
+        for sort_by in ALBUM_SORT_ORDERS:
+            call("get_all_albums", sort_by)
+        for sort_by in TRACK_SORTS:
+            call("get_all_tracks", sort_by)
+
+        # The first and a later page of every order of every collection.
+        collection_ids = {"album": album_id, "artist": 1, "playlist": 1,
+                          "genre": 1}
+        pages = [(collection_type, collection_ids.get(collection_type), None)
+                 for collection_type in DEFAULT_SORT_KEYS]
+        pages += [("all songs", None, sort_key) for sort_key in TRACK_SORTS]
+        for collection_type, collection_id, sort_key in pages:
+            page, cursor = call("get_tracks_page", collection_type,
+                                collection_id, sort_key, limit=3)
+            self.assertTrue(page, (collection_type, sort_key))
+            call("get_tracks_page", collection_type, collection_id,
+                 sort_key, after=cursor, limit=3)
+            call("get_collection_stats", collection_type, collection_id)
+
+        track_ids = list(range(1, 25))
+        call("get_track_metadata", track_ids)
+        list(call("iter_track_metadata", track_ids))
+        call("get_artist_metadata", [1, 2, 3])
+        call("get_album_metadata", [1, 2, 3])
+        call("get_genre_metadata", [1, 2])
+        call("get_artist_name", 1)
+        call("get_album_title", album_id)
+        call("get_genre_name", 1)
+        call("get_album_tracklist", album_id)
+        call("get_artist_tracklist", 1)
+        call("get_artist_albumlist", 1)
+        call("get_genre_tracklist", 1)
+        call("get_path", 1)
+        call("get_duration", 1)
+        call("search", "1 1")
+
+        call("get_all_paths")
+        call("get_paths_under", "/music/1")
+        call("get_fingerprints_under", "/music/2")
+        call("get_tracks_by_fingerprint", [(1001, "1-1"), (1, "none")])
+        call("update_fingerprints", [("/music/1/1.mp3", 1001, 2, "1-1")])
+        call("refresh_library_snapshot")
+        call("relocate_tracks", [(2, "/music/moved/2.mp3", 1002, 3)])
+        call("remove_by_paths", ["/music/3/3.mp3", "/music/3/7.mp3"])
+        call("delete_playlist", 3)
+        call("delete_album", album_id)
+        call("delete_artist", 2)
+        call("remove_orphans")
+        call("refresh_library_snapshot")
+
+    def test_every_method_is_covered(self):
+        self.run_every_query()
+        public = {name for name, _ in inspect.getmembers(
+                      MusicDatabase, inspect.isfunction)
+                  if not name.startswith("_")}
+        self.assertEqual(public - NOT_QUERIES - self.called, set())
+
+    def test_queries_use_indexes(self):
+        self.run_every_query()
+        self.database.verify_query_plans()
+
+        plans = self.database._connection_manager.explain_query_plans()
+        self.assertGreater(len(plans), 50)
+        full_scans = []
+        for sql, plan in plans.items():
+            # Only statements which read the whole table by design, such
+            # as the snapshot export and `remove_orphans()`, may do so.
+            if "/* full scan */" in sql:
+                continue
+            for detail in plan:
+                # "SCAN tracks" without "USING ... INDEX" reads every row
+                # in table order.
+                match = re.match(r"SCAN (\w+)(?: AS \w+)?$", detail)
+                if match and match.group(1) in LARGE_TABLES:
+                    full_scans.append(f"{' '.join(sql.split())}\n    {plan}")
+        self.assertEqual(full_scans, [], "\n".join(full_scans))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from connectionmanager import UNLABELLED
+from musicdatabase import MusicDatabase
+
+LIBRARY_SIZE = 20
+
+
+class TestQueryProfile(unittest.TestCase):
+    """Profiled queries are labelled by method and still streamed."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = MusicDatabase(
+            os.path.join(self._directory.name, "library.db"),
+            profile_queries=True
+        )
+        self.database.ingest_tracks([
+            {"track_name": f"Track {number}", "artist": "Artist",
+             "album": "Album", "track_number": number,
+             "release_date": "2000", "genre": "Rock", "duration": 60.0,
+             "file_path": f"/music/{number}.mp3"}
+            for number in range(1, LIBRARY_SIZE + 1)
+        ]).result()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _queries(self, name):
+        return [query for query in self.database.get_query_profile()["queries"]
+                if query["name"] == name]
+
+    def test_rows_are_streamed(self):
+        rows = self.database.iter_track_metadata(range(1, LIBRARY_SIZE + 1))
+        [query] = self._queries("MusicDatabase.iter_track_metadata")
+        self.assertEqual(query["calls"], 1)
+        self.assertEqual(query["rows"], 0)
+
+        self.assertEqual(next(rows)[0], 1)
+        self.assertEqual(len(list(rows)), LIBRARY_SIZE - 1)
+        [query] = self._queries("MusicDatabase.iter_track_metadata")
+        self.assertEqual(query["rows"], LIBRARY_SIZE)
+
+    def test_rows_of_single_row_reads(self):
+        self.assertEqual(self.database.get_path(3), "/music/3.mp3")
+        [query] = self._queries("MusicDatabase.get_path")
+        self.assertEqual((query["calls"], query["rows"]), (1, 1))
+
+    def test_every_query_is_labelled(self):
+        self.database.create_playlist("Mix")
+        self.database.insert_at(1, [1, 2, 3], 0)
+        self.database.get_tracks_page("playlist", 1)
+        self.database.get_track_metadata([1, 2])
+        self.database.search("Track 1")
+        self.database.delete_album(1).result()
+        names = {query["name"]
+                 for query in self.database.get_query_profile()["queries"]}
+        self.assertNotIn(UNLABELLED, names)
+        self.assertIn("MusicDatabase.create_database", names)
+        self.assertIn("MusicDatabase._ingest_tracks", names)
+        self.assertIn("MusicDatabase.get_tracks_page", names)
+
+
+if __name__ == "__main__":
+    unittest.main()
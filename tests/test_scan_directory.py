@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from mutagen.easyid3 import EasyID3
+
+from databasewriter import log_write_errors
+from musicdatabase import MusicDatabase
+from scandirectory import DirectoryScan
+
+# An MPEG audio frame header, padded to the length of one frame.
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\0" * 413
+
+
+def write_mp3(path, title, frames=40):
+    """Write a short silent mp3 file with some tags."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(MP3_FRAME * frames)
+    tags = EasyID3()
+    tags["title"] = title
+    tags["artist"] = "Artist"
+    tags["album"] = "Album"
+    tags.save(path)
+
+
+class ScanTestCase(unittest.TestCase):
+    """Base class scanning music folders in a temporary directory."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.base = self._directory.name
+        self.db_path = os.path.join(self.base, "library.db")
+        self.database = MusicDatabase(self.db_path)
+        self.scan = DirectoryScan(self.database,
+                                  os.path.join(self.base, "directories.txt"),
+                                  batch_size=2)
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def library(self):
+        """Return the `track_id` of each file path in the library."""
+        connection = sqlite3.connect(self.db_path)
+        paths = dict(connection.execute(
+            "SELECT file_path, track_id FROM tracks"
+        ))
+        connection.close()
+        return paths
+
+
+class TestScanWrites(ScanTestCase):
+    """Writes queued by scans are checked before the scan ends."""
+
+    def test_scan_adds_the_files_found(self):
+        music = os.path.join(self.base, "music")
+        for number in range(3):
+            write_mp3(os.path.join(music, f"{number}.mp3"), f"Song {number}")
+        self.scan.add_directory(music)
+        self.assertEqual(len(self.library()), 3)
+
+    def test_failed_ingest_is_raised_by_the_scan(self):
+        music = os.path.join(self.base, "music")
+        for number in range(3):
+            write_mp3(os.path.join(music, f"{number}.mp3"), f"Song {number}")
+
+        with mock.patch.object(MusicDatabase, "_ingest_tracks",
+                               side_effect=sqlite3.OperationalError("full")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.scan.scan_directory([music])
+
+    def test_failed_rebuild_leaves_the_directory_as_it_was(self):
+        music = os.path.join(self.base, "music")
+        for number in range(3):
+            write_mp3(os.path.join(music, f"{number}.mp3"), f"Song {number}")
+        self.scan.add_directory(music)
+        before = self.library()
+
+        with mock.patch.object(MusicDatabase, "_ingest_tracks",
+                               side_effect=sqlite3.OperationalError("full")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.scan.rebuild_directory(music)
+        self.assertEqual(self.library(), before)
+
+
+class TestMovedFiles(ScanTestCase):
+    """Moved files keep their tracks, but copies don't take them."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = os.path.join(self.base, "first")
+        self.second = os.path.join(self.base, "second")
+        write_mp3(os.path.join(self.first, "a.mp3"), "A")
+        write_mp3(os.path.join(self.second, "b.mp3"), "B", frames=50)
+        self.scan.add_directory(self.first)
+        self.scan.add_directory(self.second)
+        self.track_ids = self.library()
+
+    def test_renamed_file_keeps_its_track(self):
+        old_path = os.path.join(self.first, "a.mp3")
+        new_path = os.path.join(self.first, "renamed.mp3")
+        os.rename(old_path, new_path)
+        self.scan.scan_directory()
+        library = self.library()
+        self.assertEqual(library[new_path], self.track_ids[old_path])
+        self.assertNotIn(old_path, library)
+
+    def test_file_moved_between_directories_keeps_its_track(self):
+        old_path = os.path.join(self.second, "b.mp3")
+        new_path = os.path.join(self.first, "b.mp3")
+        os.rename(old_path, new_path)
+        # Only the directory the file was moved into is scanned.
+        self.scan.scan_directory([self.first])
+        library = self.library()
+        self.assertEqual(library[new_path], self.track_ids[old_path])
+        self.assertNotIn(old_path, library)
+
+    def test_copy_from_a_disconnected_drive_keeps_the_track(self):
+        old_path = os.path.join(self.second, "b.mp3")
+        copy_path = os.path.join(self.first, "b.mp3")
+        with open(old_path, "rb") as source, open(copy_path, "wb") as copy:
+            copy.write(source.read())
+        os.utime(copy_path, ns=(os.stat(old_path).st_atime_ns,
+                                os.stat(old_path).st_mtime_ns))
+        # The drive holding the second directory is disconnected.
+        os.rename(self.second, self.second + "-unplugged")
+
+        self.scan.scan_directory()
+        library = self.library()
+        self.assertEqual(library[old_path], self.track_ids[old_path])
+        self.assertNotEqual(library.get(copy_path), self.track_ids[old_path])
+
+
+class TestLogWriteErrors(unittest.TestCase):
+    """Writes nobody waits for have their errors logged."""
+
+    def test_failed_write_is_logged(self):
+        future = log_write_errors(Future())
+        with self.assertLogs("databasewriter", "ERROR"):
+            future.set_exception(sqlite3.IntegrityError("constraint"))
+
+    def test_successful_write_is_not_logged(self):
+        future = log_write_errors(Future())
+        with self.assertNoLogs("databasewriter"):
+            future.set_result(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+from searchdatabase import RANKED_MATCH_LIMIT
+
+
+class TestSearch(unittest.TestCase):
+    """Every word of a query is prefix-matched in any column."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._directory = tempfile.TemporaryDirectory()
+        cls.database = MusicDatabase(
+            os.path.join(cls._directory.name, "library.db")
+        )
+        # Every track is tagged Rock or Jazz, so those words match too
+        # many tracks to be ranked.
+        records = [track_record(number, genre=["Rock", "Jazz"][number % 2])
+                   for number in range(2 * RANKED_MATCH_LIMIT + 100)]
+        records += [
+            track_record(1, "special", track_name="Rockaway Beach",
+                         artist="Ramones", album="Rocket to Russia"),
+            track_record(2, "special", track_name="Blue Train",
+                         artist="John Coltrane", album="Blue Train",
+                         genre="Jazz"),
+        ]
+        cls.database.ingest_tracks(records).result()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.close()
+        cls._directory.cleanup()
+
+    def _names(self, track_ids):
+        tracks = self.database.get_track_metadata(track_ids)
+        return [tracks[track_id]["track_name"] for track_id in track_ids]
+
+    def test_ranked_title_matches_come_first(self):
+        self.assertEqual(self._names(self.database.search("rockaw")),
+                         ["Rockaway Beach"])
+        self.assertEqual(self._names(self.database.search("blue train"))[0],
+                         "Blue Train")
+
+    def test_words_match_across_columns(self):
+        self.assertEqual(self._names(self.database.search("coltrane blue")),
+                         ["Blue Train"])
+
+    def test_broad_query_puts_title_matches_first(self):
+        names = self._names(self.database.search("rock", limit=5))
+        self.assertEqual(len(names), 5)
+        self.assertEqual(names[0], "Rockaway Beach")
+
+    def test_broad_words_across_columns(self):
+        # "jazz" is broad and only in the genre, "library" only in the
+        # title, so no single column holds both.
+        names = self._names(self.database.search("jazz library", limit=5))
+        self.assertEqual(len(names), 5)
+        self.assertTrue(all(name.startswith("library") for name in names))
+
+    def test_no_words(self):
+        self.assertEqual(self.database.search(" - "), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.syntheticlibrary import track_record
+from musicdatabase import MusicDatabase
+
+# How long the worker threads run, in seconds.
+STRESS_SECONDS = float(os.environ.get("STRESS_SECONDS", "3"))
+THREAD_COUNT = 16
+LIBRARY_SIZE = 3000
+PLAYLIST_COUNT = 8
+
+
+class _Rollback(Exception):
+    """Raised to roll back a batch on purpose."""
+
+
+class TestThreadSafety(unittest.TestCase):
+    """Use one `MusicDatabase` from many threads at once."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, "library.db")
+        self.database = MusicDatabase(
+            self.db_path,
+            snapshot_path=os.path.join(self._directory.name, "library.snap")
+        )
+        self.database.ingest_tracks(
+            [track_record(number) for number in range(LIBRARY_SIZE)]
+        ).result()
+        for number in range(PLAYLIST_COUNT):
+            self.database.create_playlist(f"Playlist {number}").result()
+        self.database.refresh_library_snapshot()
+
+        self.errors = []
+        self.plays_recorded = 0
+        self._counter_lock = threading.Lock()
+
+    def tearDown(self):
+        self.database.close()
+        self._directory.cleanup()
+
+    def _worker(self, number, deadline):
+        """Make random reads and writes until the deadline."""
+        database = self.database
+        rng = random.Random(number)
+        folder = f"worker{number}"
+        added = []
+        next_track = 0
+        while time.monotonic() < deadline:
+            operation = rng.random()
+            try:
+                if operation < 0.10:
+                    batch = range(next_track, next_track + 20)
+                    next_track += 20
+                    database.ingest_tracks(
+                        [track_record(n, folder) for n in batch]
+                    ).result()
+                    paths = set(database.get_paths_under(f"/music/{folder}"))
+                    # A thread always reads its own writes.
+                    self.assertLessEqual(
+                        {f"/music/{folder}/{n}.mp3" for n in batch}, paths
+                    )
+                    added.extend(batch)
+                elif operation < 0.16 and added:
+                    removed = [added.pop(rng.randrange(len(added)))
+                               for _ in range(min(5, len(added)))]
+                    removed_paths = {f"/music/{folder}/{n}.mp3"
+                                     for n in removed}
+                    database.remove_by_paths(list(removed_paths)).result()
+                    paths = set(database.get_paths_under(f"/music/{folder}"))
+                    self.assertFalse(removed_paths & paths)
+                elif operation < 0.30:
+                    playlist_id = rng.randint(1, PLAYLIST_COUNT)
+                    track_id = rng.randint(1, LIBRARY_SIZE)
+                    database.add_to_playlist(track_id, playlist_id).result()
+                    self.assertIn(track_id,
+                                  database.get_playlist_tracks(playlist_id))
+                elif operation < 0.36:
+                    playlist_id = rng.randint(1, PLAYLIST_COUNT)
+                    tracks = database.get_playlist_tracks(playlist_id)
+                    if len(tracks) > 2:
+                        database.move_track(playlist_id,
+                                            rng.randrange(len(tracks)),
+                                            rng.randrange(len(tracks)))
+                        database.remove_from_playlist(rng.choice(tracks),
+                                                      playlist_id)
+                elif operation < 0.44:
+                    database.record_play(rng.randint(1, LIBRARY_SIZE),
+                                         skipped=rng.random() < 0.3)
+                    with self._counter_lock:
+                        self.plays_recorded += 1
+                elif operation < 0.50:
+                    self._batch(rng)
+                elif operation < 0.53:
+                    # A snapshot reads a single committed state.
+                    with database.snapshot():
+                        track_count, _ = database.get_collection_stats(
+                            "all songs"
+                        )
+                        self.assertEqual(track_count,
+                                         len(database.get_all_tracks()))
+                elif operation < 0.55:
+                    database.refresh_library_snapshot()
+                else:
+                    self._read(rng)
+            except _Rollback:
+                pass
+            except Exception:
+                self.errors.append(traceback.format_exc())
+
+    def _batch(self, rng):
+        """Add tracks to a playlist in a batch, sometimes rolling back."""
+        with self.database.batch():
+            playlist_id = rng.randint(1, PLAYLIST_COUNT)
+            before = len(self.database.get_playlist_tracks(playlist_id))
+            for track_id in rng.sample(range(1, LIBRARY_SIZE + 1), 5):
+                self.database.add_to_playlist(track_id, playlist_id).result()
+            # A batch reads its own writes before they are committed.
+            self.assertEqual(
+                len(self.database.get_playlist_tracks(playlist_id)),
+                before + 5
+            )
+            if rng.random() < 0.3:
+                raise _Rollback()
+
+    def _read(self, rng):
+        """Make one of the reads the displays make."""
+        database = self.database
+        choice = rng.random()
+        if choice < 0.3:
+            page, _ = database.get_tracks_page(limit=50)
+            database.get_track_metadata(page)
+        elif choice < 0.5:
+            track_id = rng.randint(1, LIBRARY_SIZE)
+            database.get_path(track_id)
+            database.get_duration(track_id)
+        elif choice < 0.7:
+            database.search(f"Album {rng.randint(0, 60)}")
+        elif choice < 0.85:
+            database.get_collection_stats("album", rng.randint(1, 200))
+        else:
+            database.get_playlists()
+            database.get_all_albums("artist")
+
+    def test_concurrent_reads_and_writes(self):
+        deadline = time.monotonic() + STRESS_SECONDS
+        with ThreadPoolExecutor(THREAD_COUNT) as executor:
+            list(executor.map(self._worker, range(THREAD_COUNT),
+                              [deadline] * THREAD_COUNT))
+        self.assertEqual(self.errors, [], "\n".join(self.errors[:3]))
+
+        # Short-lived threads don't leave connections behind.
+        open_before = self.database.get_connection_stats()["open_connections"]
+        for _ in range(40):
+            thread = threading.Thread(
+                target=self.database.get_collection_stats, args=("all songs",)
+            )
+            thread.start()
+            thread.join()
+        self.database.get_collection_stats("all songs")
+        self.assertLessEqual(
+            self.database.get_connection_stats()["open_connections"],
+            open_before + 1
+        )
+
+        self.database.remove_orphans().result()
+        self.database.refresh_library_snapshot()
+        self.database.verify_query_plans()
+        self.database.close()
+        self._check_consistent()
+
+    def test_reads_during_snapshot_refreshes(self):
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    count, _ = self.database.get_collection_stats("all songs")
+                    self.assertGreaterEqual(count, LIBRARY_SIZE)
+                    tracks = self.database.get_track_metadata([1, 2, 3])
+                    self.assertEqual(tracks[2]["file_path"],
+                                     "/music/library/1.mp3")
+                except Exception:
+                    self.errors.append(traceback.format_exc())
+                    return
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for number in range(30):
+                self.database.ingest_tracks(
+                    [track_record(number, "refresh")]
+                ).result()
+                # Readers which saw the snapshot being served are still
+                # reading it when the refresh replaces it.
+                self.database._serving_snapshot = True
+                self.database.refresh_library_snapshot()
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.errors, [], "\n".join(self.errors[:3]))
+
+    def _check_consistent(self):
+        """Check the stored stats and keys against the rows."""
+        connection = sqlite3.connect(self.db_path)
+        query = lambda sql: connection.execute(sql).fetchall()
+        self.assertEqual(
+            query('''SELECT track_count, ROUND(total_duration, 3)
+                  FROM collection_stats
+                  WHERE collection_type = 'all songs' '''),
+            query('''SELECT COUNT(*), ROUND(COALESCE(SUM(duration), 0), 3)
+                  FROM tracks''')
+        )
+        grouped = {
+            "album": '''SELECT album_id, COUNT(*), ROUND(SUM(duration), 3)
+                     FROM tracks GROUP BY album_id ORDER BY 1''',
+            "artist": '''SELECT artist_id, COUNT(*), ROUND(SUM(duration), 3)
+                      FROM tracks GROUP BY artist_id ORDER BY 1''',
+            "playlist": '''SELECT playlist_id, COUNT(*),
+                        ROUND(SUM(duration), 3)
+                        FROM playlist_tracks JOIN tracks USING (track_id)
+                        GROUP BY playlist_id ORDER BY 1''',
+            "genre": '''SELECT genre_id, COUNT(*), ROUND(SUM(duration), 3)
+                     FROM track_genres JOIN tracks USING (track_id)
+                     GROUP BY genre_id ORDER BY 1''',
+        }
+        for collection_type, expected in grouped.items():
+            with self.subTest(collection_type=collection_type):
+                self.assertEqual(
+                    query(f'''SELECT collection_id, track_count,
+                          ROUND(total_duration, 3) FROM collection_stats
+                          WHERE collection_type = '{collection_type}'
+                          AND track_count > 0 ORDER BY 1'''),
+                    query(expected)
+                )
+        self.assertEqual(query("SELECT COUNT(*) FROM track_search"),
+                         query("SELECT COUNT(*) FROM tracks"))
+        self.assertEqual(
+            query('''SELECT COALESCE(SUM(play_count), 0),
+                  COALESCE(SUM(skip_count), 0) FROM tracks'''),
+            query('''SELECT COALESCE(SUM(NOT skipped), 0),
+                  COALESCE(SUM(skipped), 0) FROM play_events''')
+        )
+        self.assertLessEqual(
+            query("SELECT COUNT(*) FROM play_events")[0][0],
+            self.plays_recorded
+        )
+        self.assertEqual(
+            query('''SELECT COUNT(*) FROM (
+                  SELECT 1 FROM playlist_tracks
+                  GROUP BY playlist_id, position HAVING COUNT(*) > 1)'''),
+            [(0,)]
+        )
+        self.assertEqual(query("PRAGMA foreign_key_check"), [])
+        self.assertEqual(query("PRAGMA integrity_check"), [("ok",)])
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,106 @@
-import sqlite3
+import json
+import os
 
+from connectionmanager import ConnectionManager
 from artistsdatabase import ArtistsDatabase
 from albumsdatabase import AlbumsDatabase
-from playlistsdatabase import PlaylistDatabase
+from genresdatabase import GenresDatabase, split_genres
+
+# Orders that tracks can be listed in. Each order names the tables it
+# reads, its sort key columns and whether it is descending. The keys
+# end with a unique column, so a page boundary is never ambiguous, and
+# each order is read straight from an index rather than sorted. Orders
+# listing `filters` can also be used within a single album, artist or
+# genre, matching the column in their `filter_table`, which is `tracks`
+# unless given. Orders that don't read `tracks` name their `id_column`.
+# Orders with a `condition` only list the tracks matching it.
+TRACK_SORT_ORDERS = {
+    "track_name": {
+        "source": "tracks",
+        "keys": ("tracks.track_name COLLATE NOCASE", "tracks.track_id"),
+    },
+    "artist": {
+        "source": "artists CROSS JOIN tracks"
+                  " ON tracks.artist_id = artists.artist_id",
+        "keys": ("artists.artist_name COLLATE NOCASE", "artists.artist_id",
+                 "tracks.track_id"),
+    },
+    "album": {
+        "source": "albums CROSS JOIN tracks"
+                  " ON tracks.album_id = albums.album_id",
+        "keys": ("albums.album_name COLLATE NOCASE", "albums.album_id",
+                 "tracks.track_number", "tracks.track_id"),
+    },
+    "release_date": {
+        "source": "tracks",
+        "keys": ("tracks.release_date", "tracks.track_id"),
+    },
+    "duration": {
+        "source": "tracks",
+        "keys": ("tracks.duration", "tracks.track_id"),
+    },
+    "date_added": {
+        "source": "tracks",
+        "keys": ("tracks.date_added", "tracks.track_id"),
+        "descending": True,
+    },
+    "play_count": {
+        "source": "tracks",
+        "keys": ("tracks.play_count", "tracks.track_id"),
+        "descending": True,
+    },
+    "last_played": {
+        "source": "tracks",
+        "keys": ("tracks.last_played", "tracks.track_id"),
+        "descending": True,
+    },
+    "most_played": {
+        "source": "tracks",
+        "keys": ("tracks.play_count", "tracks.track_id"),
+        "descending": True,
+        "condition": "tracks.play_count > 0",
+    },
+    "recently_played": {
+        "source": "tracks",
+        "keys": ("tracks.last_played", "tracks.track_id"),
+        "descending": True,
+        "condition": "tracks.last_played > 0",
+    },
+    "track_number": {
+        "source": "tracks",
+        "keys": ("tracks.track_number", "tracks.track_id"),
+        "filters": ("album_id",),
+    },
+    "track_id": {
+        "source": "tracks",
+        "keys": ("tracks.track_id",),
+        "filters": ("artist_id",),
+    },
+    "genre_track_id": {
+        "source": "track_genres",
+        "id_column": "track_genres.track_id",
+        "keys": ("track_genres.track_id",),
+        "filters": ("genre_id",),
+        "filter_table": "track_genres",
+    },
+}
+
+
+def directory_range(directory):
+    """
+    Return the range of file paths inside a directory.
+
+    Paths are compared as bytes, so every path in the directory sorts
+    from the directory and its separator up to, but not including, the
+    directory followed by the next character after the separator.
+
+    Returns
+    -------
+    tuple of str
+        The lower bound, included, and the upper bound, excluded.
+    """
+    prefix = os.path.join(directory, "")
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 class TrackDatabase:
@@ -13,71 +111,72 @@ class TrackDatabase:
     `MusicDatabase` class provides the interface for database operations.
     """
 
-    def __init__(self, db_path,
+    def __init__(self, connection_manager: ConnectionManager,
                  artist_database: ArtistsDatabase,
                  albums_database: AlbumsDatabase,
-                 playlist_database: PlaylistDatabase):
+                 genres_database: GenresDatabase):
         """
         Initialise a `TrackDatabase` instance.
 
         Parameters
         ----------
-        db_path : str
-            Path to the database.
+        connection_manager : ConnectionManager
+            The manager providing connections to the database.
         artist_database : ArtistsDatabase
             Instance of `ArtistsDatabase.
         albums_database : AlbumsDatabase
             Instance of `AlbumsDatabase`.
-        playlist_database : PlaylistDatabase
-            Instance of `PlaylistDatabase`.
+        genres_database : GenresDatabase
+            Instance of `GenresDatabase`.
         """
-        self._db_path = db_path
+        self._connection_manager = connection_manager
         self._artist_database = artist_database
         self._albums_database = albums_database
-        self._playlist_database = playlist_database
+        self._genres_database = genres_database
         self.create_database()
 
     def create_database(self):
         """Create the tracks table if it doesn't exist."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-
         # Tracks database
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS tracks (
-                track_id INTEGER PRIMARY KEY,
-                track_name TEXT NOT NULL,
-                release_date TEXT NOT NULL,
-                genre TEXT NOT NULL,
-                duration REAL NOT NULL,
-                file_path  TEXT NOT NULL UNIQUE,
-                track_number INTEGER NOT NULL,
-                album_id INTEGER NOT NULL,
-                artist_id INTEGER NOT NULL,
-                FOREIGN KEY(album_id) REFERENCES albums(album_id),
-                FOREIGN KEY (artist_id) REFERENCES artists(artist_id)
-            ) 
-        ''')
-        con.commit()
-        con.close()
+        with self._connection_manager.transaction():
+            self._connection_manager.execute('''
+                CREATE TABLE IF NOT EXISTS tracks (
+                    track_id INTEGER PRIMARY KEY,
+                    track_name TEXT NOT NULL,
+                    release_date TEXT NOT NULL,
+                    genre TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    file_path  TEXT NOT NULL UNIQUE,
+                    track_number INTEGER NOT NULL,
+                    album_id INTEGER NOT NULL,
+                    artist_id INTEGER NOT NULL,
+                    FOREIGN KEY(album_id) REFERENCES albums(album_id),
+                    FOREIGN KEY (artist_id) REFERENCES artists(artist_id)
+                )
+            ''')
 
     def track_exists(self, file_path):
         """Return True if the file path is in the database and False otherwise."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('SELECT 1 FROM tracks WHERE file_path = ?', (file_path,))
+        cur = self._connection_manager.execute(
+            'SELECT 1 FROM tracks WHERE file_path = ?', (file_path,)
+        )
         exists = cur.fetchone() is not None
-        con.close()
         return exists
 
-    def track_is_duplicate(self, track_name, artist, album, release_date):
-        """Return True if track is already in the database, False otherwise."""
+    def track_is_duplicate(self, track_name, artist, album, release_date,
+                           album_artist=None):
+        """
+        Return True if track is already in the database, False otherwise.
+
+        The album is filed under `album_artist`, or under `artist` if
+        there is none, as in `MusicDatabase.ingest_tracks()`.
+        """
         artist_id = self._artist_database.get_artist_id(artist)
-        album_id = self._albums_database.get_album_id(album, release_date)
+        album_id = self._albums_database.get_album_id(
+            album, album_artist or artist, release_date
+        )
 
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT 1 FROM tracks
             WHERE track_name = ?
             AND artist_id = ?
@@ -86,124 +185,363 @@ class TrackDatabase:
         ''', (track_name, artist_id, album_id, release_date))
 
         is_duplicate = cur.fetchone() is not None
-        con.close()
         return is_duplicate
 
     def insert_track(self, track_name, artist, album, track_number,
                      release_date, genre, duration, file_path):
-        """Add a track to the database."""
+        """
+        Add a track to the database.
+
+        `genre` is the list of the track's genres, or a single genre.
+
+        Returns
+        -------
+        dict
+            Dictionary with the lists of `"tracks"`, `"albums"` and
+            `"genres"` written, for the cache to drop.
+        """
         artist_id = self._artist_database.get_artist_id(artist)
-        album_id = self._albums_database.get_album_id(album, release_date)
+        genre_names = split_genres(genre)
+
+        with self._connection_manager.transaction():
+            album_id = self._albums_database.upsert_album(album, artist_id,
+                                                          release_date)
+            genre_ids = self._genres_database.upsert_genres(genre_names)
+            cur = self._connection_manager.execute('''
+                INSERT INTO tracks (
+                    track_name,
+                    artist_id,
+                    album_id,
+                    track_number,
+                    release_date,
+                    genre,
+                    duration,
+                    file_path,
+                    date_added
+                    )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?,
+                    CAST(strftime('%s', 'now') AS INTEGER))
+                RETURNING track_id
+            ''', (track_name, artist_id, album_id, track_number,
+                  release_date, "; ".join(genre_names), duration, file_path))
+            track_id = cur.fetchone()[0]
+            self._genres_database.add_track_genres(
+                (track_id, genre_ids[name]) for name in genre_names
+            )
+        return {"tracks": [track_id], "albums": [album_id],
+                "genres": list(genre_ids.values())}
+
+    def insert_tracks(self, tracks):
+        """
+        Add a batch of tracks whose artist and album ids are resolved.
 
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
+        A track is skipped if its file path is already in the database,
+        or if a track with the same title, artist, album and release
+        date exists (untitled tracks are never treated as duplicates).
+        Must be called inside a transaction.
+
+        Parameters
+        ----------
+        tracks : list of dict
+            Dictionaries with the `tracks` column names as keys, and the
+            track's `genre_ids`. A file whose fingerprint isn't known
+            has a `file_size` and `file_mtime` of 0 and no
+            `content_hash`.
+
+        Returns
+        -------
+        list of int
+            The `track_id`s of the tracks added.
+        """
+        # Rowids are handed out above the largest in use, so the tracks
+        # added are exactly those after it.
+        cur = self._connection_manager.execute(
+            'SELECT MAX(track_id) FROM tracks'
+        )
+        last_track_id = cur.fetchone()[0] or 0
+
+        self._connection_manager.executemany('''
             INSERT INTO tracks (
                 track_name,
-                artist_id, 
-                album_id, 
-                track_number, 
-                release_date, 
-                genre, 
-                duration, 
-                file_path
+                artist_id,
+                album_id,
+                track_number,
+                release_date,
+                genre,
+                duration,
+                file_path,
+                file_size,
+                file_mtime,
+                content_hash,
+                date_added
                 )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (track_name, artist_id, album_id, track_number,
-              release_date, genre, duration, file_path))
-        con.commit()
-        con.close()
-
-    def get_all_tracks(self):
-        """Return a list of all `track_id`s in the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
-            SELECT track_id 
-            FROM tracks 
-            ORDER BY track_name 
-            COLLATE NOCASE
-            ''')
-        tracks_rows = cur.fetchall()
-        con.close()
-
-        tracks = []
-        for track_data in tracks_rows:
-            tracks.append(track_data[0])
+            SELECT :track_name, :artist_id, :album_id, :track_number,
+                :release_date, :genre, :duration, :file_path, :file_size,
+                :file_mtime, :content_hash,
+                CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE :track_name = 'Unknown Title' OR NOT EXISTS (
+                SELECT 1 FROM tracks
+                WHERE track_name = :track_name
+                AND artist_id = :artist_id
+                AND album_id = :album_id
+                AND release_date = :release_date
+            )
+            ON CONFLICT (file_path) DO NOTHING
+        ''', tracks)
+
+        genre_ids = {track["file_path"]: track["genre_ids"] for track in tracks}
+        cur = self._connection_manager.execute(
+            'SELECT track_id, file_path FROM tracks WHERE track_id > ?',
+            (last_track_id,)
+        )
+        added = cur.fetchall()
+        self._genres_database.add_track_genres(
+            (track_id, genre_id)
+            for track_id, file_path in added
+            for genre_id in genre_ids[file_path]
+        )
+        return [track_id for track_id, _ in added]
+
+    def get_all_tracks(self, sort_by="track_name"):
+        """
+        Return a list of all `track_id`s in the database.
 
+        Parameters
+        ----------
+        sort_by : str, optional
+            One of the keys of `TRACK_SORT_ORDERS`.
+        """
+        # A negative limit is no limit in SQLite.
+        tracks, _ = self.get_tracks_page(sort_by, limit=-1)
         return tracks
 
+    def get_tracks_page(self, sort_key, after=None, limit=200,
+                        filter_column=None, filter_value=None):
+        """
+        Return one page of `track_id`s in the given order.
+
+        Pages are read with keyset pagination: instead of an offset,
+        each page starts after the sort key of the last track of the
+        previous page, so every page costs the same however deep into
+        the collection it is.
+
+        Parameters
+        ----------
+        sort_key : str
+            One of the keys of `TRACK_SORT_ORDERS`.
+        after : tuple, optional
+            The cursor returned with the previous page. `None` returns
+            the first page.
+        limit : int, optional
+            The maximum number of tracks in the page.
+        filter_column : {"album_id", "artist_id", "genre_id"}, optional
+            A column restricting the tracks to a single album, artist or
+            genre.
+            Only orders listing the column in their `filters` support it.
+        filter_value : int, optional
+            The value of `filter_column` to match.
+
+        Returns
+        -------
+        tuple
+            The list of `track_id`s and the cursor for the next page,
+            which is `None` if the page is empty.
+        """
+        if sort_key not in TRACK_SORT_ORDERS:
+            raise ValueError(f"Unrecognised sort key: {sort_key}")
+        order = TRACK_SORT_ORDERS[sort_key]
+        if (filter_column is not None
+                and filter_column not in order.get("filters", ())):
+            raise ValueError(
+                f"Cannot sort by {sort_key} when filtering on {filter_column}"
+            )
+
+        keys = order["keys"]
+        filters = [order["condition"]] if "condition" in order else []
+        parameters = {"limit": limit, "filter_value": filter_value}
+        if filter_column is not None:
+            filter_table = order.get("filter_table", "tracks")
+            filters.append(f"{filter_table}.{filter_column} = :filter_value")
+
+        if after is None:
+            rows = self._read_tracks(order, filters, parameters)
+        else:
+            # The tracks after the cursor are read one sort key at a
+            # time, deepest first: first the ties on every key but the
+            # last, then on every key but the last two, and so on. Each
+            # step is an equality prefix and a range on one column,
+            # which SQLite can seek to in the index; a row value
+            # comparison on the whole key would only be used for its
+            # first column and scan through any ties.
+            comparison = "<" if order.get("descending", False) else ">"
+            parameters.update((f"key_{i}", value)
+                              for i, value in enumerate(after))
+            rows = []
+            for depth in reversed(range(len(keys))):
+                conditions = filters + [f"{keys[i]} = :key_{i}"
+                                        for i in range(depth)]
+                conditions.append(f"{keys[depth]} {comparison} :key_{depth}")
+                rows.extend(self._read_tracks(order, conditions, parameters))
+                if 0 <= limit <= len(rows):
+                    break
+                if limit >= 0:
+                    parameters["limit"] = limit - len(rows)
+
+        track_ids = [row[0] for row in rows]
+        cursor = tuple(rows[-1][1:]) if rows else None
+        return track_ids, cursor
+
+    def _read_tracks(self, order, conditions, parameters):
+        """Return the track rows of a sort order matching the conditions."""
+        keys = order["keys"]
+        direction = " DESC" if order.get("descending", False) else ""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_by = ", ".join(key + direction for key in keys)
+
+        id_column = order.get("id_column", "tracks.track_id")
+        cur = self._connection_manager.execute(f'''
+            SELECT {id_column}, {', '.join(keys)}
+            FROM {order["source"]}
+            {where}
+            ORDER BY {order_by}
+            LIMIT :limit''', parameters)
+        return cur.fetchall()
+
     def get_track_metadata(self, id_list):
         """
         Return the database data corresponding to the tracks in the list of
         track_ids.
 
+        The artist and album names are joined in the same query, so the
+        rows are fully denormalised.
+
         Returns
         -------
         dict
             A dictionary where keys are `track_id`s and the values are
-            dictionaries containing info about that track.
+            dictionaries containing info about that track. The keys are
+            in the order of `id_list`.
         """
-        id_tuple = tuple(id_list)
-        expression = '(' + ','.join('?' for _ in id_tuple) + ')'
+        return dict(self.iter_track_metadata(id_list))
 
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute(f'''
+    def iter_track_metadata(self, id_list):
+        """
+        Iterate over the data for each track in the list of track_ids.
+
+        The ids are passed to SQLite as a single JSON array and joined
+        through `json_each`, so the statement is the same however many
+        ids there are. The statement is executed when this is called,
+        and its rows are read in the order of `id_list` as the iterator
+        is advanced.
+
+        Returns
+        -------
+        iterator of tuple
+            `(track_id, track)` pairs, where `track` is a dictionary
+            containing info about that track.
+        """
+        ids_json = json.dumps([int(track_id) for track_id in id_list])
+
+        # CROSS JOIN keeps `json_each` as the outer loop, so rows come
+        # back in the order of the id list without a sort.
+        cur = self._connection_manager.execute('''
+            SELECT tracks.track_id,
+                tracks.track_name,
+                tracks.artist_id,
+                tracks.album_id,
+                tracks.release_date,
+                tracks.file_path,
+                tracks.duration,
+                tracks.track_number,
+                artists.artist_name,
+                albums.album_name
+            FROM json_each(?) AS ids
+            CROSS JOIN tracks ON tracks.track_id = ids.value
+            JOIN artists ON artists.artist_id = tracks.artist_id
+            JOIN albums ON albums.album_id = tracks.album_id''', (ids_json,))
+        return _track_metadata_rows(cur)
+
+    def get_display_rows(self):
+        """
+        Return the displayed columns of every track in "all songs" order.
+
+        The order is read from the covering index and the rows from one
+        pass over the table, with the artist and album names joined in
+        memory. This is about twice as fast as joining them in the
+        query, which reads the tracks in index order and so visits the
+        table in random order.
+
+        Returns
+        -------
+        list of tuple
+            `(track_id, track_name, artist_id, album_id, release_date,
+            file_path, duration, track_number, artist_name, album_name)`
+            rows.
+        """
+        order = TRACK_SORT_ORDERS["track_name"]
+        cur = self._connection_manager.execute(f'''
+            SELECT tracks.track_id
+            FROM tracks
+            ORDER BY {', '.join(order["keys"])}''')
+        track_ids = [row[0] for row in cur.fetchall()]
+
+        artist_names = dict(self._connection_manager.execute(
+            'SELECT artist_id, artist_name FROM artists /* full scan */'
+        ).fetchall())
+        album_names = dict(self._connection_manager.execute(
+            'SELECT album_id, album_name FROM albums /* full scan */'
+        ).fetchall())
+        cur = self._connection_manager.execute('''
             SELECT track_id,
                 track_name,
-                artist_id, 
-                album_id, 
-                release_date, 
-                file_path, 
-                duration
-            FROM tracks
-            WHERE track_id IN {expression}''', id_tuple)
-        tracks_rows = cur.fetchall()
-        con.close()
-
-        tracks = {}
-        for track_data in tracks_rows:
-            track_id = track_data[0]
-            track = {
-                "track_id": track_id,
-                'track_name': track_data[1],
-                'artist': track_data[2],
-                'album': track_data[3],
-                'release_date': track_data[4],
-                'file_path': track_data[5],
-                'duration': track_data[6]
-            }
-            tracks[track_id] = track
+                artist_id,
+                album_id,
+                release_date,
+                file_path,
+                duration,
+                track_number
+            FROM tracks /* full scan */''')
+        rows = {row[0]: row + (artist_names[row[2]], album_names[row[3]])
+                for row in cur}
+        return [rows[track_id] for track_id in track_ids]
+
+    def get_newest_keys(self):
+        """
+        Return the largest `track_id` and `date_added` of any track.
 
-        return tracks
+        Together with the track count and duration they tell whether
+        tracks were added or removed: a new track is given an id above
+        the largest, or the largest again if that track was deleted, in
+        which case its `date_added` is later.
+        """
+        # Each MAX reads one end of an index only in its own subquery.
+        cur = self._connection_manager.execute('''
+            SELECT (SELECT MAX(track_id) FROM tracks),
+                (SELECT MAX(date_added) FROM tracks)
+        ''')
+        max_track_id, max_date_added = cur.fetchone()
+        return max_track_id or 0, max_date_added or 0
 
     def get_path(self, track_id):
         """Return the file path of the given track."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('SELECT file_path FROM tracks WHERE track_id = ?',
-                    (track_id,))
+        cur = self._connection_manager.execute(
+            'SELECT file_path FROM tracks WHERE track_id = ?', (track_id,)
+        )
         file_path = cur.fetchone()[0]
-        con.close()
 
         return file_path
 
     def get_duration(self, track_id):
         """Return the duration of a track."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('SELECT duration FROM tracks WHERE track_id = ?',
-                    (track_id,))
+        cur = self._connection_manager.execute(
+            'SELECT duration FROM tracks WHERE track_id = ?', (track_id,)
+        )
         duration = cur.fetchone()[0]
-        con.close()
         return duration
 
     def get_all_paths(self):
         """Return a list containing all the file paths in the database."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
-        cur.execute('''
+        cur = self._connection_manager.execute('''
             SELECT file_path FROM tracks
         ''')
         path_rows = cur.fetchall()
@@ -211,27 +549,150 @@ class TrackDatabase:
         paths = [row[0] for row in path_rows]
         return paths
 
-    def remove_by_paths(self, file_paths):
-        """Remove database entries corresponding to the file paths."""
-        con = sqlite3.connect(self._db_path)
-        cur = con.cursor()
+    def get_paths_under(self, directory):
+        """
+        Return the file paths of the tracks inside a directory.
+
+        The paths are read as a range of the `file_path` index, so the
+        cost depends on the tracks in the directory rather than in the
+        library.
+        """
+        cur = self._connection_manager.execute('''
+            SELECT file_path FROM tracks
+            WHERE file_path >= ? AND file_path < ?
+        ''', directory_range(directory))
+        return [row[0] for row in cur.fetchall()]
 
-        track_ids = []
+    def get_fingerprints_under(self, directory):
+        """
+        Return the fingerprints of the tracks inside a directory.
 
-        for file_path in file_paths:
-            cur.execute('''
-            SELECT track_id
+        Returns
+        -------
+        dict
+            Dictionary mapping each file path to its `(file_size,
+            file_mtime, content_hash)`. The hash is `None` if the file
+            hasn't been read since it was added.
+        """
+        cur = self._connection_manager.execute('''
+            SELECT file_path, file_size, file_mtime, content_hash
             FROM tracks
-            WHERE file_path = ?
-            ''', (file_path,))
-            track_id = cur.fetchone()[0]
-            track_ids.append(track_id)
+            WHERE file_path >= ? AND file_path < ?
+        ''', directory_range(directory))
+        return {row[0]: row[1:] for row in cur}
 
-            cur.execute('''
-            DELETE FROM tracks WHERE file_path = ?
-            ''', (file_path,))
+    def get_tracks_by_fingerprint(self, fingerprints):
+        """
+        Return the tracks whose files have the given fingerprints.
+
+        Parameters
+        ----------
+        fingerprints : iterable of tuple
+            `(file_size, content_hash)` pairs.
 
-        con.commit()
-        con.close()
-        for track_id in track_ids:
-            self._playlist_database.remove_from_all(track_id)
+        Returns
+        -------
+        dict
+            Dictionary mapping each pair found to a list of the
+            `(track_id, file_path)` of the tracks with it.
+        """
+        fingerprints_json = json.dumps(list(dict.fromkeys(fingerprints)))
+        cur = self._connection_manager.execute('''
+            SELECT tracks.file_size, tracks.content_hash,
+                tracks.track_id, tracks.file_path
+            FROM json_each(?) AS fingerprints
+            CROSS JOIN tracks
+            ON tracks.file_size = json_extract(fingerprints.value, '$[0]')
+            AND tracks.content_hash = json_extract(fingerprints.value, '$[1]')
+        ''', (fingerprints_json,))
+
+        tracks = {}
+        for file_size, content_hash, track_id, file_path in cur:
+            tracks.setdefault((file_size, content_hash), []).append(
+                (track_id, file_path)
+            )
+        return tracks
+
+    def update_fingerprints(self, fingerprints):
+        """
+        Store the fingerprints of files which are already tracks.
+
+        Parameters
+        ----------
+        fingerprints : list of tuple
+            `(file_path, file_size, file_mtime, content_hash)` for each
+            file.
+        """
+        with self._connection_manager.transaction():
+            self._connection_manager.executemany('''
+                UPDATE tracks
+                SET file_size = ?2, file_mtime = ?3, content_hash = ?4
+                WHERE file_path = ?1
+            ''', fingerprints)
+
+    def relocate_tracks(self, moves):
+        """
+        Point tracks at the new paths of their moved files.
+
+        The tracks keep their ids, so their playlist entries, genres
+        and play history are kept.
+
+        Parameters
+        ----------
+        moves : list of tuple
+            `(track_id, file_path, file_size, file_mtime)` for each
+            moved file.
+
+        Returns
+        -------
+        list of int
+            The `track_id`s of the moved tracks.
+        """
+        with self._connection_manager.transaction():
+            self._connection_manager.executemany('''
+                UPDATE tracks
+                SET file_path = ?2, file_size = ?3, file_mtime = ?4
+                WHERE track_id = ?1
+            ''', moves)
+        return [move[0] for move in moves]
+
+    def remove_by_paths(self, file_paths):
+        """
+        Remove database entries corresponding to the file paths.
+
+        The tracks are deleted with one statement, which cascades to
+        their playlist entries and genre links.
+
+        Returns
+        -------
+        list of int
+            The `track_id`s of the removed tracks.
+        """
+        paths_json = json.dumps(list(file_paths))
+
+        with self._connection_manager.transaction():
+            cur = self._connection_manager.execute('''
+                DELETE FROM tracks
+                WHERE file_path IN (SELECT value FROM json_each(?))
+                RETURNING track_id
+            ''', (paths_json,))
+            return [row[0] for row in cur]
+
+
+def _track_metadata_rows(cur):
+    """Yield the `(track_id, track)` pair of each row of a cursor."""
+    for track_data in cur:
+        track_id = track_data[0]
+        track = {
+            "track_id": track_id,
+            'track_name': track_data[1],
+            'artist': track_data[2],
+            'album': track_data[3],
+            'release_date': track_data[4],
+            'file_path': track_data[5],
+            'duration': track_data[6],
+            'track_number': track_data[7],
+            'artist_name': track_data[8],
+            'album_name': track_data[9]
+        }
+        yield track_id, track
@@ -2,6 +2,9 @@ from musicdatabase import MusicDatabase
 
 from durationformat import format_duration
 
+SEARCH_RESULT_LIMIT = 200
+PAGE_SIZE = 200
+
 
 class TrackList:
     """
@@ -12,17 +15,24 @@ class TrackList:
     tracklist_updated_observers : list
         List of observers with the `received_tracklist_updated_signal()` method.
     tracklist : list
-        The current list of `track_id`s.
+        The `track_id`s of the current collection loaded so far. Tracks
+        are loaded a page at a time, see `load_tracks()`.
+    is_complete : bool
+        True once every track in the collection has been loaded.
     has_changed : bool
         True if the tracklist has been changed since the last
         interaction with it. False otherwise.
     collection_type : str
-        The type of collection (album, artist, all songs, playlist)
-        that the current tracklist represents.
+        The type of collection (album, artist, all songs, playlist,
+        genre, most played, recently played, search) that the current
+        tracklist represents.
     collection_title : str
         Title of the current collection.
     collection_id : int
         The unique identifier for the collection.
+    sort_key : str
+        The order "all songs" is listed in, one of the
+        `musicdatabase.TRACK_SORTS` keys.
 
     Methods
     -------
@@ -34,8 +44,22 @@ class TrackList:
         Set the tracklist to an artist's tracks.
     received_open_playlist_signal(playlist_id):
         Set the tracklist to a playlist.
+    received_open_genre_signal(genre_id):
+        Set the tracklist to a genre's tracks.
+    received_open_most_played_signal():
+        Set the tracklist to the most played tracks.
+    received_open_recently_played_signal():
+        Set the tracklist to the recently played tracks.
+    received_search_signal(query):
+        Set the tracklist to the results of a search.
+    set_sort_key(sort_key):
+        Change the order of "all songs" and reload the collection.
+    load_tracks(count):
+        Load pages of the collection until `count` tracks are loaded.
     get_tracklist():
-        Return a copy of the current tracklist.
+        Return a copy of the complete current tracklist.
+    get_track_count():
+        Return the number of tracks in the collection.
     get_total_tracklist_duration():
         Return the duration of the tracklist in the format 'hh:mm:ss'.
 
@@ -54,11 +78,14 @@ class TrackList:
 
         self.tracklist_updated_observers = []
         self.tracklist = []
+        self.is_complete = True
         self.has_changed = False
+        self._cursor = None
 
         self.collection_type = None
         self.collection_title = ""
         self.collection_id = None
+        self.sort_key = "track_name"
 
     def get_collection(self, collection_type=None, collection_id=None):
         """
@@ -68,27 +95,34 @@ class TrackList:
         ----------
         collection_type : str, optional
             Type of the collection, "all songs", "album", "artist",
-            "playlist". None will default to all songs.
+            "playlist", "genre", "most played", "recently played".
+            None will default to all songs.
         collection_id : int, optional
             The unique identifier for the collection. If None, the
-            collection will be "all songs".
+            collection will be "all songs", unless it is one of the
+            played collections, which have no identifier.
         """
-        if not collection_type or collection_type == "all songs" or not collection_id:
-            self.tracklist = self._music_db.get_all_tracks()
+        if collection_type == "most played":
+            self.collection_type = "most played"
+            self.collection_title = "Most Played"
+        elif collection_type == "recently played":
+            self.collection_type = "recently played"
+            self.collection_title = "Recently Played"
+        elif not collection_type or collection_type == "all songs" or not collection_id:
             self.collection_type = "all songs"
             self.collection_title = "All Songs"
         elif collection_type == "album":
-            self.tracklist = self._music_db.get_album_tracklist(collection_id)
             self.collection_title = self._music_db.get_album_title(collection_id)
             self.collection_type = "album"
         elif collection_type == "artist":
-            self.tracklist = self._music_db.get_artist_tracklist(collection_id)
             self.collection_title = self._music_db.get_artist_name(collection_id)
             self.collection_type = "artist"
         elif collection_type == "playlist":
             self.collection_type = "playlist"
             self.collection_title = self._music_db.get_playlist_name(collection_id)
-            self.tracklist = self._music_db.get_playlist_tracks(collection_id)
+        elif collection_type == "genre":
+            self.collection_type = "genre"
+            self.collection_title = self._music_db.get_genre_name(collection_id)
         elif collection_type == "favourites":  # Favourites not implemented
             self.collection_type = "favourites"
             self.collection_title = "Favourites"
@@ -97,9 +131,41 @@ class TrackList:
             print("Unrecognised collection type")
             pass
 
+        self.tracklist = []
+        self._cursor = None
+        self.is_complete = self.collection_type == "favourites"
         self.collection_id = collection_id
+        self.load_tracks(PAGE_SIZE)
         self.send_tracklist_updated_signal()
 
+    def set_sort_key(self, sort_key):
+        """Change the order of "all songs" and reload the collection."""
+        self.sort_key = sort_key
+        self.get_collection(self.collection_type, self.collection_id)
+
+    def load_tracks(self, count):
+        """
+        Load pages of the collection until `count` tracks are loaded.
+
+        Parameters
+        ----------
+        count : int
+            The number of tracks wanted in `tracklist`. Fewer are
+            loaded if the collection is smaller.
+        """
+        # Other collections are always listed in their own order.
+        sort_key = self.sort_key if self.collection_type == "all songs" else None
+        while not self.is_complete and len(self.tracklist) < count:
+            track_ids, cursor = self._music_db.get_tracks_page(
+                self.collection_type, self.collection_id, sort_key,
+                after=self._cursor, limit=PAGE_SIZE
+            )
+            self.tracklist.extend(track_ids)
+            if len(track_ids) < PAGE_SIZE:
+                self.is_complete = True
+            else:
+                self._cursor = cursor
+
     def send_tracklist_updated_signal(self):
         """Call `received_tracklist_updated_signal()` on observers."""
         self.has_changed = True
@@ -122,13 +188,53 @@ class TrackList:
         """Set the tracklist to a playlist."""
         self.get_collection('playlist', playlist_id)
 
+    def received_open_genre_signal(self, genre_id):
+        """Set the tracklist to a genre's tracks."""
+        self.get_collection('genre', genre_id)
+
+    def received_open_most_played_signal(self):
+        """Set the tracklist to the most played tracks."""
+        self.get_collection("most played")
+
+    def received_open_recently_played_signal(self):
+        """Set the tracklist to the recently played tracks."""
+        self.get_collection("recently played")
+
+    def received_search_signal(self, query):
+        """Set the tracklist to the results of a search."""
+        self.tracklist = self._music_db.search(query, SEARCH_RESULT_LIMIT)
+        self.collection_type = "search"
+        self.collection_title = f'Search: "{query}"'
+        self.collection_id = None
+        self.is_complete = True
+        self.send_tracklist_updated_signal()
+
     def get_tracklist(self):
-        """Return a copy of the current tracklist."""
+        """Return a copy of the current tracklist, loading all of it."""
+        while not self.is_complete:
+            self.load_tracks(len(self.tracklist) + PAGE_SIZE)
         return self.tracklist.copy()
 
+    def _get_stats(self):
+        """Return the track count and duration of the collection."""
+        if self.collection_type in ("all songs", "album", "artist",
+                                    "playlist", "genre"):
+            return self._music_db.get_collection_stats(self.collection_type,
+                                                       self.collection_id)
+
+        # Other collections, such as search results, are summed directly.
+        tracklist = self.get_tracklist()
+        metadata = self._music_db.get_track_metadata(tracklist)
+        durations = [metadata[track_id]["duration"] for track_id in tracklist]
+        return len(tracklist), sum(durations)
+
+    def get_track_count(self):
+        """Return the number of tracks in the collection."""
+        track_count, _ = self._get_stats()
+        return track_count
+
     def get_total_tracklist_duration(self):
         """Return the duration of the tracklist in the format 'hh:mm:ss'."""
-        metadata = self._music_db.get_track_metadata(self.tracklist)
-        durations = [metadata[track_id]["duration"] for track_id in self.tracklist]
-        formatted_duration = format_duration(sum(durations))
+        _, duration = self._get_stats()
+        formatted_duration = format_duration(duration)
         return formatted_duration
@@ -9,6 +9,7 @@ from sidebarframe import SideBarFrame
 from tracksdisplay import TracksDisplay
 from albumsdisplay import AlbumsDisplay
 from artistdisplay import ArtistsDisplay
+from genresdisplay import GenresDisplay
 from queuedisplay import QueueDisplay
 from allplaylistsdisplay import AllPlaylistsDisplay
 from playlistdisplay import PlaylistDisplay
@@ -31,6 +32,8 @@ class TrackListFrame(tk.Frame):
         Observers for the `received_open_album_signal` method.
     open_artist_page_observers : list
         Observers for the `received_open_artist_page_signal` method.
+    open_genre_observers : list
+        Observers for the `received_open_genre_signal` method.
     add_to_queue_observers : list
         Observers for the `received_add_to_queue_signal` method.
     open_playlist_observers : list
@@ -38,8 +41,8 @@ class TrackListFrame(tk.Frame):
     play_next_observers : list
         Observers for the `received_play_next_signal` method.
     current_display : {TracksDisplay, PlaylistDisplay, AlbumsDisplay,
-                       ArtistsDisplay, QueueDisplay, AllPlaylistsDisplay,
-                       DirectoriesDisplay}
+                       ArtistsDisplay, GenresDisplay, QueueDisplay,
+                       AllPlaylistsDisplay, DirectoriesDisplay}
         The current display being shown.
     """
 
@@ -84,6 +87,7 @@ class TrackListFrame(tk.Frame):
         # The display needs to respond to various actions from other components.
         side_bar_frame.open_album_list_observers.append(self)
         side_bar_frame.open_artist_list_observers.append(self)
+        side_bar_frame.open_genre_list_observers.append(self)
         side_bar_frame.open_queue_observers.append(self)
         side_bar_frame.open_playlist_observers.append(self)
         side_bar_frame.open_directories_observers.append(self)
@@ -137,6 +141,12 @@ class TrackListFrame(tk.Frame):
             self._music_database,
             self.send_open_artist_page_signal
         )
+        self.genres_display = GenresDisplay(
+            self._display_frame,
+            self._display_canvas,
+            self._music_database,
+            self.send_open_genre_signal
+        )
         self.queue_display = QueueDisplay(
             self._display_frame,
             self._display_canvas,
@@ -155,6 +165,7 @@ class TrackListFrame(tk.Frame):
         )
         self.directories_display = DirectoriesDisplay(
             directory_scan,
+            self._track_list,
             self._display_frame
         )
 
@@ -166,6 +177,7 @@ class TrackListFrame(tk.Frame):
         self.play_track_observers = [mixer_controller, play_bar_frame]
         self.open_album_observers = [self._track_list]
         self.open_artist_page_observers = [self._track_list]
+        self.open_genre_observers = [self._track_list]
         self.add_to_queue_observers = [self._mixer_controller]
         self.open_playlist_observers = [self._track_list]
         self.play_next_observers = [mixer_controller]
@@ -187,7 +199,8 @@ class TrackListFrame(tk.Frame):
         # <Configure> event triggers when the scrollable frame changes size.
         display_frame.bind("<Configure>", self._on_frame_configure)
         display_canvas.bind("<Configure>", self._on_canvas_configure)
-        display_canvas.configure(yscrollcommand=scrollbar.set,
+        display_canvas.configure(yscrollcommand=lambda first, last:
+                                 self._on_canvas_scroll(scrollbar, first, last),
                                  bg=self._colour_scheme["grey"], highlightthickness=0)
         display_canvas.grid(row=0, column=0, sticky="news")
         display_canvas.create_window((0, 0), window=display_frame,
@@ -207,6 +220,12 @@ class TrackListFrame(tk.Frame):
         """Update the width of the scrollable_frame to match the canvas width."""
         self._display_canvas.itemconfig("track frame", width=event.width)
 
+    def _on_canvas_scroll(self, scrollbar, first, last):
+        """Update the scrollbar and show more tracks near the bottom."""
+        scrollbar.set(first, last)
+        if float(last) > 0.9 and self.current_display is self.track_display:
+            self.track_display.display_next_page()
+
     def _on_mousewheel(self, event):
         """Scroll the canvas."""
         self._display_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
@@ -238,6 +257,12 @@ class TrackListFrame(tk.Frame):
         self.artist_display.display_artist_list()
         self.current_display = self.artist_display
 
+    def received_open_genre_list_signal(self):
+        """Display the list of genres."""
+        self._clear_display()
+        self.genres_display.display_genre_list()
+        self.current_display = self.genres_display
+
     def received_open_queue_signal(self):
         """Display the queue."""
         self._clear_display()
@@ -283,6 +308,11 @@ class TrackListFrame(tk.Frame):
         for observer in self.open_artist_page_observers:
             observer.received_open_artist_page_signal(artist_id)
 
+    def send_open_genre_signal(self, genre_id):
+        """Call `received_open_genre_signal(genre_id)` on observers."""
+        for observer in self.open_genre_observers:
+            observer.received_open_genre_signal(genre_id)
+
     def send_open_playlist_signal(self, playlist_id):
         """Call `received_open_playlist_signal(playlist_id)` on observers."""
         for observer in self.open_playlist_observers:
@@ -1,10 +1,10 @@
 from functools import partial
 import tkinter as tk
 
-from musicdatabase import MusicDatabase
+from musicdatabase import MusicDatabase, log_write_errors
 from durationformat import format_duration
 from trackitem import TrackItem
-from tracklist import TrackList
+from tracklist import TrackList, PAGE_SIZE
 from mixercontroller import MixerController
 
 from root import colour_scheme
@@ -29,6 +29,8 @@ class TracksDisplay:
     -------
     display_tracklist():
         Display the current tracklist.
+    display_next_page():
+        Display the next page of tracks below those already shown.
     clear_display():
         Remove all widgets on the current display.
     update_highlighted_track(track_id):
@@ -106,43 +108,60 @@ class TracksDisplay:
         """Display the current tracklist."""
         self.clear_display()
         tracks = self._get_tracks()
-        tracks_info = self._music_db.get_track_metadata(tracks)
+        self._display_tracks(tracks)
+
+        # Move to the top of the scrollable canvas.
+        self.display_canvas.yview_moveto(0)
+
+        if not self.widgets_dict:
+            self._empty_tracklist()
+
+    def display_next_page(self):
+        """
+        Display the next page of tracks below those already shown.
+
+        The tracklist is loaded a page at a time, so only the tracks
+        scrolled into view are ever created.
+        """
+        shown = len(self.all_track_widgets)
+        self._track_list.load_tracks(shown + PAGE_SIZE)
+        tracks = self._track_list.tracklist[shown:shown + PAGE_SIZE]
+        if tracks:
+            self._display_tracks(tracks)
+
+    def _display_tracks(self, tracks):
+        """Create track items for the tracks after those shown."""
+        with self._music_db.snapshot():
+            tracks_info = self._music_db.get_track_metadata(tracks)
+            playlists_data = self._music_db.get_playlists()
         widget_ids = self._get_widget_ids(tracks)
-        track_number = 1
+        playlists = [(playlist_id, playlists_data[playlist_id]) for playlist_id in playlists_data]
+        track_number = len(self.all_track_widgets) + 1
 
         for track_id, widget_id in zip(tracks, widget_ids):
             track_info = tracks_info[track_id]
-            self._create_track_item(track_id, track_info, track_number)
+            self._create_track_item(track_id, track_info, track_number,
+                                    playlists)
             track_number += 1
             # Highlight the track item if it's currently playing
             if track_id == self._mixer_controller.current_track_id:
                 self.update_highlighted_track(track_id)
 
-        # Move to the top of the scrollable canvas.
-        self.display_canvas.yview_moveto(0)
-
-        if not self.widgets_dict:
-            self._empty_tracklist()
-
-    def _create_track_item(self, track_id, track_info, track_number):
+    def _create_track_item(self, track_id, track_info, track_number,
+                           playlists):
         """Create a `TrackItem` instance for a given track."""
         track_name = track_info['track_name']
         artist_id = track_info['artist']
-        artist_name = self._music_db.get_artist_name(artist_id)
+        artist_name = track_info['artist_name']
         album_id = track_info['album']
-        album = self._music_db.get_album_title(album_id)
+        album = track_info['album_name']
         duration_full = track_info['duration']
         duration = format_duration(duration_full)
         release_date = track_info['release_date']
 
         play_next_command = partial(self._play_next_function, track_id)
         add_to_queue_command = partial(self._add_to_queue_function, track_id)
-        add_to_playlist_command = partial(
-            self._music_db.add_to_playlist, track_id
-        )
-
-        playlists_data = self._music_db.get_playlists()
-        playlists = [(playlist_id, playlists_data[playlist_id]) for playlist_id in playlists_data]
+        add_to_playlist_command = partial(self._add_to_playlist, track_id)
 
         track_item = TrackItem(
             self.display_frame,
@@ -160,7 +179,7 @@ class TracksDisplay:
             add_to_playlist_command=add_to_playlist_command,
             play_next_command=play_next_command,
             playlists=playlists,
-            create_new_playlist_command=self._music_db.create_playlist,
+            create_new_playlist_command=self._create_playlist,
             start_column=self._start_column
         )
         track_item.grid(row=track_number - 1, column=0,
@@ -169,6 +188,14 @@ class TracksDisplay:
         self.widgets_dict[track_id] = track_item
         self.all_track_widgets.append(track_item)
 
+    def _add_to_playlist(self, track_id, playlist_id):
+        """Add a track to a playlist."""
+        log_write_errors(self._music_db.add_to_playlist(track_id, playlist_id))
+
+    def _create_playlist(self, playlist_name):
+        """Create a playlist with the given name."""
+        log_write_errors(self._music_db.create_playlist(playlist_name))
+
     def _empty_tracklist(self):
         """Display the empty tracklist widgets."""
         empty_display_text = tk.Label(